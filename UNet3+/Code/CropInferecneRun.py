@@ -13,6 +13,7 @@ import torch.nn.functional as F
 
 import config
 from DataSet.YoloInferenceDataset import XRayInferenceDataset
+from Util.InputChannels import fold_first_conv
 
 
 def keep_largest_connected_component(mask):
@@ -96,7 +97,7 @@ if __name__ == "__main__":
     # 동적으로 모델 로드
     model_name = f"Model.{config.INFERENCE_MODEL_NAME}"
     ModelClass = get_model_class(model_name)
-    model = ModelClass()
+    model = fold_first_conv(ModelClass())
     model.load_state_dict(torch.load(os.path.join(config.SAVED_DIR, config.INFERENCE_MODEL_NAME)))
 
     yolo_model = YOLO("/data/ephemeral/home/MCG/YOLO_Detection_Model/best.pt")
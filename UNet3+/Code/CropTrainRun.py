@@ -9,10 +9,12 @@ from torch.utils.data import DataLoader
 
 import config
 from DataSet.DataLoder import get_image_label_paths
-from DataSet.LabelBaseCropDataset import XRayDataset
+from DataSet.RingBuffer import RingBufferLoader, list_collate
+from DataSet.LabelBaseCropDataset import XRayDataset, crop_collate, flatten_crops
 from Loss.Loss import CombinedLoss
 from TrainTool.MaskRpeatTrain import train
 from Util.SetSeed import set_seed
+from Util.InputChannels import fold_first_conv
 from sklearn.utils import shuffle
 from Util.cusom_cosine_annal import CosineAnnealingWarmUpRestarts
 
@@ -44,7 +46,6 @@ def main():
             train_labelnames += list(jsons[y])
 
     # 데이터셋 생성
-    train_dataset1 = XRayDataset(train_filenames, train_labelnames, is_train=True)
     tf = A.Compose([
         A.Rotate(limit=14, p=0.5),
         A.HorizontalFlip(p=1),
@@ -55,8 +56,13 @@ def main():
             p=0.8
         ),
     ])
-    train_dataset2 = XRayDataset(train_filenames, train_labelnames, is_train=True, transforms=tf)
-    train_dataset = train_dataset1 + train_dataset2
+    # 이미지 한 번 decode / rasterize 해서 원본 crop과 augmentation crop을 같이 만듦 (NUM_CROPS개)
+    train_dataset = XRayDataset(train_filenames, train_labelnames, is_train=True, transforms=[None, tf],
+                                num_crops=config.NUM_CROPS)
+    if config.NUM_CROPS > 1:
+        collate_fn = flatten_crops if config.RING_BUFFERS else crop_collate
+    else:
+        collate_fn = list_collate if config.RING_BUFFERS else None
 
     train_loader = DataLoader(
         dataset=train_dataset,
@@ -64,7 +70,11 @@ def main():
         shuffle=True,
         num_workers=8,
         drop_last=True,
+        collate_fn=collate_fn,
     )
+    if config.RING_BUFFERS:
+        # 고정 크기 batch를 미리 할당한 pinned buffer에 채워서 재사용
+        train_loader = RingBufferLoader(train_loader, num_buffers=config.RING_BUFFERS)
     valid_dataset = XRayDataset(valid_filenames, valid_labelnames, is_train=False)
     valid_loader = DataLoader(
         dataset=valid_dataset,
@@ -78,6 +88,7 @@ def main():
     model_name = f"Model.{config.MODEL}"  # ex) Model.4Stage_HRnet_UNet3+_from_last_stage
     ModelClass = get_model_class(model_name)
     model = ModelClass(n_classes=len(config.CLASSES))
+    model = fold_first_conv(model)  # config.IN_CHANNELS == 1일 때만 변환
 
     # Loss function 정의
     criterion = CombinedLoss(focal_weight=1, iou_weight=1, ms_ssim_weight=1, dice_weight=0)
@@ -3,18 +3,28 @@ import cv2
 import numpy as np
 import json
 import torch
-from config import CLASS2IND, CLASSES, IMAGE_ROOT, LABEL_ROOT
+from config import CLASS2IND, CLASSES, IMAGE_ROOT, LABEL_ROOT, POLYGON_STORE_DIR
 from Util.SetSeed import set_seed
+from Util.InputChannels import read_image
+from DataSet.LabelEngine import fill_polygon
+from DataSet.PolygonStore import PolygonStore
 
 set_seed()
 
 from torch.utils.data import Dataset
 class XRayDataset(Dataset):
-    def __init__(self, filenames, labelnames, transforms=None, is_train=False):
+    def __init__(self, filenames, labelnames, transforms=None, is_train=False, label_size=None, supersample=4,
+                 polygon_store_dir=POLYGON_STORE_DIR):
         self.filenames = filenames
         self.labelnames = labelnames
         self.is_train = is_train
         self.transforms = transforms
+        # label_size: polygon을 학습 해상도에서 바로 rasterize (이미지도 같은 크기로 resize)
+        # validation은 원본 해상도로 평가하므로 학습에만 적용
+        self.label_size = (label_size, label_size) if label_size and is_train else None
+        self.supersample = supersample
+        # polygon store: JSON 파싱 대신 memmap 된 좌표 view를 사용
+        self.polygon_store = PolygonStore(polygon_store_dir, LABEL_ROOT) if polygon_store_dir else None
 
     def __len__(self):
         return len(self.filenames)
@@ -23,7 +33,11 @@ class XRayDataset(Dataset):
         image_name = self.filenames[item]
         image_path = os.path.join(IMAGE_ROOT, image_name)
 
-        image = cv2.imread(image_path)
+        image = read_image(image_path)
+        src_size = image.shape[:2]
+        if self.label_size is not None:
+            image = cv2.resize(image, self.label_size[::-1], interpolation=cv2.INTER_LINEAR)
+            image = image.reshape(self.label_size + (-1,))  # 1채널 입력의 channel 축 유지
         image = image / 255.
 
         label_name = self.labelnames[item]
@@ -33,25 +47,21 @@ class XRayDataset(Dataset):
         label_shape = tuple(image.shape[:2]) + (len(CLASSES), )
         label = np.zeros(label_shape, dtype=np.uint8)
 
-        # read label file
-        with open(label_path, "r") as f:
-            annotations = json.load(f)
-        annotations = annotations["annotations"]
+        # read label file (CLASSES에 없는 class는 제외)
+        if self.polygon_store is not None:
+            polygons = self.polygon_store.get(label_name, CLASS2IND)
+        else:
+            with open(label_path, "r") as f:
+                annotations = json.load(f)
+            annotations = annotations["annotations"]
+            polygons = [(CLASS2IND[ann["label"]], ann["points"]) for ann in annotations if ann["label"] in CLASSES]
 
         # iterate each class
-        for ann in annotations:
-            c = ann["label"]
-            
-            if c not in CLASSES:
-                continue
-            
-            class_ind = CLASS2IND[c]
-            points = np.array(ann["points"])
-
+        for class_ind, points in polygons:
             # polygon to mask
-            class_label = np.zeros(image.shape[:2], dtype=np.uint8)
-            cv2.fillPoly(class_label, [points], 1)
-            label[..., class_ind] = class_label
+            label[..., class_ind] = fill_polygon(
+                points, src_size, image.shape[:2], self.supersample if self.label_size else 1
+            )
 
         if self.transforms is not None:
             inputs = {"image": image, "mask": label} if self.is_train else {"image": image}
@@ -0,0 +1,200 @@
+import os
+import json
+import argparse
+import numpy as np
+
+# (image, class) 하나의 geometry. bbox는 [x0, x1) x [y0, y1) (x1, y1은 max 좌표 + 1)
+# class의 polygon이 여러 개면 bbox는 합집합, area는 합, centroid는 area 가중 평균
+GEOMETRY_DTYPE = np.dtype([
+    ("x0", np.int32), ("y0", np.int32), ("x1", np.int32), ("y1", np.int32),
+    ("area", np.float32), ("cx", np.float32), ("cy", np.float32),
+    ("num_points", np.int32),
+])
+
+
+def polygon_geometry(points):
+    """
+    (K, 2) polygon의 (area, cx, cy) 계산 (shoelace, cv2.contourArea와 같은 면적)
+    면적이 0인 polygon은 꼭짓점 평균을 centroid로 사용
+    """
+    x = points[:, 0].astype(np.float64)
+    y = points[:, 1].astype(np.float64)
+    xn, yn = np.roll(x, -1), np.roll(y, -1)
+    cross = x * yn - xn * y
+    signed_area = cross.sum() / 2
+    if signed_area == 0:
+        return 0.0, x.mean(), y.mean()
+    cx = ((x + xn) * cross).sum() / (6 * signed_area)
+    cy = ((y + yn) * cross).sum() / (6 * signed_area)
+    return abs(signed_area), cx, cy
+
+
+class GeometryIndex:
+    """
+    이미지별/클래스별 bbox, 면적, centroid, 꼭짓점 수를 미리 계산해 둔 index
+
+    records는 (N, C) structured array (GEOMETRY_DTYPE)라서 records[image_ind, class_ind]로 O(1) 조회한다.
+    polygon이 없는 (image, class)는 num_points == 0.
+
+    Layout ({path}.npz):
+        names        (N,)      라벨 파일 상대경로
+        classes      (C,)      class 이름
+        records      (N, C)    GEOMETRY_DTYPE
+        image_sizes  (N, 2)    JSON metadata의 (H, W) (없으면 -1)
+        mtimes, sizes (N,)     JSON 파일 mtime_ns / size (변경 감지용)
+
+    Args:
+        path (str): index .npz 경로
+        label_root (str, optional): 지정하면 index가 없거나 오래된 경우 다시 만듦
+        labelnames (list, optional): label_root 기준 JSON 상대경로. None이면 label_root 아래 모든 JSON
+    """
+    def __init__(self, path, label_root=None, labelnames=None):
+        self.path = path
+
+        if label_root is not None:
+            if labelnames is None:
+                labelnames = self.list_labels(label_root)
+            if not self._is_valid(label_root, labelnames):
+                self.build(path, label_root, labelnames)
+
+        with np.load(path) as index:
+            self.names = index["names"].tolist()
+            self.classes = index["classes"].tolist()
+            self.records = index["records"]
+            self.image_sizes = index["image_sizes"]
+        self.name2ind = {name: i for i, name in enumerate(self.names)}
+        self.class2ind = {name: i for i, name in enumerate(self.classes)}
+
+    @staticmethod
+    def list_labels(label_root):
+        """label_root 아래 모든 JSON의 상대경로를 정렬해서 반환"""
+        return sorted(
+            os.path.relpath(os.path.join(root, fname), start=label_root)
+            for root, _dirs, files in os.walk(label_root)
+            for fname in files
+            if os.path.splitext(fname)[1].lower() == ".json"
+        )
+
+    @staticmethod
+    def _stat(label_root, labelnames):
+        stats = [os.stat(os.path.join(label_root, name)) for name in labelnames]
+        return np.array([st.st_mtime_ns for st in stats]), np.array([st.st_size for st in stats])
+
+    def _is_valid(self, label_root, labelnames):
+        if not os.path.exists(self.path):
+            return False
+        labelnames = sorted(labelnames)
+        with np.load(self.path) as index:
+            if index["names"].tolist() != labelnames:
+                return False
+            mtimes, sizes = self._stat(label_root, labelnames)
+            return np.array_equal(index["mtimes"], mtimes) and np.array_equal(index["sizes"], sizes)
+
+    @classmethod
+    def build(cls, path, label_root, labelnames):
+        """
+        labelnames JSON을 모두 읽어서 geometry index (.npz) 생성
+
+        Args:
+            path (str): 저장할 .npz 경로
+            label_root (str): 라벨 root
+            labelnames (list): label_root 기준 JSON 상대경로
+        """
+        labelnames = sorted(labelnames)
+        print(f"Building geometry index {path} ({len(labelnames)} labels)")
+
+        per_image = []
+        image_sizes = np.full((len(labelnames), 2), -1, dtype=np.int32)
+        classes = []
+        class2ind = {}
+        for i, name in enumerate(labelnames):
+            with open(os.path.join(label_root, name), "r") as f:
+                data = json.load(f)
+            metadata = data.get("metadata", {})
+            if "height" in metadata and "width" in metadata:
+                image_sizes[i] = metadata["height"], metadata["width"]
+
+            polygons = []
+            for ann in data["annotations"]:
+                if ann["label"] not in class2ind:
+                    class2ind[ann["label"]] = len(classes)
+                    classes.append(ann["label"])
+                polygons.append((class2ind[ann["label"]], np.asarray(ann["points"], dtype=np.int32).reshape(-1, 2)))
+            per_image.append(polygons)
+
+        records = np.zeros((len(labelnames), len(classes)), dtype=GEOMETRY_DTYPE)
+        for i, polygons in enumerate(per_image):
+            for class_ind, points in polygons:
+                if len(points) == 0:
+                    continue
+                record = records[i, class_ind]
+                area, cx, cy = polygon_geometry(points)
+                (x0, y0), (x1, y1) = points.min(axis=0), points.max(axis=0) + 1
+                if record["num_points"] > 0:
+                    x0, y0 = min(x0, record["x0"]), min(y0, record["y0"])
+                    x1, y1 = max(x1, record["x1"]), max(y1, record["y1"])
+                    total = record["area"] + area
+                    if total > 0:
+                        cx = (record["cx"] * record["area"] + cx * area) / total
+                        cy = (record["cy"] * record["area"] + cy * area) / total
+                    area = total
+                records[i, class_ind] = (x0, y0, x1, y1, area, cx, cy, record["num_points"] + len(points))
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        mtimes, sizes = cls._stat(label_root, labelnames)
+        tmp_path = os.path.splitext(path)[0] + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            names=np.array(labelnames),
+            classes=np.array(classes),
+            records=records,
+            image_sizes=image_sizes,
+            mtimes=mtimes,
+            sizes=sizes,
+        )
+        os.replace(tmp_path, path)
+
+    def __contains__(self, label_name):
+        return label_name in self.name2ind
+
+    def image_records(self, label_name):
+        """label_name의 (C,) geometry record 배열 (self.classes 순서)"""
+        return self.records[self.name2ind[label_name]]
+
+    def get(self, label_name, class_name):
+        """(label_name, class_name)의 geometry record. polygon이 없으면 None"""
+        record = self.records[self.name2ind[label_name], self.class2ind[class_name]]
+        return record if record["num_points"] > 0 else None
+
+    def image_size(self, label_name):
+        """JSON metadata의 (H, W). 없으면 None"""
+        height, width = self.image_sizes[self.name2ind[label_name]]
+        return (int(height), int(width)) if height >= 0 else None
+
+    def bbox(self, label_name, class_names=None):
+        """
+        class_names (None이면 전체) polygon들의 합집합 bbox (x0, y0, x1, y1) 반환. 해당 polygon이 없으면 None
+        """
+        records = self.image_records(label_name)
+        if class_names is not None:
+            records = records[[self.class2ind[name] for name in class_names if name in self.class2ind]]
+        records = records[records["num_points"] > 0]
+        if len(records) == 0:
+            return None
+        return (int(records["x0"].min()), int(records["y0"].min()),
+                int(records["x1"].max()), int(records["y1"].max()))
+
+    def class_areas(self, class_names=None):
+        """(N, len(class_names)) 면적 배열 (sampler 등에서 전체 통계를 볼 때 사용)"""
+        if class_names is None:
+            return self.records["area"]
+        return self.records["area"][:, [self.class2ind[name] for name in class_names]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="어노테이션 JSON으로 geometry index 생성")
+    parser.add_argument("label_root", type=str)
+    parser.add_argument("path", type=str)
+    args = parser.parse_args()
+
+    GeometryIndex.build(args.path, args.label_root, GeometryIndex.list_labels(args.label_root))
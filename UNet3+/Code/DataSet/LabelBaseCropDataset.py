@@ -3,70 +3,114 @@ import cv2
 import numpy as np
 import json
 import torch
-from config import CLASS2IND, CLASSES, IMAGE_ROOT, LABEL_ROOT,IMSIZE
+from config import CLASS2IND, CLASSES, IMAGE_ROOT, LABEL_ROOT,IMSIZE,POLYGON_STORE_DIR,GEOMETRY_INDEX_PATH
 from Util.SetSeed import set_seed
+from Util.InputChannels import read_image_size, read_image_window
+from DataSet.PolygonStore import PolygonStore
+from DataSet.LabelEngine import fill_polygon_window
+from DataSet.GeometryIndex import GeometryIndex
 import random
 set_seed()
 
 from torch.utils.data import Dataset
+from torch.utils.data.dataloader import default_collate
+
+
+def flatten_crops(batch):
+    """[[(image, label) x K] x B] -> [(image, label) x (B * K)] (RingBufferLoader용 list collate_fn)"""
+    return [crop for crops in batch for crop in crops]
+
+
+def crop_collate(batch):
+    """num_crops > 1 인 XRayDataset의 crop list를 펼쳐서 (B * K, ...) batch로 합치는 collate_fn"""
+    return default_collate(flatten_crops(batch))
+
 class XRayDataset(Dataset):
     def __init__(self, filenames, labelnames, transforms=None,
-                 is_train=False, save_dir=None, draw_enabled=False):
+                 is_train=False, save_dir=None, draw_enabled=False, polygon_store_dir=POLYGON_STORE_DIR,
+                 geometry_index_path=GEOMETRY_INDEX_PATH, num_crops=1):
         self.filenames = filenames
         self.labelnames = labelnames
         self.is_train = is_train
-        self.transforms = transforms
+        # transforms에 list를 주면 k번째 crop에 transforms[k % len] 적용 (None은 augmentation 없음)
+        self.transforms = list(transforms) if isinstance(transforms, (list, tuple)) else [transforms]
+        # 이미지 한 번 decode / rasterize 해서 만드는 crop 수 (1보다 크면 crop list를 반환하므로 crop_collate 사용)
+        self.num_crops = num_crops
         self.save_dir = save_dir  # Crop된 이미지 저장 디렉토리
         self.draw_enabled = draw_enabled  # 라벨 그리기 기능 활성화 여부
         self.save_once=False
+        # polygon store: JSON 파싱 대신 memmap 된 좌표 view를 사용
+        self.polygon_store = PolygonStore(polygon_store_dir, LABEL_ROOT) if polygon_store_dir else None
+        # geometry index: crop box 계산에 필요한 bbox / 이미지 크기를 O(1)로 조회
+        self.geometry_index = GeometryIndex(geometry_index_path, LABEL_ROOT) if geometry_index_path else None
     def __len__(self):
         return len(self.filenames)
 
     def __getitem__(self, item):
         image_name = self.filenames[item]
         image_path = os.path.join(IMAGE_ROOT, image_name)
-        
-        # Read and normalize image
-        image = cv2.imread(image_path)
-        image = image / 255.0
-
         label_name = self.labelnames[item]
         label_path = os.path.join(LABEL_ROOT, label_name)
+
+        image_size = self.geometry_index.image_size(label_name) if self.geometry_index is not None else None
+        if image_size is None:
+            image_size = read_image_size(image_path)
+
+        # Read label file (CLASSES에 없는 class는 제외)
+        if self.polygon_store is not None:
+            polygons = self.polygon_store.get(label_name, CLASS2IND)
+        else:
+            with open(label_path, "r") as f:
+                annotations = json.load(f)
+            annotations = annotations["annotations"]
+            polygons = [(CLASS2IND[ann["label"]], np.array(ann["points"])) for ann in annotations
+                        if ann["label"] in CLASSES]
+        
+        # Points 기반 크롭 영역을 crop 마다 먼저 계산 (geometry index가 있으면 polygon 대신 미리 계산된 bbox 사용)
+        if self.geometry_index is not None:
+            bbox = self.geometry_index.bbox(label_name, CLASSES)
+        elif polygons:
+            # 라벨 데이터에서 모든 Points를 수집
+            points = np.concatenate([class_points for _, class_points in polygons])
+            min_x, min_y = points.min(axis=0)
+            max_x, max_y = points.max(axis=0)
+            bbox = (min_x, min_y, max_x + 1, max_y + 1)
+        else:
+            bbox = None
+        if bbox is not None:
+            crop_boxes = [self.calculate_crop_box_from_bbox(bbox, image_size) for _ in range(self.num_crops)]
+        else:
+            crop_boxes = [(0, 0, image_size[1], image_size[0])] * self.num_crops
+        
+        # 모든 crop을 덮는 영역만 한 번 읽고 정규화
+        window = (min(box[0] for box in crop_boxes), min(box[1] for box in crop_boxes),
+                  max(box[2] for box in crop_boxes), max(box[3] for box in crop_boxes))
+        image = read_image_window(image_path, window)
+        image = image / 255.0
         
-        # Initialize label tensor
+        # 영역 좌표로 옮긴 polygon으로 창 크기의 mask를 한 번 생성
         label_shape = tuple(image.shape[:2]) + (len(CLASSES), )
         label = np.zeros(label_shape, dtype=np.uint8)
-
-        # Read label file
-        with open(label_path, "r") as f:
-            annotations = json.load(f)
-        annotations = annotations["annotations"]
-        
-        # Generate masks for all annotations
-        points = []
-        for ann in annotations:
-            c = ann["label"]
-            if c not in CLASSES:
-                continue
-
-            class_ind = CLASS2IND[c]
-            points.extend(ann["points"])  # 라벨 데이터에서 모든 Points를 수집
-
-            # Generate masks
-            class_label = np.zeros(image.shape[:2], dtype=np.uint8)
-            cv2.fillPoly(class_label, [np.array(ann["points"])], 1)
-            label[..., class_ind] = class_label
+        for class_ind, class_points in polygons:
+            label[..., class_ind] = fill_polygon_window(class_points, window, image_size)
         
-        # Points 기반 크롭 영역 계산
-        if points:
-            crop_box = self.calculate_crop_box_from_points(points, image.shape[:2])
-            image = self.crop_image(image, crop_box)
-            label = self.crop_label(label, crop_box)
-            
+        # 같은 decode / rasterize 결과에서 crop 별로 잘라서 crop 별 transform 적용
+        samples = []
+        for k, (start_x, start_y, end_x, end_y) in enumerate(crop_boxes):
+            crop = (start_x - window[0], start_y - window[1], end_x - window[0], end_y - window[1])
+            samples.append(self._make_sample(
+                np.ascontiguousarray(self.crop_image(image, crop)),
+                np.ascontiguousarray(self.crop_label(label, crop)),
+                self.transforms[k % len(self.transforms)],
+                item,
+            ))
+        return samples[0] if self.num_crops == 1 else samples
+
+    def _make_sample(self, image, label, transforms, item):
         # Apply augmentations
-        if self.transforms is not None:
+        if transforms is not None:
             inputs = {"image": image, "mask": label} if self.is_train else {"image": image}
-            result = self.transforms(**inputs)
+            result = transforms(**inputs)
             image = result["image"]
             label = result["mask"] if self.is_train else label
 
@@ -91,6 +135,12 @@ class XRayDataset(Dataset):
         points = np.array(points)
         min_x, min_y = points.min(axis=0)
         max_x, max_y = points.max(axis=0)
+        return self.calculate_crop_box_from_bbox((min_x, min_y, max_x + 1, max_y + 1), image_size, crop_size)
+
+    def calculate_crop_box_from_bbox(self, bbox, image_size, crop_size=IMSIZE):
+        """bbox (x0, y0, x1, y1) (x1, y1은 max 좌표 + 1)에서 크롭 박스를 계산합니다."""
+        min_x, min_y, max_x, max_y = bbox
+        max_x, max_y = max_x - 1, max_y - 1
 
         # 중심점 계산
         center_x = (min_x + max_x) / 2
@@ -107,6 +157,10 @@ class XRayDataset(Dataset):
         start_y = max(int(center_y - half_size), 0)
         end_x = min(start_x + crop_size, image_size[1])
         end_y = min(start_y + crop_size, image_size[0])
+        if self.num_crops > 1:
+            # 경계에 걸리면 안쪽으로 밀어서 crop 크기를 유지 (같은 이미지의 crop들을 한 batch로 합칠 수 있도록)
+            start_x = max(end_x - crop_size, 0)
+            start_y = max(end_y - crop_size, 0)
 
         return start_x, start_y, end_x, end_y
 
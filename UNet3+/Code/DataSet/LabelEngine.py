@@ -0,0 +1,59 @@
+import cv2
+import numpy as np
+
+# cv2.fillPoly의 sub-pixel 정밀도 (fractional bits)
+SHIFT = 8
+
+
+def fill_polygon(points, src_size, dst_size, supersample=1):
+    """
+    원본(src_size) 좌표계의 polygon을 dst_size 해상도에서 바로 채운 (H, W) uint8 mask 반환
+
+    supersample > 1이면 dst_size * supersample 격자에서 채운 뒤 area 평균으로 줄이고
+    coverage 0.5 기준으로 threshold 해서 원본 해상도 rasterize -> resize 결과와 경계를 맞춤
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if tuple(src_size) == tuple(dst_size) and supersample == 1:
+        mask = np.zeros(dst_size, dtype=np.uint8)
+        cv2.fillPoly(mask, [points.astype(np.int32)], 1)
+        return mask
+
+    grid_size = (dst_size[0] * supersample, dst_size[1] * supersample)
+    scale = np.array([grid_size[1] / src_size[1], grid_size[0] / src_size[0]])
+    fixed = np.round(((points + 0.5) * scale - 0.5) * (1 << SHIFT)).astype(np.int32)
+
+    grid = np.zeros(grid_size, dtype=np.uint8)
+    cv2.fillPoly(grid, [fixed], 255, shift=SHIFT)
+    if supersample > 1:
+        grid = cv2.resize(grid, tuple(dst_size)[::-1], interpolation=cv2.INTER_AREA)
+    return (grid >= 128).astype(np.uint8)
+
+
+def fill_polygon_window(points, crop_box, image_size):
+    """
+    원본 좌표계의 polygon을 crop_box (start_x, start_y, end_x, end_y) 창에 해당하는 (h, w) uint8 mask로 반환
+
+    fillPoly는 canvas 경계에서 edge를 clip 하면서 경계 근처 픽셀이 달라지므로 창에 바로 채우지 않고,
+    polygon bounding box (image_size 안으로 제한) 크기의 canvas에 채운 뒤 창과 겹치는 부분만 복사한다.
+    전체 해상도 mask를 만든 뒤 자르는 것과 같은 결과를 polygon / 창 크기 연산으로 얻고,
+    창과 겹치지 않는 polygon은 채우지 않는다.
+    crop_box가 이미지 밖으로 나가면 이미지 slicing과 같이 이미지 범위로 잘라서 반환한다.
+    """
+    start_x, start_y = max(crop_box[0], 0), max(crop_box[1], 0)
+    end_x, end_y = min(crop_box[2], image_size[1]), min(crop_box[3], image_size[0])
+    mask = np.zeros((end_y - start_y, end_x - start_x), dtype=np.uint8)
+
+    points = np.asarray(points, dtype=np.int32)
+    x0, y0 = np.maximum(points.min(axis=0), 0)
+    x1, y1 = np.minimum(points.max(axis=0) + 1, (image_size[1], image_size[0]))
+
+    # polygon bounding box와 창의 교집합
+    ix0, iy0 = max(x0, start_x), max(y0, start_y)
+    ix1, iy1 = min(x1, end_x), min(y1, end_y)
+    if ix0 >= ix1 or iy0 >= iy1:
+        return mask
+
+    canvas = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+    cv2.fillPoly(canvas, [points - np.array([x0, y0], dtype=np.int32)], 1)
+    mask[iy0 - start_y:iy1 - start_y, ix0 - start_x:ix1 - start_x] = canvas[iy0 - y0:iy1 - y0, ix0 - x0:ix1 - x0]
+    return mask
@@ -0,0 +1,165 @@
+import queue
+import threading
+import torch
+from torch.utils.data import default_collate
+
+_END = object()
+
+
+def list_collate(samples):
+    """sample을 stack 하지 않고 그대로 넘기는 collate_fn (RingBufferLoader가 main process에서 batch로 모음)"""
+    return samples
+
+
+class _ExceptionWrapper:
+    def __init__(self, exc):
+        self.exc = exc
+
+
+class RingBufferLoader:
+    """
+    고정 크기 batch를 미리 할당해 둔 (pinned) buffer ring에 바로 써서 넘기는 DataLoader wrapper
+
+    기본 collate는 step 마다 worker에서 torch.stack으로 batch tensor를 새로 만들고,
+    pin_memory thread가 다시 pinned tensor를 할당해서 한 번 더 복사한다.
+    이 wrapper는 list_collate로 받은 sample을 background thread에서 ring의 빈 slot에 한 번만 복사하고,
+    다음 batch를 요청받는 시점에 이전 slot에 CUDA event를 기록해서 (non_blocking H2D 복사가 끝난 뒤)
+    slot을 재사용한다. 따라서 학습 loop는 받은 CPU batch를 다음 step까지 들고 있으면 안 된다.
+
+    sample은 tensor 또는 tensor / 그 외 값의 tuple이어야 한다. tensor가 아닌 값 (파일명 등)은 list로 모으고,
+    buffer와 모양이 다른 sample이 섞인 batch는 default_collate로 처리한다.
+
+    Args:
+        loader (DataLoader): collate_fn=list_collate, pin_memory=False로 만든 DataLoader
+        num_buffers (int): ring slot 수 (미리 준비해 둘 batch 수 + 1)
+        pin_memory (bool): buffer를 pinned memory로 할당할지 여부
+    """
+    def __init__(self, loader, num_buffers=3, pin_memory=torch.cuda.is_available()):
+        assert num_buffers >= 2, "num_buffers must be at least 2"
+        self.loader = loader
+        self.num_buffers = num_buffers
+        self.pin_memory = pin_memory
+        # (slot 별 buffer tuple) 첫 batch를 보고 lazy 하게 할당해서 epoch 간 재사용
+        self.buffers = None
+        self.events = [None] * num_buffers
+
+    def __len__(self):
+        return len(self.loader)
+
+    @property
+    def dataset(self):
+        return self.loader.dataset
+
+    def _allocate(self, sample, batch_size):
+        fields = sample if isinstance(sample, (tuple, list)) else (sample,)
+        buffers = []
+        for _ in range(self.num_buffers):
+            slot = []
+            for field in fields:
+                if isinstance(field, torch.Tensor):
+                    buffer = torch.empty((batch_size,) + field.shape, dtype=field.dtype, pin_memory=self.pin_memory)
+                    slot.append(buffer)
+                else:
+                    slot.append(None)
+            buffers.append(slot)
+        return buffers
+
+    def _fits(self, samples):
+        slot = self.buffers[0]
+        if any(buffer is not None and len(samples) > buffer.shape[0] for buffer in slot):
+            return False
+        for sample in samples:
+            fields = sample if isinstance(sample, (tuple, list)) else (sample,)
+            if len(fields) != len(slot):
+                return False
+            for field, buffer in zip(fields, slot):
+                if (buffer is None) != (not isinstance(field, torch.Tensor)):
+                    return False
+                if buffer is not None and (field.shape != buffer.shape[1:] or field.dtype != buffer.dtype):
+                    return False
+        return True
+
+    def _fill(self, slot, samples):
+        is_tuple = isinstance(samples[0], (tuple, list))
+        batch = []
+        for j, buffer in enumerate(self.buffers[slot]):
+            values = [sample[j] if is_tuple else sample for sample in samples]
+            if buffer is None:
+                batch.append(values)
+                continue
+            out = buffer[:len(samples)]
+            for i, value in enumerate(values):
+                out[i].copy_(value)
+            batch.append(out)
+        return tuple(batch) if is_tuple else batch[0]
+
+    def _worker(self, free, ready, stop, device):
+        if device is not None:
+            torch.cuda.set_device(device)
+        try:
+            for samples in self.loader:
+                if self.buffers is None:
+                    # collate_fn이 sample을 펼치는 경우 (multi-crop) batch_size보다 sample이 많을 수 있음
+                    self.buffers = self._allocate(samples[0], max(self.loader.batch_size or 0, len(samples)))
+                if not self._fits(samples):
+                    batch, slot = default_collate(samples), None
+                else:
+                    slot = None
+                    while slot is None:
+                        if stop.is_set():
+                            return
+                        try:
+                            slot = free.get(timeout=0.1)
+                        except queue.Empty:
+                            pass
+                    # 이 slot에서 device로 가는 복사가 끝날 때까지 대기 후 덮어씀
+                    if self.events[slot] is not None:
+                        self.events[slot].synchronize()
+                    batch = self._fill(slot, samples)
+                if not self._put(ready, (slot, batch), stop):
+                    return
+        except Exception as e:
+            self._put(ready, _ExceptionWrapper(e), stop)
+            return
+        self._put(ready, _END, stop)
+
+    @staticmethod
+    def _put(ready, item, stop):
+        while not stop.is_set():
+            try:
+                ready.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def __iter__(self):
+        free = queue.Queue()
+        for slot in range(self.num_buffers):
+            free.put(slot)
+        ready = queue.Queue(maxsize=self.num_buffers - 1)
+        stop = threading.Event()
+        device = torch.cuda.current_device() if torch.cuda.is_available() else None
+        thread = threading.Thread(target=self._worker, args=(free, ready, stop, device), daemon=True)
+        thread.start()
+
+        current = None
+        try:
+            while True:
+                # 다음 batch를 요청했다면 이전 batch의 H2D 복사는 이미 stream에 올라가 있음
+                if current is not None:
+                    if torch.cuda.is_available():
+                        self.events[current] = torch.cuda.Event()
+                        self.events[current].record()
+                    free.put(current)
+                    current = None
+                item = ready.get()
+                if item is _END:
+                    return
+                if isinstance(item, _ExceptionWrapper):
+                    raise item.exc
+                current, batch = item
+                yield batch
+        finally:
+            stop.set()
+            thread.join()
@@ -3,8 +3,11 @@ import cv2
 import numpy as np
 import json
 import torch
-from config import CLASS2IND, CLASSES, IMAGE_ROOT, LABEL_ROOT,YOLO_NAMES,YOLO_SELECT_CLASS,IMSIZE
+from config import CLASS2IND, CLASSES, IMAGE_ROOT, LABEL_ROOT,YOLO_NAMES,YOLO_SELECT_CLASS,IMSIZE,POLYGON_STORE_DIR
 from Util.SetSeed import set_seed
+from Util.InputChannels import read_image_size, read_image_window
+from DataSet.PolygonStore import PolygonStore
+from DataSet.LabelEngine import fill_polygon_window
 
 set_seed()
 
@@ -12,7 +15,8 @@ from torch.utils.data import Dataset
 
 class XRayDataset(Dataset):
     def __init__(self, filenames, labelnames, transforms=None,
-                 is_train=False, yolo_model=None, save_dir=None, draw_enabled=False):
+                 is_train=False, yolo_model=None, save_dir=None, draw_enabled=False,
+                 polygon_store_dir=POLYGON_STORE_DIR):
         self.filenames = filenames
         self.labelnames = labelnames
         self.is_train = is_train
@@ -20,6 +24,8 @@ class XRayDataset(Dataset):
         self.yolo_model = yolo_model  # YOLO 모델 추가
         self.save_dir = save_dir  # Crop된 이미지 저장 디렉토리
         self.draw_enabled = draw_enabled  # 라벨 그리기 기능 활성화 여부
+        # polygon store: JSON 파싱 대신 memmap 된 좌표 view를 사용
+        self.polygon_store = PolygonStore(polygon_store_dir, LABEL_ROOT) if polygon_store_dir else None
 
     def __len__(self):
         return len(self.filenames)
@@ -27,38 +33,13 @@ class XRayDataset(Dataset):
     def __getitem__(self, item):
         image_name = self.filenames[item]
         image_path = os.path.join(IMAGE_ROOT, image_name)
-        
-        # Read and normalize image
-        image = cv2.imread(image_path)
-        image = image / 255.0
+        image_size = read_image_size(image_path)
 
         label_name = self.labelnames[item]
         label_path = os.path.join(LABEL_ROOT, label_name)
         
-        # Initialize label tensor
-        label_shape = tuple(image.shape[:2]) + (len(CLASSES), )
-        label = np.zeros(label_shape, dtype=np.uint8)
-
-        # Read label file
-        with open(label_path, "r") as f:
-            annotations = json.load(f)
-        annotations = annotations["annotations"]
-        
-        # Generate masks for all annotations
-        for ann in annotations:
-            c = ann["label"]
-            if c not in CLASSES:
-                continue
-
-            class_ind = CLASS2IND[c]
-            points = np.array(ann["points"])
-
-            # Generate masks
-            class_label = np.zeros(image.shape[:2], dtype=np.uint8)
-            cv2.fillPoly(class_label, [points], 1)
-            label[..., class_ind] = class_label
-        
-        # YOLO 예측 결과에서 others 클래스 박스 가져오기
+        # YOLO 예측 결과에서 others 클래스 박스를 가져와 크롭 영역을 먼저 계산 (없으면 전체 이미지)
+        crop_box = (0, 0, image_size[1], image_size[0])
         if self.yolo_model:
             results = self.yolo_model.predict(image_path, imgsz=2048, iou=0.3, conf=0.1, max_det=3)
             result=results[0].boxes
@@ -75,9 +56,29 @@ class XRayDataset(Dataset):
             # 신뢰도가 가장 높은 박스 선택
             if others_boxes:
                 best_box, _ = max(others_boxes, key=lambda x: x[1])  # (x1, y1, x2, y2) 좌표
-                crop_box = self.calculate_crop_box_from_yolo(best_box, image.shape[:2])
-                image = self.crop_image(image, crop_box)
-                label = self.crop_label(label, crop_box)
+                crop_box = self.calculate_crop_box_from_yolo(best_box, image_size)
+        
+        # 크롭 영역만 읽고 정규화
+        image = read_image_window(image_path, crop_box)
+        image = image / 255.0
+        
+        # Initialize label tensor
+        label_shape = tuple(image.shape[:2]) + (len(CLASSES), )
+        label = np.zeros(label_shape, dtype=np.uint8)
+
+        # Read label file (CLASSES에 없는 class는 제외)
+        if self.polygon_store is not None:
+            polygons = self.polygon_store.get(label_name, CLASS2IND)
+        else:
+            with open(label_path, "r") as f:
+                annotations = json.load(f)
+            annotations = annotations["annotations"]
+            polygons = [(CLASS2IND[ann["label"]], np.array(ann["points"])) for ann in annotations
+                        if ann["label"] in CLASSES]
+        
+        # 크롭 영역 좌표로 옮긴 polygon으로 창 크기의 mask 생성
+        for class_ind, points in polygons:
+            label[..., class_ind] = fill_polygon_window(points, crop_box, image_size)
             
         # Apply augmentations
         if self.transforms is not None:
@@ -5,6 +5,7 @@ import json
 import torch
 from config import CLASS2IND, CLASSES, IMAGE_ROOT, LABEL_ROOT,YOLO_NAMES,YOLO_SELECT_CLASS,IMSIZE,TEST_IMAGE_ROOT
 from Util.SetSeed import set_seed
+from Util.InputChannels import read_image
 
 set_seed()
 
@@ -27,7 +28,7 @@ class XRayInferenceDataset(Dataset):
         image_name = self.filenames[item]
         image_path = os.path.join(TEST_IMAGE_ROOT, image_name)
 
-        image = cv2.imread(image_path)
+        image = read_image(image_path)
         print(image.shape)
         
         if self.yolo_model:
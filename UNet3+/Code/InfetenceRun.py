@@ -4,12 +4,12 @@ from torch.utils.data import DataLoader, Dataset
 import torch
 import pandas as pd
 import numpy as np
-import cv2
 from tqdm.auto import tqdm
 import torch.nn.functional as F
 import importlib
 
 import config
+from Util.InputChannels import read_image, fold_first_conv
 
 
 def get_model_class(model_name):
@@ -63,7 +63,7 @@ class XRayInferenceDataset(Dataset):
         image_name = self.filenames[item]
         image_path = os.path.join(config.TEST_IMAGE_ROOT, image_name)
 
-        image = cv2.imread(image_path)
+        image = read_image(image_path)
         image = image / 255.0
 
         if self.transforms is not None:
@@ -109,7 +109,7 @@ if __name__ == "__main__":
     # 동적으로 모델 로드
     model_name = f"Model.{config.INFERENCE_MODEL_NAME}"
     ModelClass = get_model_class(model_name)
-    model = ModelClass()
+    model = fold_first_conv(ModelClass())
     model.load_state_dict(torch.load(os.path.join(config.SAVED_DIR, config.INFERENCE_MODEL_NAME)))
 
     tf = A.Resize(config.IMSIZE, config.IMSIZE)
@@ -8,11 +8,13 @@ import importlib
 
 import config
 from DataSet.DataLoder import get_image_label_paths
+from DataSet.RingBuffer import RingBufferLoader, list_collate
 from DataSet.Dataset import XRayDataset
 from Loss.Loss import CombinedLoss
 from Util.DiscordAlam import send_discord_message
 from TrainTool.MaskRpeatTrain import train
 from Util.SetSeed import set_seed
+from Util.InputChannels import fold_first_conv
 
 
 def get_model_class(model_name):
@@ -50,6 +52,7 @@ def main():
         train_labelnames,
         transforms=None,
         is_train=True,
+        label_size=config.LABEL_SIZE,
     )
     valid_dataset = XRayDataset(
         valid_filenames,
@@ -64,7 +67,11 @@ def main():
         shuffle=True,
         num_workers=8,
         drop_last=True,
+        collate_fn=list_collate if config.RING_BUFFERS else None,
     )
+    if config.RING_BUFFERS:
+        # 고정 크기 batch를 미리 할당한 pinned buffer에 채워서 재사용
+        train_loader = RingBufferLoader(train_loader, num_buffers=config.RING_BUFFERS)
 
     valid_loader = DataLoader(
         dataset=valid_dataset,
@@ -78,6 +85,7 @@ def main():
     model_name = f"Model.{config.MODEL_NAME}"
     ModelClass = get_model_class(model_name)
     model = ModelClass(n_classes=len(config.CLASSES))
+    model = fold_first_conv(model)  # config.IN_CHANNELS == 1일 때만 변환
 
     # Loss function 정의
     criterion = CombinedLoss(
@@ -41,7 +41,7 @@ def train(model, data_loader, val_loader, criterion, optimizer, scheduler, accum
         #weights = [0.45, 0.3, 0.15, 0.1]  # Example weights, adjust as needed
 
         for step, (images, masks) in enumerate(data_loader):
-            images, masks = images.cuda(), masks.cuda()
+            images, masks = images.cuda(non_blocking=True), masks.cuda(non_blocking=True)
 
             # Forward pass
             outputs = model(images)  # 모델 출력
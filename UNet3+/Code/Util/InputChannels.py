@@ -0,0 +1,65 @@
+import cv2
+import struct
+import torch
+import torch.nn as nn
+
+from config import IN_CHANNELS
+
+
+def read_image(image_path, in_channels=IN_CHANNELS):
+    """
+    IN_CHANNELS에 맞춰 이미지를 (H, W, C) uint8로 읽음
+    X-ray는 3채널이 모두 같으므로 1채널이면 IMREAD_GRAYSCALE로 읽어서 I/O와 augmentation 비용을 줄임
+    """
+    if in_channels == 1:
+        return cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)[..., None]
+    return cv2.imread(image_path)
+
+
+def read_image_size(image_path):
+    """
+    PNG header(IHDR)만 읽어서 (H, W) 반환 (decode 전에 crop box를 계산할 때 사용)
+    PNG가 아니면 이미지를 decode 해서 크기를 구함
+    """
+    with open(image_path, "rb") as f:
+        header = f.read(24)
+    if header[:8] == b"\x89PNG\r\n\x1a\n" and header[12:16] == b"IHDR":
+        width, height = struct.unpack(">II", header[16:24])
+        return height, width
+    return cv2.imread(image_path, cv2.IMREAD_GRAYSCALE).shape[:2]
+
+
+def read_image_window(image_path, crop_box, in_channels=IN_CHANNELS):
+    """
+    crop_box (start_x, start_y, end_x, end_y) 영역만 (h, w, C) uint8로 반환
+
+    PNG는 행 단위로 압축되어 있어 cv2로 일부 영역만 decode 할 수 없으므로
+    decode 직후 바로 잘라서 이후의 정규화/augmentation이 창 크기에서만 일어나도록 한다.
+    """
+    start_x, start_y, end_x, end_y = crop_box
+    return read_image(image_path, in_channels)[start_y:end_y, start_x:end_x].copy()
+
+
+def fold_first_conv(model, in_channels=IN_CHANNELS):
+    """
+    입력(3채널)을 받는 Conv2d의 pretrained weight를 채널 축으로 합쳐서 1채널 입력용으로 변환
+
+    gray 이미지 x에 대해 sum_c(W_c) * x == sum_c(W_c * x) 이므로
+    3채널로 복제한 입력과 같은 출력을 낸다.
+    """
+    if in_channels == 3:
+        return model
+    assert in_channels == 1, f"only 1 or 3 input channels are supported, got {in_channels}"
+
+    folded = []
+    for name, module in model.named_modules():
+        if isinstance(module, nn.Conv2d) and module.in_channels == 3:
+            with torch.no_grad():
+                weight = module.weight.sum(dim=1, keepdim=True)
+            module.weight = nn.Parameter(weight)
+            module.in_channels = in_channels
+            folded.append(name)
+
+    if not folded:
+        raise ValueError("No 3-channel input Conv2d found to fold")
+    return model
@@ -9,6 +9,12 @@ VISUALIZE_TRAIN_DATA=False
 
 IMAGE_ROOT = "/data/ephemeral/home/MCG/level2-cv-semanticsegmentation-cv-15-lv3/data/train/DCM"
 LABEL_ROOT = "/data/ephemeral/home/MCG/level2-cv-semanticsegmentation-cv-15-lv3/data/train/outputs_json"
+# JSON 대신 flat int32 polygon 배열을 memmap으로 읽을 경로 (None이면 매번 json.load)
+# python DataSet/PolygonStore.py <LABEL_ROOT> <POLYGON_STORE_DIR> 로 미리 만들 수 있음
+POLYGON_STORE_DIR = None
+# 이미지별/클래스별 bbox, 면적, centroid index (.npz). 지정하면 crop box를 polygon 대신 index에서 조회
+# python DataSet/GeometryIndex.py <LABEL_ROOT> <GEOMETRY_INDEX_PATH> 로 미리 만들 수 있음
+GEOMETRY_INDEX_PATH = None
 
 '''CLASSES = [
     'finger-1', 'finger-2', 'finger-3', 'finger-4', 'finger-5',
@@ -36,6 +42,9 @@ YOLO_SELECT_CLASS="others"
 
 RANDOM_SEED = 21
 
+# 입력 채널 수: 1이면 grayscale로 읽고 모델의 입력 conv weight를 1채널로 fold
+IN_CHANNELS = 3
+
 # 적절하게 조절
 NUM_EPOCHS = 500
 VAL_EVERY = 1
@@ -43,6 +52,14 @@ VAL_EVERY = 1
 ACCUMULATION_STEPS = 32
 BATCH_SIZE = 1
 IMSIZE = 480
+# TrainRun: 지정하면 (예: 1024) 학습 이미지를 해당 크기로 resize 하고 polygon도 그 해상도에서 바로 rasterize
+# (validation은 원본 해상도)
+LABEL_SIZE = None
+# CropTrainRun: 이미지 한 번 decode / rasterize 해서 만드는 crop 수 (원본 crop, augmentation crop 순서로 번갈아 사용)
+# batch 하나에 BATCH_SIZE * NUM_CROPS 개의 crop이 들어감
+NUM_CROPS = 2
+# 0보다 크면 train batch를 미리 할당한 pinned buffer N개에 돌려 가며 채움 (DataSet/RingBuffer.py)
+RING_BUFFERS = 0
 
 LR = 0.00015
 MILESTONES=[5,20,32,40,47]
@@ -3,8 +3,9 @@ dataset_type = 'XRayDataset'
 
 train_pipeline = [
     dict(type='LoadImageFromFile'),
-    dict(type='LoadXRayAnnotations'),
     dict(type='Resize', scale=(512, 512)),
+    # polygon을 512 해상도에서 바로 rasterize 해서 29채널 2048 label 생성/resize를 생략
+    dict(type='LoadXRayAnnotations', label_size=(512, 512)),
     dict(type='TransposeAnnotations'),
     dict(type='PackSegInputs')
 ]
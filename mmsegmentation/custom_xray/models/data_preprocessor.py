@@ -0,0 +1,15 @@
+from mmseg.registry import MODELS
+from mmseg.models.data_preprocessor import SegDataPreProcessor
+
+@MODELS.register_module()
+class GrayToRGBDataPreProcessor(SegDataPreProcessor):
+    """
+    grayscale(1채널)로 읽은 batch를 device에서 정규화한 뒤 3채널로 expand
+    dataloader/IPC는 1채널만 다루고 pretrained 3채널 backbone은 그대로 사용
+    """
+    def forward(self, data, training=False):
+        data = super().forward(data, training)
+        inputs = data['inputs']
+        if inputs.size(1) == 1:
+            data['inputs'] = inputs.expand(-1, 3, -1, -1)
+        return data
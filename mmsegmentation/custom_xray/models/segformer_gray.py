@@ -0,0 +1,32 @@
+# Train Segformer Mit B3 with single-channel (grayscale) input
+_base_ = ["./segformer.py"]
+
+data_preprocessor = dict(
+    type='GrayToRGBDataPreProcessor',
+    mean=[0.],
+    std=[255.],
+    bgr_to_rgb=False,
+    size=(512, 512),
+    pad_val=0,
+    seg_pad_val=255,
+)
+model = dict(data_preprocessor=data_preprocessor)
+
+train_pipeline = [
+    dict(type='LoadImageFromFile', color_type='grayscale'),
+    dict(type='Resize', scale=(512, 512)),
+    dict(type='LoadXRayAnnotations', label_size=(512, 512)),
+    dict(type='TransposeAnnotations'),
+    dict(type='PackSegInputs')
+]
+val_pipeline = [
+    dict(type='LoadImageFromFile', color_type='grayscale'),
+    dict(type='Resize', scale=(512, 512)),
+    dict(type='LoadXRayAnnotations'),
+    dict(type='TransposeAnnotations'),
+    dict(type='PackSegInputs')
+]
+
+train_dataloader = dict(dataset=dict(pipeline=train_pipeline))
+val_dataloader = dict(dataset=dict(pipeline=val_pipeline))
+test_dataloader = val_dataloader
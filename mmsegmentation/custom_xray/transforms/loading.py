@@ -1,30 +1,50 @@
 from mmseg.registry import TRANSFORMS
 from mmcv.transforms import BaseTransform
 import numpy as np
-import cv2
 import json
+import os
 from config.config import Config, CLASS2IND
+from custom_xray.transforms.polygon_store import PolygonStore
+from custom_xray.transforms.label_engine import fill_polygon
+
 
 @TRANSFORMS.register_module()
 class LoadXRayAnnotations(BaseTransform):
-    def transform(self, result):
-        label_path = result["seg_map_path"]
-        image_size = (2048, 2048)
-        label_shape = image_size + (len(Config.CLASSES), )
-        label = np.zeros(label_shape, dtype=np.uint8)
+    """
+    Args:
+        label_size (tuple, optional): (H, W). 지정하면 polygon을 해당 해상도에서 바로 rasterize
+            (Resize 이후에 두면 2048 label 생성과 mask resize를 생략)
+        supersample (int): label_size 사용 시 sub-pixel supersampling 배율
+        polygon_store_dir (str, optional): 지정하면 JSON 대신 PolygonStore의 memmap 좌표 view를 사용
+            (Config.LABEL_ROOT 기준, 없거나 오래되면 처음 한 번 생성)
+    """
+    def __init__(self, label_size=None, supersample=4, polygon_store_dir=None):
+        super().__init__()
+        self.label_size = tuple(label_size) if label_size else None
+        self.supersample = supersample
+        self.polygon_store = PolygonStore(polygon_store_dir, Config.LABEL_ROOT) if polygon_store_dir else None
+
+    def _load_polygons(self, label_path):
+        if self.polygon_store is not None:
+            label_name = os.path.relpath(label_path, Config.LABEL_ROOT)
+            return self.polygon_store.get(label_name, CLASS2IND)
 
         with open(label_path, "r") as f:
             annotations = json.load(f)
         annotations = annotations["annotations"]
+        return [(CLASS2IND[ann["label"]], ann["points"]) for ann in annotations]
+
+    def transform(self, result):
+        label_path = result["seg_map_path"]
+        src_size = (2048, 2048)
+        image_size = self.label_size or src_size
+        label_shape = image_size + (len(Config.CLASSES), )
+        label = np.zeros(label_shape, dtype=np.uint8)
 
-        for ann in annotations:
-            c = ann["label"]
-            class_ind = CLASS2IND[c]
-            points = np.array(ann["points"])
-            
-            class_label = np.zeros(image_size, dtype=np.uint8)
-            cv2.fillPoly(class_label, [points], 1)
-            label[..., class_ind] = class_label
+        for class_ind, points in self._load_polygons(label_path):
+            label[..., class_ind] = fill_polygon(
+                points, src_size, image_size, self.supersample if self.label_size else 1
+            )
 
         result["gt_seg_map"] = label
         return result
@@ -10,11 +10,13 @@ from mmengine.runner import Runner
 # custom modules import 추가
 import custom_xray.models.segmentors  # EncoderDecoderWithoutArgmax
 import custom_xray.models.heads       # SegformerHeadWithoutAccuracy
+import custom_xray.models.data_preprocessor  # GrayToRGBDataPreProcessor
 import custom_xray.datasets.xray_dataset  # XRayDataset
 import custom_xray.transforms.loading  # LoadXRayAnnotations, TransposeAnnotations
 import utils.metrics  # DiceMetric
 
 def main():
+    # grayscale 입력: "../custom_xray/models/segformer_gray.py"
     cfg = Config.fromfile("../custom_xray/models/segformer.py")
     cfg.launcher = "none"
     cfg.work_dir = "work_dirs/segformer"
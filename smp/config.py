@@ -4,6 +4,10 @@ from dataset.data_loader import get_image_label_paths
 TRAIN_IMAGE_ROOT = "C:\\uddaniiii\\boostcamp\\project\\level2\\segmentation\\data\\train\\DCM"
 TRAIN_LABEL_ROOT = "C:\\uddaniiii\\boostcamp\\project\\level2\\segmentation\\data\\train\\outputs_json"
 
+# JSON 대신 flat int32 polygon 배열을 memmap으로 읽을 경로 (None이면 매번 json.load)
+# python dataset/polygon_store.py <TRAIN_LABEL_ROOT> <POLYGON_STORE_DIR> 로 미리 만들 수 있음
+POLYGON_STORE_DIR = None
+
 TEST_IMAGE_ROOT = "C:\\uddaniiii\\boostcamp\\project\\level2\\segmentation\\data\\test\\DCM"
 
 train_pngs, train_jsons = get_image_label_paths(TRAIN_IMAGE_ROOT, TRAIN_LABEL_ROOT)
@@ -6,10 +6,11 @@ import torch
 from torch.utils.data import Dataset
 from sklearn.model_selection import GroupKFold
 from config import TRAIN_IMAGE_ROOT, TRAIN_LABEL_ROOT, CLASSES, CLASS2IND, \
-    train_jsons, train_pngs, TEST_IMAGE_ROOT, test_pngs
+    train_jsons, train_pngs, TEST_IMAGE_ROOT, test_pngs, POLYGON_STORE_DIR
+from dataset.polygon_store import PolygonStore
 
 class XRayDataset(Dataset):
-    def __init__(self, is_train=True, transforms=None, gamma_value=None):
+    def __init__(self, is_train=True, transforms=None, gamma_value=None, polygon_store_dir=POLYGON_STORE_DIR):
         _filenames = np.array(train_pngs)
         _labelnames = np.array(train_jsons)
 
@@ -36,25 +37,27 @@ class XRayDataset(Dataset):
         self.is_train = is_train
         self.transforms = transforms
         self.gamma_value = gamma_value  # 감마 값 설정
+        # polygon store: JSON 파싱 대신 memmap 된 좌표 view를 사용
+        self.polygon_store = PolygonStore(polygon_store_dir, TRAIN_LABEL_ROOT) \
+            if polygon_store_dir else None
 
     def __len__(self):
         return len(self.filenames)
     
     def gamma_correction(self, image, gamma):
-        """Apply gamma correction to the image."""
-        image = np.array(image / 255.0, dtype=float)
-        corrected_image = np.power(image, gamma)
-        corrected_image = np.uint8(corrected_image * 255)
-        return corrected_image
+        """Apply gamma correction to the uint8 image with a 256-entry lookup table."""
+        table = ((np.arange(256) / 255.0) ** gamma * 255).astype(np.uint8)
+        return cv2.LUT(image, table)
     
     def __getitem__(self, item):
         image_name = self.filenames[item]
         image_path = os.path.join(TRAIN_IMAGE_ROOT, image_name)
-        image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE) / 255.0  # 1채널 이미지로 읽기
+        image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)  # 1채널 uint8 이미지로 읽기
 
-        # 감마 보정 적용 (gamma_value가 지정된 경우)
+        # 감마 보정 적용 (gamma_value가 지정된 경우, float 변환 전 uint8에서 LUT로)
         if self.gamma_value is not None:
             image = self.gamma_correction(image, self.gamma_value)
+        image = image / 255.0
 
         # 이미지 차원 확장 (1채널 -> 3채널로 변환)
         image = np.expand_dims(image, axis=-1)  # (H, W, 1)
@@ -66,14 +69,15 @@ class XRayDataset(Dataset):
         label_shape = tuple(image.shape[:2]) + (len(CLASSES),)
         label = np.zeros(label_shape, dtype=np.uint8)
 
-        with open(label_path, "r") as f:
-            annotations = json.load(f)
-        annotations = annotations["annotations"]
+        if self.polygon_store is not None:
+            polygons = self.polygon_store.get(label_name, CLASS2IND)
+        else:
+            with open(label_path, "r") as f:
+                annotations = json.load(f)
+            annotations = annotations["annotations"]
+            polygons = [(CLASS2IND[ann["label"]], np.array(ann["points"])) for ann in annotations]
 
-        for ann in annotations:
-            c = ann["label"]
-            class_ind = CLASS2IND[c]
-            points = np.array(ann["points"])
+        for class_ind, points in polygons:
             class_label = np.zeros(image.shape[:2], dtype=np.uint8)
             cv2.fillPoly(class_label, [points], 1)
             label[..., class_ind] = class_label
@@ -6,11 +6,14 @@ import torch
 from torch.utils.data import Dataset
 from sklearn.model_selection import GroupKFold
 from config import TRAIN_IMAGE_ROOT, TRAIN_LABEL_ROOT, CLASSES, CLASS2IND, \
-    train_jsons, train_pngs, TEST_IMAGE_ROOT, test_pngs
+    train_jsons, train_pngs, TEST_IMAGE_ROOT, test_pngs, POLYGON_STORE_DIR
+from dataset.label_engine import fill_polygon
+from dataset.polygon_store import PolygonStore
 
 
 class XRayDataset(Dataset):
-    def __init__(self, is_train=True, transforms=None):
+    def __init__(self, is_train=True, transforms=None, label_size=None, supersample=4,
+                 polygon_store_dir=POLYGON_STORE_DIR):
         _filenames = np.array(train_pngs)
         _labelnames = np.array(train_jsons)
 
@@ -36,6 +39,23 @@ class XRayDataset(Dataset):
         self.labelnames = labelnames
         self.is_train = is_train
         self.transforms = transforms
+        # label_size를 지정하면 polygon을 해당 해상도에서 바로 rasterize (이미지도 같은 크기로 resize)
+        # validation은 원본 해상도 label로 평가하므로 학습에만 적용
+        self.label_size = (label_size, label_size) if label_size and is_train else None
+        self.supersample = supersample
+        # polygon store: JSON 파싱 대신 memmap 된 좌표 view를 사용
+        self.polygon_store = PolygonStore(polygon_store_dir, TRAIN_LABEL_ROOT) \
+            if polygon_store_dir else None
+
+    def _load_polygons(self, label_name):
+        if self.polygon_store is not None:
+            return self.polygon_store.get(label_name, CLASS2IND)
+
+        label_path = os.path.join(TRAIN_LABEL_ROOT, label_name)
+        with open(label_path, "r") as f:
+            annotations = json.load(f)
+        annotations = annotations["annotations"]
+        return [(CLASS2IND[ann["label"]], ann["points"]) for ann in annotations]
 
     def __len__(self):
         return len(self.filenames)
@@ -43,25 +63,21 @@ class XRayDataset(Dataset):
     def __getitem__(self, item):
         image_name = self.filenames[item]
         image_path = os.path.join(TRAIN_IMAGE_ROOT, image_name)
-        image = cv2.imread(image_path) / 255.0
+        image = cv2.imread(image_path)
+        src_size = image.shape[:2]
+        if self.label_size is not None:
+            image = cv2.resize(image, self.label_size[::-1], interpolation=cv2.INTER_LINEAR)
+        image = image / 255.0
 
         label_name = self.labelnames[item]
-        label_path = os.path.join(TRAIN_LABEL_ROOT, label_name)
 
         label_shape = tuple(image.shape[:2]) + (len(CLASSES),)
         label = np.zeros(label_shape, dtype=np.uint8)
 
-        with open(label_path, "r") as f:
-            annotations = json.load(f)
-        annotations = annotations["annotations"]
-
-        for ann in annotations:
-            c = ann["label"]
-            class_ind = CLASS2IND[c]
-            points = np.array(ann["points"])
-            class_label = np.zeros(image.shape[:2], dtype=np.uint8)
-            cv2.fillPoly(class_label, [points], 1)
-            label[..., class_ind] = class_label
+        for class_ind, points in self._load_polygons(label_name):
+            label[..., class_ind] = fill_polygon(
+                points, src_size, image.shape[:2], self.supersample if self.label_size else 1
+            )
 
         if self.transforms is not None:
             inputs = {"image": image, "mask": label} if self.is_train else {"image": image}
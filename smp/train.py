@@ -34,7 +34,7 @@ wandb.config.update({
 
 # 데이터셋 로딩
 tf = A.Resize(512, 512)
-train_dataset = XRayDataset(is_train=True, transforms=tf)
+train_dataset = XRayDataset(is_train=True, transforms=tf, label_size=512)
 valid_dataset = XRayDataset(is_train=False, transforms=tf)
 
 # 훈련 및 검증 데이터 로더 설정
@@ -6,11 +6,57 @@ class Config:
     TRAIN_LABEL_ROOT = "../data/train/outputs_json"
     TEST_IMAGE_ROOT = "../data/test/DCM"
     META_PATH = "../data/meta_data.xlsx"
+    # python preprocess.py manifest 로 생성. 파일이 있으면 StratifiedXRayDataset이 바로 사용
+    MANIFEST_PATH = "../data/manifest.npz"
+    FOLD = 0 # validation으로 사용할 fold 번호
+
+    # Label cache: None이면 매 sample마다 JSON을 rasterize
+    # 경로를 지정하면 최초 1회 bit-packed memmap으로 캐싱 (예: "../data/cache/labels")
+    LABEL_CACHE_DIR = None
+    # Polygon store: label cache를 쓰지 않을 때 JSON 대신 flat int32 polygon 배열을 memmap으로 읽음 (예: "../data/cache/polygons")
+    POLYGON_STORE_DIR = None
+    # Image store: 경로를 지정하면 PNG를 1회 decode 해서 grayscale uint8 memmap으로 저장 (예: "../data/cache")
+    IMAGE_STORE_DIR = None
+    # Pyramid: IMAGE_STORE_DIR, LABEL_CACHE_DIR를 2048/1024/512 해상도별로 미리 만들어 두고 (python preprocess.py pyramid)
+    # dataset이 요청 해상도 이상인 가장 작은 level을 사용 (예: (2048, 1024, 512))
+    PYRAMID_LEVELS = None
+    # uint8 pipeline: image/mask를 uint8로 augmentation/collate 하고 device에서 float 변환 + 정규화
+    UINT8_PIPELINE = False
+    # Bitfield masks: 학습 transform 전에 29채널 mask를 class 축 bitfield (4채널 uint8)로 만들어 한 번에 warp
+    # (label cache / shard의 packed label은 unpack 없이 그대로 사용)
+    BITFIELD_MASKS = False
+    # Packed labels: worker가 label을 class 축으로 bit-packing (29채널 -> 4 byte) 해서 넘기고 Transforms.to_device에서 unpack
+    PACKED_LABELS = False
+    # Batch fetch: DataLoader worker가 batch 단위(__getitems__)로 이미지 read / label rasterize를 thread로 동시에 수행
+    # (1 이하면 sample 단위로 순서대로 처리, num_workers와 곱해진 thread 수가 CPU 수를 넘지 않게 설정)
+    FETCH_THREADS = 1
+    # Ring buffer: 0보다 크면 train batch를 미리 할당한 pinned buffer N개에 돌려 가며 채움 (dataset/ring_buffer.py)
+    # batch shape가 고정일 때 step 마다 stack / pin 할당과 복사를 줄임
+    RING_BUFFERS = 0
+    # Data echoing: DataLoader batch를 device에서 ECHO_FACTOR 번 재사용 (2번째부터 device flip/affine/brightness 적용)
+    # ECHO_ADAPTIVE면 loader 대기 시간에 맞춰 1 ~ ECHO_MAX_FACTOR 사이에서 자동 조절
+    ECHO_FACTOR = 1
+    ECHO_ADAPTIVE = False
+    ECHO_MAX_FACTOR = 4
+    # Device augmentation: True면 worker는 decode만 하고 (uint8, resize 없음) train recipe (resize / gamma / rotate /
+    # flip / brightness / contrast)를 device에서 batch 단위로 적용 (dataset/gpu_transforms.py BatchAugment)
+    # 원본 해상도 mask를 옮기므로 PACKED_LABELS와 같이 사용 권장
+    DEVICE_AUGMENT = False
+    # Shard: python preprocess.py shards 로 생성한 tar shard 경로 (예: "../data/shards")
+    # 지정하면 train.py가 XRayShardDataset으로 shard를 순차적으로 stream
+    SHARD_DIR = None
+    # Augment bank: python preprocess.py bank 로 학습 이미지마다 AUGMENT_BANK_VARIANTS 개의 augmentation 결과를 미리 만들어 둔 경로
+    # (예: "../data/augment_bank"). 지정하면 train.py가 epoch 마다 variant 하나를 memmap에서 읽음 (online augmentation 없음)
+    AUGMENT_BANK_DIR = None
+    AUGMENT_BANK_VARIANTS = 8
+    # Validation cache: True면 resize 된 validation image/mask를 1회만 만들어 shared memory에 두고 재사용
+    VALID_CACHE = False
     
     # Model
     MODEL_ARCHITECTURE = 'UnetPlusPlus' # [Unet, UnetPlusPlus, FPN, PSPNet, DeepLabV3, DeepLabV3Plus, LinkNet, MAnet, PAN, UPerNet]
     ENCODER_NAME = 'tu-hrnet_w64' # encoder 이름 Timm encoder 사용시 이름 앞에 tu- 붙임
     ENCODER_WEIGHTS = 'imagenet' # pretrained weights
+    IN_CHANNELS = 3 # 1이면 grayscale 입력 (smp가 pretrained 첫 conv weight를 1채널로 합쳐줌)
 
     TRAIN_BATCH_SIZE = 2
     VAL_BATCH_SIZE = 2
@@ -20,6 +66,31 @@ class Config:
     RANDOM_SEED = 21
 
     IMG_SIZE = 512
+    # Fused geometry: True면 train transform의 Resize + Rotate + HorizontalFlip을 warpAffine 한 번으로 합쳐서 적용
+    FUSED_GEOMETRY = False
+    # LUT intensity: True면 train transform의 RandomGamma + RandomBrightnessContrast를 256칸 LUT 하나로 합쳐서
+    # cv2.LUT 한 번으로 적용 (uint8 pipeline에서 효과가 큼, geometry 뒤에 적용)
+    LUT_INTENSITY = False
+
+    # Tile training: 값을 지정하면 학습 시 resize 대신 원본 해상도에서 TILE_SIZE tile을 잘라서 학습 (예: 512, 768)
+    # validation도 resize 없이 원본 해상도로 평가 (dataset/tiles.py)
+    TILE_SIZE = None
+    TILES_PER_EPOCH = 4000  # epoch 당 tile 수
+    TILE_FG_PROB = 0.9  # foreground map 가중으로 tile 위치를 고르는 비율 (나머지는 균일)
+    # 이미지별 bone coverage를 FOREGROUND_CELL 픽셀 격자로 줄인 map (없으면 자동 생성, python preprocess.py foreground)
+    FOREGROUND_MAP_PATH = "../data/foreground.npz"
+    FOREGROUND_CELL = 32
+
+    # Label rasterization: None이면 원본(2048) 해상도에서 rasterize 후 transform에서 Resize
+    # 값을 지정하면 polygon 좌표를 LABEL_SIZE로 scale 해서 바로 채우고 이미지도 같은 크기로 줄임
+    LABEL_SIZE = None  # 예: IMG_SIZE
+    LABEL_SUPERSAMPLE = 4  # sub-pixel supersampling 배율 (1이면 사용 안 함)
+
+    # Hard example sampler: True면 학습 step의 sample별/class별 loss를 기록해서 loss에 비례해 다음 epoch sample을 뽑음
+    HARD_SAMPLER = False
+    HARD_SAMPLER_FLOOR = 0.3  # 균일 분포를 섞는 비율
+    HARD_SAMPLER_MOMENTUM = 0.5  # sample별 loss EMA
+    HARD_SAMPLER_WARMUP = 2  # 처음 몇 epoch은 균일하게 shuffle
 
     # Loss
     LOSS_TYPE = "bce" # [ "bce", "dice", "focal" ]
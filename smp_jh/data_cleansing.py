@@ -1,59 +1,58 @@
-import os
+import argparse
 from config.config import Config
-from dataset.dataset import StratifiedXRayDataset
-from dataset.transforms import Transforms
+from dataset.annotation_check import validate_annotations, invalidate_caches
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="전체 어노테이션 검사 및 rule 기반 수정")
+    parser.add_argument("--label_root", type=str, default=Config.TRAIN_LABEL_ROOT)
+    parser.add_argument("--image_root", type=str, default=Config.TRAIN_IMAGE_ROOT)
+    parser.add_argument("--rules", type=str, default="config/cleansing_rules.json", help="수정 rule 파일 (JSON)")
+    parser.add_argument("--fix", action="store_true", help="rule을 적용해서 JSON 수정 (없으면 검사만)")
+    parser.add_argument("--report", type=str, default="../data/annotation_report.json")
+    parser.add_argument("--num_workers", type=int, default=8)
+    parser.add_argument("--no_backup", action="store_true", help="수정 전 .backup 파일을 남기지 않음")
+    return parser.parse_args()
+
 
 def clean_dataset():
     """
-    train과 validation 데이터셋 모두에 대해 클렌징 작업을 수행하는 메인 함수
+    모든 어노테이션을 병렬로 검사하고, --fix면 rule 파일의 수정 사항을 한 번에 적용한 뒤
+    수정된 파일로 만든 label cache 등 파생 cache를 무효화
     """
-    print("Initializing datasets...")
-    
-    # Train 데이터셋 초기화
-    train_dataset = StratifiedXRayDataset(
-        image_root=Config.TRAIN_IMAGE_ROOT,
-        label_root=Config.TRAIN_LABEL_ROOT,
-        is_train=True,
-        transforms=None,  # 클렌징 작업에는 transform 불필요
-        meta_path=Config.META_PATH
-    )
-    
-    # Validation 데이터셋 초기화
-    valid_dataset = StratifiedXRayDataset(
-        image_root=Config.TRAIN_IMAGE_ROOT,
-        label_root=Config.TRAIN_LABEL_ROOT,
-        is_train=False,
-        transforms=None,
-        meta_path=Config.META_PATH
-    )
-    
-    # 클렌징 작업 수행
-    print("\nPerforming dataset cleaning...")
-    
-    # Train 데이터셋 클렌징
-    print("\nCleaning train dataset...")
-    train_dataset.fix_specific_annotation(
-        id_folder="ID058",
-        image_name="image1661392103627.png"
-    )
-    
-    # Validation 데이터셋 클렌징
-    print("\nCleaning validation dataset...")
-    valid_dataset.fix_specific_annotation(
-        id_folder="ID058",
-        image_name="image1661392103627.png"
+    args = parse_args()
+
+    report = validate_annotations(
+        args.label_root,
+        image_root=args.image_root,
+        rules_path=args.rules,
+        fix=args.fix,
+        num_workers=args.num_workers,
+        report_path=args.report,
+        backup=not args.no_backup,
     )
-    
-    # 클렌징 결과 확인
-    print("\nVerifying cleaned annotations...")
-    print("\nTrain dataset:")
-    train_dataset.clean_image_annotations("ID058", "image1661392103627.png")
-    
-    print("\nValidation dataset:")
-    valid_dataset.clean_image_annotations("ID058", "image1661392103627.png")
-    
-    print("\nData cleansing completed!")
-    print("Please check the visualization folders to verify the changes.")
+
+    print(f"\nChecked {report['num_files']} annotation files")
+    for kind, count in report["summary"].items():
+        print(f"  {kind}: {count}")
+
+    if args.fix:
+        print(f"\nModified {len(report['changed'])} files")
+        for kind, count in report["summary_after_fix"].items():
+            print(f"  {kind} (after fix): {count}")
+
+        invalidated = invalidate_caches(report["changed"])
+        for path in invalidated["label_cache"]:
+            print(f"Marked stale entries in {path}")
+        for path in invalidated["removed"]:
+            print(f"Removed {path}")
+        if invalidated["stale_shards"]:
+            print(f"Re-export shards (python preprocess.py shards): {', '.join(invalidated['stale_shards'])}")
+        for path in invalidated["stale_bank"]:
+            print(f"Rebuild augment bank (python preprocess.py bank): {path}")
+
+    print(f"\nReport saved to {args.report}")
+
 
 if __name__ == "__main__":
-    clean_dataset()
\ No newline at end of file
+    clean_dataset()
@@ -0,0 +1,365 @@
+import os
+import json
+import shutil
+import fnmatch
+import tarfile
+from collections import Counter, defaultdict
+from multiprocessing import Pool
+import numpy as np
+from tqdm.auto import tqdm
+from config.config import Config
+from dataset.dataset import read_image_size
+from dataset.label_cache import LabelCache
+from dataset.label_engine import polygon_geometry
+from dataset.polygon_store import PolygonStore
+from dataset.augment_bank import AugmentBank
+
+# 엄지 쪽 / 새끼손가락 쪽에 있어야 하는 class 쌍 (손가락 위치로 정한 방향과 반대면 좌우가 뒤바뀐 것으로 봄)
+SIDE_PAIRS = [("Radius", "Ulna"), ("Trapezium", "Hamate"), ("Scaphoid", "Triquetrum")]
+THUMB_CLASSES = ["finger-1", "finger-2", "finger-3"]
+PINKY_CLASSES = ["finger-16", "finger-17", "finger-18", "finger-19"]
+
+
+def _issue(kind, label=None, index=None, detail=None):
+    return {"type": kind, "label": label, "index": index, "detail": detail}
+
+
+def _as_points(points):
+    """(K, 2) 좌표 배열로 변환. 모양이 잘못되었으면 None"""
+    try:
+        points = np.asarray(points, dtype=np.float64)
+    except (TypeError, ValueError):
+        return None
+    if points.ndim != 2 or points.shape[1] != 2:
+        return None
+    return points
+
+
+def _is_degenerate(points):
+    return points is None or len(points) < 3 or polygon_geometry(points)[0] == 0
+
+
+def _mean_x(polygons):
+    return float(np.mean([points[:, 0].mean() for points in polygons]))
+
+
+def swapped_pairs(annotations):
+    """
+    손가락 위치로 엄지 방향을 정하고, SIDE_PAIRS 중 방향이 반대인 쌍을 반환
+    엄지 / 새끼손가락 class가 없으면 판단하지 않음
+    """
+    polygons = defaultdict(list)
+    for ann in annotations:
+        points = _as_points(ann.get("points"))
+        if points is not None and len(points) > 0:
+            polygons[ann.get("label")].append(points)
+
+    thumb = [p for name in THUMB_CLASSES for p in polygons.get(name, [])]
+    pinky = [p for name in PINKY_CLASSES for p in polygons.get(name, [])]
+    if not thumb or not pinky:
+        return []
+    thumb_side = np.sign(_mean_x(thumb) - _mean_x(pinky))
+
+    swapped = []
+    for thumb_class, pinky_class in SIDE_PAIRS:
+        if thumb_class in polygons and pinky_class in polygons:
+            side = np.sign(_mean_x(polygons[thumb_class]) - _mean_x(polygons[pinky_class]))
+            if side != 0 and side != thumb_side:
+                swapped.append((thumb_class, pinky_class))
+    return swapped
+
+
+def check_annotations(annotations, image_size=None, classes=Config.CLASSES):
+    """
+    한 이미지의 어노테이션 목록 검사
+
+    Args:
+        annotations (list): JSON의 "annotations"
+        image_size (tuple, optional): (H, W). 지정하면 좌표 범위를 검사
+        classes (list): 있어야 하는 class 목록
+
+    Returns:
+        list: {"type", "label", "index", "detail"} issue 목록
+            type: missing_field, unknown_label, degenerate_polygon, out_of_bounds,
+                  missing_label, duplicate_label, swapped_sides
+    """
+    issues = []
+    counts = Counter()
+    for i, ann in enumerate(annotations):
+        label = ann.get("label")
+        if label is None or "points" not in ann:
+            issues.append(_issue("missing_field", label, i, "label" if label is None else "points"))
+            continue
+        if label not in classes:
+            issues.append(_issue("unknown_label", label, i))
+        counts[label] += 1
+
+        points = _as_points(ann["points"])
+        if _is_degenerate(points):
+            detail = "invalid shape" if points is None else f"{len(points)} points, zero area"
+            issues.append(_issue("degenerate_polygon", label, i, detail))
+        if points is not None and image_size is not None and len(points) > 0:
+            height, width = image_size
+            outside = (points[:, 0] < 0) | (points[:, 0] >= width) | (points[:, 1] < 0) | (points[:, 1] >= height)
+            if outside.any():
+                issues.append(_issue("out_of_bounds", label, i, f"{int(outside.sum())}/{len(points)} points"))
+
+    for name in classes:
+        if counts[name] == 0:
+            issues.append(_issue("missing_label", name))
+        elif counts[name] > 1:
+            issues.append(_issue("duplicate_label", name, detail=f"{counts[name]} polygons"))
+
+    for thumb_class, pinky_class in swapped_pairs(annotations):
+        issues.append(_issue("swapped_sides", thumb_class, detail=f"{thumb_class} <-> {pinky_class}"))
+    return issues
+
+
+def load_rules(rules_path):
+    """
+    수정 rule 파일 (JSON) 로드
+
+    Format:
+        {"rules": [{"id": "ID058-mirrored", "match": "ID058/*.json", "relabel": {"finger-1": "finger-3", ...}}, ...]}
+
+        id              rule 이름 (relabel rule은 필수)
+        match           라벨 상대경로 glob (fnmatch)
+        remove          삭제할 label 목록
+        relabel         label 이름 매핑 (동시에 적용하므로 swap 가능). 다시 적용하면 원래대로 돌아가거나
+                        순환하므로 적용한 rule id를 JSON의 "applied_rules"에 기록하고 한 번만 적용
+        clip_points     true면 이미지 밖 좌표를 경계로 clip
+        drop_degenerate true면 점이 3개 미만이거나 면적이 0인 polygon 삭제
+        fix_swapped     true면 swapped_sides로 검출된 쌍의 label을 서로 바꿈
+    """
+    if rules_path is None:
+        return []
+    with open(rules_path, "r") as f:
+        rules = json.load(f)["rules"]
+    for rule in rules:
+        if rule.get("relabel") and not rule.get("id"):
+            raise ValueError(f"relabel rule for {rule.get('match', '*')} needs an 'id' ({rules_path})")
+    return rules
+
+
+def apply_rules(annotations, rules, label_name, image_size=None, applied=()):
+    """
+    label_name에 match 되는 rule을 순서대로 적용
+
+    Args:
+        applied (list): 이미 적용된 rule id (JSON의 "applied_rules"). 여기 있는 relabel rule은 건너뜀
+
+    Returns:
+        tuple: (수정된 annotations, 변경 내역 문자열 list, 적용된 rule id list)
+    """
+    changes = []
+    applied = list(applied)
+    for rule in rules:
+        if not fnmatch.fnmatch(label_name, rule.get("match", "*")):
+            continue
+
+        if rule.get("remove"):
+            kept = [ann for ann in annotations if ann.get("label") not in rule["remove"]]
+            if len(kept) != len(annotations):
+                changes.append(f"removed {len(annotations) - len(kept)} polygons ({', '.join(rule['remove'])})")
+            annotations = kept
+
+        if rule.get("relabel") and rule["id"] not in applied:
+            for ann in annotations:
+                new_label = rule["relabel"].get(ann.get("label"))
+                if new_label is not None and new_label != ann["label"]:
+                    changes.append(f"relabel {ann['label']} -> {new_label}")
+                    ann["label"] = new_label
+            applied.append(rule["id"])
+
+        if rule.get("clip_points") and image_size is not None:
+            height, width = image_size
+            for ann in annotations:
+                points = _as_points(ann.get("points"))
+                if points is None or len(points) == 0:
+                    continue
+                clipped = np.stack([points[:, 0].clip(0, width - 1), points[:, 1].clip(0, height - 1)], axis=1)
+                if not np.array_equal(clipped, points):
+                    changes.append(f"clip {ann['label']}")
+                    ann["points"] = clipped.astype(np.asarray(ann["points"]).dtype).tolist()
+
+        if rule.get("drop_degenerate"):
+            kept = [ann for ann in annotations if not _is_degenerate(_as_points(ann.get("points")))]
+            if len(kept) != len(annotations):
+                changes.append(f"dropped {len(annotations) - len(kept)} degenerate polygons")
+            annotations = kept
+
+        if rule.get("fix_swapped"):
+            for thumb_class, pinky_class in swapped_pairs(annotations):
+                for ann in annotations:
+                    if ann.get("label") == thumb_class:
+                        ann["label"] = pinky_class
+                    elif ann.get("label") == pinky_class:
+                        ann["label"] = thumb_class
+                changes.append(f"swap {thumb_class} <-> {pinky_class}")
+
+    return annotations, changes, applied
+
+
+def _write_json(path, data):
+    # 같은 디렉토리에 쓴 뒤 교체해서 중간에 실패해도 원본이 깨지지 않도록 함
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _process(task):
+    label_name, label_root, image_root, rules, fix, backup = task
+    label_path = os.path.join(label_root, label_name)
+    result = {"name": label_name, "issues": [], "changes": [], "remaining": []}
+
+    try:
+        with open(label_path, "r") as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        result["issues"].append(_issue("invalid_json", detail=str(e)))
+        return result
+
+    image_size = None
+    if image_root is not None:
+        image_path = os.path.join(image_root, os.path.splitext(label_name)[0] + ".png")
+        if os.path.exists(image_path):
+            image_size = read_image_size(image_path)
+        else:
+            result["issues"].append(_issue("missing_image", detail=image_path))
+
+    annotations = data.get("annotations", [])
+    result["issues"] += check_annotations(annotations, image_size)
+    if not fix or not rules:
+        return result
+
+    annotations, changes, applied = apply_rules(annotations, rules, label_name, image_size,
+                                                data.get("applied_rules", []))
+    if changes:
+        if backup and not os.path.exists(label_path + ".backup"):
+            shutil.copy2(label_path, label_path + ".backup")
+        data["annotations"] = annotations
+        data["applied_rules"] = applied
+        _write_json(label_path, data)
+        result["changes"] = changes
+        result["remaining"] = check_annotations(annotations, image_size)
+    return result
+
+
+def validate_annotations(label_root, image_root=None, labelnames=None, rules_path=None, fix=False,
+                         num_workers=8, report_path=None, backup=True):
+    """
+    모든 어노테이션 JSON을 process pool로 검사하고 (fix=True면) rule을 한 번에 적용
+
+    파일마다 JSON을 한 번 읽어서 검사 -> rule 적용 -> atomic write -> 재검사까지 worker에서 처리한다.
+
+    Args:
+        label_root (str): 라벨 root
+        image_root (str, optional): 이미지 root (좌표 범위 검사용 이미지 크기를 PNG header에서 읽음)
+        labelnames (list, optional): label_root 기준 JSON 상대경로. None이면 label_root 아래 모든 JSON
+        rules_path (str, optional): 수정 rule 파일 (load_rules 참고)
+        fix (bool): rule을 적용해서 파일을 수정할지 여부
+        num_workers (int): process 수
+        report_path (str, optional): 결과 report (JSON) 저장 경로
+        backup (bool): 수정 전 {file}.backup을 (없을 때만) 남길지 여부
+
+    Returns:
+        dict: {"summary": issue 종류별 개수, "files": 문제가 있거나 수정된 파일별 결과, "changed": 수정된 파일 목록}
+    """
+    if labelnames is None:
+        labelnames = PolygonStore.list_labels(label_root)
+    rules = load_rules(rules_path)
+
+    tasks = [(name, label_root, image_root, rules, fix, backup) for name in labelnames]
+    files = {}
+    with Pool(num_workers) as pool:
+        for result in tqdm(pool.imap_unordered(_process, tasks, chunksize=16), total=len(tasks),
+                           desc="Validating annotations"):
+            if result["issues"] or result["changes"]:
+                files[result["name"]] = result
+
+    summary = Counter(issue["type"] for result in files.values() for issue in result["issues"])
+    report = {
+        "num_files": len(labelnames),
+        "summary": dict(sorted(summary.items())),
+        "changed": sorted(name for name, result in files.items() if result["changes"]),
+        "files": dict(sorted(files.items())),
+    }
+    if fix:
+        remaining = Counter(issue["type"] for result in files.values()
+                            for issue in (result["remaining"] if result["changes"] else result["issues"]))
+        report["summary_after_fix"] = dict(sorted(remaining.items()))
+
+    if report_path is not None:
+        os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+        tmp_path = report_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, report_path)
+    return report
+
+
+def invalidate_caches(changed, label_cache_dir=Config.LABEL_CACHE_DIR, polygon_store_dir=Config.POLYGON_STORE_DIR,
+                      foreground_map_path=Config.FOREGROUND_MAP_PATH,
+                      shard_dir=Config.SHARD_DIR, augment_bank_dir=Config.AUGMENT_BANK_DIR):
+    """
+    수정된 라벨 파일로 만든 파생 cache 무효화
+
+    label cache (해상도별 / pyramid 포함)는 해당 파일의 entry만 stale로 표시해서 다음 sync 때 그 slot만
+    다시 rasterize 하고, 파일 단위로 갱신할 수 없는 polygon store / foreground map은 지워서
+    다음 사용 시 다시 만든다. tar shard / augment bank는 다시 만들어야 하므로 해당 목록만 반환한다.
+
+    Args:
+        changed (list): 수정된 라벨 상대경로
+
+    Returns:
+        dict: {"label_cache": stale 표시한 index 경로, "removed": 지운 파일, "stale_shards": 다시 만들어야 하는 shard,
+               "stale_bank": 다시 만들어야 하는 augment bank 경로}
+    """
+    result = {"label_cache": [], "removed": [], "stale_shards": [], "stale_bank": []}
+    if not changed:
+        return result
+    changed = set(changed)
+
+    if label_cache_dir and os.path.isdir(label_cache_dir):
+        for root, _dirs, files in os.walk(label_cache_dir):
+            if LabelCache.INDEX_NAME not in files:
+                continue
+            index_path = os.path.join(root, LabelCache.INDEX_NAME)
+            with open(index_path, "r") as f:
+                index = json.load(f)
+            entries = index.get("entries", {})
+            hits = changed & set(entries)
+            if not hits:
+                continue
+            for name in hits:
+                # mtime을 맞지 않는 값으로 바꿔서 sync 시 stale로 판정
+                entries[name][1] = -1
+            _write_json(index_path, index)
+            result["label_cache"].append(index_path)
+
+    paths = [
+        os.path.join(polygon_store_dir, PolygonStore.INDEX_NAME) if polygon_store_dir else None,
+        foreground_map_path,
+    ]
+    for path in paths:
+        if path and os.path.exists(path):
+            os.remove(path)
+            result["removed"].append(path)
+
+    index_path = os.path.join(shard_dir, "index.json") if shard_dir else None
+    if index_path and os.path.exists(index_path):
+        keys = {os.path.splitext(name)[0].replace("/", "__") for name in changed}
+        with open(index_path, "r") as f:
+            shards = json.load(f)["shards"]
+        for shard in shards:
+            with tarfile.open(os.path.join(shard_dir, shard["path"]), "r") as tar:
+                if any(member.name.split(".", 1)[0] in keys for member in tar.getmembers()):
+                    result["stale_shards"].append(shard["path"])
+
+    index_path = os.path.join(augment_bank_dir, AugmentBank.INDEX_NAME) if augment_bank_dir else None
+    if index_path and os.path.exists(index_path):
+        with open(index_path, "r") as f:
+            if changed & set(json.load(f)["labelnames"]):
+                result["stale_bank"].append(augment_bank_dir)
+    return result
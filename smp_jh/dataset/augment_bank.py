@@ -0,0 +1,213 @@
+import os
+import json
+import numpy as np
+import torch
+from multiprocessing import Pool
+from torch.utils.data import Dataset
+from tqdm.auto import tqdm
+from config.config import Config
+
+
+class AugmentBank:
+    """
+    학습 이미지마다 augmentation 결과 variant를 미리 만들어 둔 memmap bank
+
+    Layout:
+        {bank_dir}/images.bin : (N, V, C, H, W) uint8 (train transform 적용 후 channel first)
+        {bank_dir}/labels.bin : (N, V, ceil(NC / 8), H, W) uint8, class 축 bit-packing
+        {bank_dir}/index.json : shape, variant 수, seed, transform, 파일 목록, 라벨 파일별 [mtime_ns, size]
+
+    XRayDataset이 uint8 + packed로 반환하는 sample을 그대로 저장하므로 읽을 때는 memmap slot을 복사만 한다.
+    index는 데이터를 다 쓴 뒤 마지막에 쓰므로 build 도중 실패한 bank는 유효하지 않다.
+    """
+    IMAGES_NAME = "images.bin"
+    LABELS_NAME = "labels.bin"
+    INDEX_NAME = "index.json"
+
+    def __init__(self, bank_dir):
+        self.bank_dir = bank_dir
+        self.images_path = os.path.join(bank_dir, self.IMAGES_NAME)
+        self.labels_path = os.path.join(bank_dir, self.LABELS_NAME)
+        self.index_path = os.path.join(bank_dir, self.INDEX_NAME)
+
+        if not os.path.exists(self.index_path):
+            raise FileNotFoundError(f"Augment bank not found: {bank_dir} (python preprocess.py bank)")
+        with open(self.index_path, "r") as f:
+            index = json.load(f)
+        self.image_shape = tuple(index["image_shape"])
+        self.label_shape = tuple(index["label_shape"])
+        self.num_classes = index["num_classes"]
+        self.filenames = index["filenames"]
+        self.labelnames = index["labelnames"]
+        self.label_root = index["label_root"]
+        self.stats = index["stats"]
+
+        # worker 마다 lazy 하게 memmap을 연다 (pickle 시 배열 복사 방지)
+        self._images = None
+        self._labels = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_images"] = None
+        state["_labels"] = None
+        return state
+
+    def __len__(self):
+        return self.image_shape[0]
+
+    @property
+    def num_variants(self):
+        return self.image_shape[1]
+
+    @property
+    def images(self):
+        if self._images is None:
+            self._images = np.memmap(self.images_path, dtype=np.uint8, mode="r", shape=self.image_shape)
+        return self._images
+
+    @property
+    def labels(self):
+        if self._labels is None:
+            self._labels = np.memmap(self.labels_path, dtype=np.uint8, mode="r", shape=self.label_shape)
+        return self._labels
+
+    def stale(self):
+        """bank를 만든 뒤 수정된 라벨 파일 목록 (다시 build 해야 함)"""
+        stale = []
+        for name, stat in zip(self.labelnames, self.stats):
+            path = os.path.join(self.label_root, name)
+            if not os.path.exists(path):
+                stale.append(name)
+                continue
+            st = os.stat(path)
+            if [st.st_mtime_ns, st.st_size] != stat:
+                stale.append(name)
+        return stale
+
+    def get(self, item, variant):
+        """(C, H, W) uint8 image, (ceil(NC / 8), H, W) packed label (slot에서 복사)"""
+        return np.array(self.images[item, variant]), np.array(self.labels[item, variant])
+
+
+_worker = {}
+
+
+def _init_worker(dataset, images_path, labels_path, image_shape, label_shape, seed):
+    # process 마다 memmap을 한 번만 열고, 각 task는 자기 slot에 직접 기록 (결과 배열을 pipe로 보내지 않음)
+    _worker.update(dataset=dataset, seed=seed)
+    _worker["images"] = np.memmap(images_path, dtype=np.uint8, mode="r+", shape=image_shape)
+    _worker["labels"] = np.memmap(labels_path, dtype=np.uint8, mode="r+", shape=label_shape)
+
+
+def _build_sample(item):
+    dataset = _worker["dataset"]
+    num_variants = _worker["images"].shape[1]
+    # 이미지별 seed를 고정해서 몇 개의 process로 만들어도 같은 bank가 나오도록 함
+    dataset.transforms.set_random_seed(_worker["seed"] * 1000003 + item)
+    for variant in range(num_variants):
+        image, label = dataset[item]
+        _worker["images"][item, variant] = image.numpy()
+        _worker["labels"][item, variant] = label.numpy()
+    return item
+
+
+def build_augment_bank(bank_dir, dataset, num_variants=Config.AUGMENT_BANK_VARIANTS, num_workers=8,
+                       seed=Config.RANDOM_SEED):
+    """
+    dataset의 train transform으로 이미지마다 num_variants 개의 augmentation 결과를 process pool로 만들어 저장
+
+    Args:
+        bank_dir (str): 저장 경로
+        dataset (XRayDataset): is_train=True, uint8=True, packed=True이고 transform 출력 크기가 고정인 dataset
+        num_variants (int): 이미지 당 variant 수
+        num_workers (int): process 수
+        seed (int): augmentation seed
+    """
+    assert dataset.is_train and dataset.uint8 and dataset.packed, "dataset must be is_train / uint8 / packed"
+    assert dataset.transforms is not None, "dataset needs a train transform"
+
+    # 첫 sample로 고정 출력 크기 확인 (Resize가 있는 train transform이어야 함)
+    image, label = dataset[0]
+    image_shape = (len(dataset), num_variants) + tuple(image.shape)
+    label_shape = (len(dataset), num_variants) + tuple(label.shape)
+
+    os.makedirs(bank_dir, exist_ok=True)
+    images_path = os.path.join(bank_dir, AugmentBank.IMAGES_NAME)
+    labels_path = os.path.join(bank_dir, AugmentBank.LABELS_NAME)
+    index_path = os.path.join(bank_dir, AugmentBank.INDEX_NAME)
+    # 이전 index는 지워서 중간에 실패해도 유효하게 보이지 않도록 함
+    if os.path.exists(index_path):
+        os.remove(index_path)
+    np.memmap(images_path, dtype=np.uint8, mode="w+", shape=image_shape).flush()
+    np.memmap(labels_path, dtype=np.uint8, mode="w+", shape=label_shape).flush()
+
+    print(f"Building augment bank in {bank_dir} ({len(dataset)} images x {num_variants} variants, "
+          f"{(np.prod(image_shape) + np.prod(label_shape)) / 2 ** 30:.1f} GiB) with {num_workers} processes")
+    with Pool(num_workers, initializer=_init_worker,
+              initargs=(dataset, images_path, labels_path, image_shape, label_shape, seed)) as pool:
+        for _ in tqdm(pool.imap_unordered(_build_sample, range(len(dataset))), total=len(dataset)):
+            pass
+
+    # 데이터가 다 기록된 뒤 index를 씀
+    stats = []
+    for name in dataset.labelnames:
+        st = os.stat(os.path.join(dataset.label_root, name))
+        stats.append([st.st_mtime_ns, st.st_size])
+    index = {
+        "image_shape": list(image_shape),
+        "label_shape": list(label_shape),
+        "num_classes": len(dataset.CLASS2IND),
+        "seed": seed,
+        "transforms": repr(dataset.transforms),
+        "filenames": list(dataset.filenames),
+        "labelnames": list(dataset.labelnames),
+        "label_root": dataset.label_root,
+        "stats": stats,
+    }
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, index_path)
+
+
+class XRayBankDataset(Dataset):
+    """
+    AugmentBank에서 epoch 마다 이미지별 variant 하나를 읽어 주는 학습 dataset (online augmentation 없음)
+
+    이미지마다 variant 순서를 seed로 한 번 섞어 두고 epoch e에는 e % V 번째를 사용하므로
+    V epoch 동안 모든 variant를 한 번씩 쓰고, 같은 epoch 안에서는 이미지마다 다른 variant가 섞인다.
+    반환 형식은 XRayDataset (uint8, packed)과 같다 (float 변환 / unpack은 Transforms.to_device에서).
+
+    Args:
+        bank_dir (str): AugmentBank 경로
+        packed (bool): False면 label을 (NC, H, W) uint8로 unpack 해서 반환
+        seed (int): variant 순서 seed
+    """
+    def __init__(self, bank_dir=Config.AUGMENT_BANK_DIR, packed=Config.PACKED_LABELS, seed=Config.RANDOM_SEED):
+        self.bank = AugmentBank(bank_dir)
+        self.packed = packed
+        self.filenames = self.bank.filenames
+        self.labelnames = self.bank.labelnames
+        self.is_train = True
+
+        stale = self.bank.stale()
+        if stale:
+            print(f"Warning: {len(stale)} labels changed after the augment bank was built "
+                  f"(python preprocess.py bank): {stale[:5]}")
+
+        rng = np.random.default_rng(seed)
+        self.order = rng.permuted(np.tile(np.arange(self.bank.num_variants), (len(self.bank), 1)), axis=1)
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __len__(self):
+        return len(self.bank)
+
+    def __getitem__(self, item):
+        variant = self.order[item, self.epoch % self.bank.num_variants]
+        image, label = self.bank.get(item, variant)
+        if not self.packed:
+            label = np.unpackbits(label, axis=0, count=self.bank.num_classes)
+        return torch.from_numpy(image), torch.from_numpy(label)
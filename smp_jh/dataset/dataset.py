@@ -1,20 +1,124 @@
 import os
 import cv2
+import struct
 import json
 import numpy as np
-import pandas as pd
 import torch
+from concurrent.futures import ThreadPoolExecutor
 from torch.utils.data import Dataset
-from sklearn.model_selection import GroupKFold, StratifiedGroupKFold 
+from sklearn.model_selection import GroupKFold
 from config.config import Config
+from dataset.label_engine import load_polygons, rasterize
+from dataset.label_cache import get_label_cache
+from dataset.image_store import ImageStore
+from dataset.pyramid import pyramid_level
+from dataset.polygon_store import PolygonStore
+from dataset.manifest import load_meta, assign_folds, load_manifest, manifest_meta_df, get_patient_id, \
+    is_manifest_current
+
+
+def read_image(image_path, in_channels=Config.IN_CHANNELS):
+    """in_channels에 맞춰 이미지를 읽음 (1채널이면 IMREAD_GRAYSCALE)"""
+    if in_channels == 1:
+        return cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    return cv2.imread(image_path)
+
+
+def read_image_size(image_path):
+    """
+    PNG header(IHDR)만 읽어서 (H, W) 반환 (decode 없이 tile 위치 / 좌표 범위를 확인할 때 사용)
+    PNG가 아니면 이미지를 decode 해서 크기를 구함
+    """
+    with open(image_path, "rb") as f:
+        header = f.read(24)
+    if header[:8] == b"\x89PNG\r\n\x1a\n" and header[12:16] == b"IHDR":
+        width, height = struct.unpack(">II", header[16:24])
+        return height, width
+    return cv2.imread(image_path, cv2.IMREAD_GRAYSCALE).shape[:2]
+
+
+def to_channels(image, in_channels=Config.IN_CHANNELS):
+    """(H, W) 또는 (H, W, C) 이미지를 (H, W, in_channels)로 맞춤"""
+    if image.ndim == 2:
+        image = image[..., None]
+    if image.shape[2] == in_channels:
+        return image
+    if in_channels == 1:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)[..., None]
+    return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+def process_sample(image, label, transforms=None, is_train=True, uint8=False, in_channels=3, packed=False,
+                   bitfield=False, num_classes=len(Config.CLASSES)):
+    """
+    (H, W, C) uint8 image와 (H, W, NC) label에 transform을 적용하고 channel first tensor로 변환
+
+    packed=True면 label을 class 축으로 bit-packing 한 (ceil(NC / 8), H, W) uint8로 반환해서
+    worker -> main process 전송량을 float label 대비 1/32로 줄인다 (Transforms.to_device에서 unpack).
+
+    bitfield=True면 (학습 시) label을 (H, W, ceil(NC / 8)) bitfield로 만든 뒤 transform을 적용한다.
+    mask의 geometric transform은 nearest sampling이라 bit가 섞이지 않으므로 29채널 대신 4채널만
+    warp 하면 되고, label이 이미 bitfield (label cache 등)면 pack 없이 그대로 쓴다.
+    packed=True면 transform 후에도 bitfield 그대로 넘기고, 아니면 unpack 한다.
+    """
+    bitfield = bitfield and is_train
+    if bitfield and label.shape[-1] == num_classes:
+        label = np.packbits(label.astype(np.uint8, copy=False), axis=-1)
+    
+    if not uint8:
+        image = image / 255.
+    
+    if transforms is not None:
+        inputs = {"image": image, "mask": label} if is_train else {"image": image}
+        result = transforms(**inputs)
+        image = result["image"]
+        label = result["mask"] if is_train else label
+    
+    if bitfield:
+        # bitfield가 1채널 (NC <= 8)이면 transform 후 channel 축이 빠질 수 있음
+        label = label.reshape(label.shape[:2] + (-1,))
+        if not packed:
+            label = np.unpackbits(label, axis=-1, count=num_classes)
+    
+    # channel first 포맷으로 변경 (1채널 이미지는 transform 후 channel 축이 빠질 수 있음)
+    image = to_channels(image, in_channels).transpose(2, 0, 1)
+    if packed and not bitfield:
+        label = np.packbits(label.astype(np.uint8, copy=False), axis=-1)
+    label = label.transpose(2, 0, 1)
+    
+    if packed and not uint8:
+        return torch.from_numpy(image).float(), torch.from_numpy(np.ascontiguousarray(label))
+    
+    # uint8 모드: float 변환/정규화는 batch 단위로 device에서 수행 (Transforms.to_device)
+    if uint8:
+        return torch.from_numpy(np.ascontiguousarray(image)), torch.from_numpy(np.ascontiguousarray(label))
+    
+    return torch.from_numpy(image).float(), torch.from_numpy(label).float()
+
 
 class XRayDataset(Dataset):
-    def __init__(self, image_root, label_root=None, is_train=True, transforms=None):
+    def __init__(self, image_root, label_root=None, is_train=True, transforms=None,
+                 label_cache_dir=Config.LABEL_CACHE_DIR, label_size=Config.LABEL_SIZE,
+                 label_supersample=Config.LABEL_SUPERSAMPLE, image_store_dir=Config.IMAGE_STORE_DIR,
+                 uint8=Config.UINT8_PIPELINE, in_channels=Config.IN_CHANNELS,
+                 pyramid_levels=Config.PYRAMID_LEVELS, image_size=Config.IMG_SIZE,
+                 polygon_store_dir=Config.POLYGON_STORE_DIR, packed=Config.PACKED_LABELS,
+                 fetch_threads=Config.FETCH_THREADS, bitfield=Config.BITFIELD_MASKS):
         self.is_train = is_train
         self.transforms = transforms
         self.CLASS2IND = Config.CLASS2IND
         self.image_root = image_root
         self.label_root = label_root
+        # validation은 transform이 label을 건드리지 않고 원본 해상도로 평가하므로 학습에만 적용
+        self.label_size = (label_size, label_size) if label_size and is_train else None
+        self.label_supersample = label_supersample
+        self.uint8 = uint8
+        self.in_channels = in_channels
+        self.packed = packed
+        self.fetch_threads = fetch_threads
+        self.bitfield = bitfield
+        # __getitems__용 thread pool (worker process 마다 lazy 하게 생성)
+        self._fetch_pool = None
+        self._fetch_pid = None
         
         # Get PNG and JSON files
         self.pngs = self._get_pngs()
@@ -27,6 +131,8 @@ class XRayDataset(Dataset):
             assert len(jsons_fn_prefix - pngs_fn_prefix) == 0, "Some JSON files don't have matching PNGs"
             assert len(pngs_fn_prefix - jsons_fn_prefix) == 0, "Some PNG files don't have matching JSONs"
         
+        self._setup_stores(label_cache_dir, image_store_dir, pyramid_levels, image_size, polygon_store_dir)
+        
         # Split dataset
         _filenames = np.array(self.pngs)
         _labelnames = np.array(self.jsons) if self.jsons else None
@@ -77,57 +183,157 @@ class XRayDataset(Dataset):
             if os.path.splitext(fname)[1].lower() == ".json"
         ])
 
+    def _setup_stores(self, label_cache_dir, image_store_dir, pyramid_levels, image_size, polygon_store_dir=None):
+        """
+        label cache / image store / polygon store 준비
+
+        pyramid_levels를 지정하면 (image store, label cache 모두 사용할 때만) 요청 해상도
+        (label_size 또는 image_size) 이상인 가장 작은 level의 store/cache를 사용해서
+        transform의 Resize가 원본 대신 작은 이미지에서 시작하도록 한다.
+        validation label은 원본 해상도로 평가하므로 항상 원본 level을 사용한다.
+        """
+        self.level = None
+        self.source_level = None
+        if pyramid_levels and image_store_dir and label_cache_dir:
+            target = self.label_size[0] if self.label_size is not None else image_size
+            self.level = pyramid_level(pyramid_levels, target)
+            self.source_level = max(pyramid_levels)
+        
+        self.label_cache = self._get_label_cache(label_cache_dir)
+        # label cache를 쓰지 않을 때 JSON 대신 polygon store에서 좌표를 읽음
+        self.polygon_store = None
+        if polygon_store_dir and self.label_root and self.label_cache is None:
+            self.polygon_store = PolygonStore(polygon_store_dir, self.label_root, self.jsons)
+        
+        if not image_store_dir:
+            self.image_store = None
+        elif self.level is None or self.level == self.source_level:
+            self.image_store = ImageStore(image_store_dir, self.image_root, self.pngs)
+        else:
+            self.image_store = ImageStore(image_store_dir, self.image_root, self.pngs,
+                                          image_size=(self.level, self.level))
+
+    def _get_label_cache(self, label_cache_dir):
+        # train/valid split과 무관하게 전체 JSON을 캐싱해서 두 데이터셋이 같은 캐시를 공유
+        if label_cache_dir is None or not self.label_root:
+            return None
+        
+        # 해상도별로 캐시 디렉토리를 분리
+        label_size = self.label_size
+        if label_size is None and self.is_train and self.level is not None and self.level != self.source_level:
+            label_size = (self.level, self.level)
+        return get_label_cache(label_cache_dir, self.label_root, self.jsons, image_size=label_size,
+                               supersample=self.label_supersample)
+
+    def _load_image(self, image_name):
+        if self.image_store is not None:
+            # decode 된 (H, W) uint8 memmap view
+            image = self.image_store[image_name]
+        else:
+            image = read_image(os.path.join(self.image_root, image_name), self.in_channels)
+        src_size = image.shape[:2]
+        
+        # label과 같은 해상도로 미리 줄여서 2048 해상도의 float 연산을 피함
+        if self.label_size is not None and src_size != self.label_size:
+            image = cv2.resize(image, self.label_size[::-1], interpolation=cv2.INTER_LINEAR)
+        return to_channels(image, self.in_channels), src_size
+
+    def _load_label(self, label_name, image_size, src_size, out=None):
+        if self.label_cache is not None:
+            # bitfield 학습이면 cache의 packed label을 unpack 하지 않고 그대로 transform
+            if self.bitfield and self.is_train:
+                return self.label_cache.get_packed(label_name)
+            return self.label_cache[label_name]
+        
+        if self.polygon_store is not None:
+            polygons = self.polygon_store.get(label_name, self.CLASS2IND)
+        else:
+            polygons = load_polygons(os.path.join(self.label_root, label_name), self.CLASS2IND)
+        return rasterize(polygons, image_size, src_size=src_size,
+                         supersample=self.label_supersample if self.label_size else 1, out=out)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_fetch_pool"] = None
+        state["_fetch_pid"] = None
+        return state
+
+    def _get_fetch_pool(self):
+        # fork 된 worker는 부모의 (thread가 없는) pool 객체를 물려받으므로 pid가 바뀌면 새로 만든다
+        if self._fetch_pool is None or self._fetch_pid != os.getpid():
+            self._fetch_pool = ThreadPoolExecutor(self.fetch_threads)
+            self._fetch_pid = os.getpid()
+        return self._fetch_pool
+
     def __len__(self):
         return len(self.filenames)
 
     def __getitem__(self, item):
         image_name = self.filenames[item]
-        image_path = os.path.join(self.image_root, image_name)
         
-        image = cv2.imread(image_path)
-        image = image / 255.
+        image, src_size = self._load_image(image_name)
         
         label_name = self.labelnames[item]
-        label_path = os.path.join(self.label_root, label_name)
         
         # (H, W, NC) 모양의 label 생성
-        label_shape = tuple(image.shape[:2]) + (len(Config.CLASSES),)
-        label = np.zeros(label_shape, dtype=np.uint8)
-        
-        # label 파일 읽기
-        with open(label_path, "r") as f:
-            annotations = json.load(f)
-        annotations = annotations["annotations"]
-        
-        # 클래스 별로 처리
-        for ann in annotations:
-            c = ann["label"]
-            class_ind = self.CLASS2IND[c]
-            points = np.array(ann["points"])
-            
-            # polygon 포맷을 dense한 mask 포맷으로 변환
-            class_label = np.zeros(image.shape[:2], dtype=np.uint8)
-            cv2.fillPoly(class_label, [points], 1)
-            label[..., class_ind] = class_label
-        
-        if self.transforms is not None:
-            inputs = {"image": image, "mask": label} if self.is_train else {"image": image}
-            result = self.transforms(**inputs)
-            image = result["image"]
-            label = result["mask"] if self.is_train else label
+        label = self._load_label(label_name, image.shape[:2], src_size)
         
-        # channel first 포맷으로 변경
-        image = image.transpose(2, 0, 1)
-        label = label.transpose(2, 0, 1)
+        return process_sample(image, label, self.transforms, self.is_train, self.uint8, self.in_channels,
+                              self.packed, self.bitfield)
+
+    def __getitems__(self, items):
+        """
+        DataLoader가 batch의 index 목록으로 한 번에 호출 (auto collation 시 __getitem__ 대신 사용)
+
+        batch 이미지의 read/decode를 thread pool에서 동시에 수행하고 (cv2는 GIL을 풂),
+        label은 미리 할당한 (B, H, W, NC) batch 배열 하나에 같은 pool로 rasterize 한다
+        (rasterize 버퍼만 공유하고, process_sample / transform은 여전히 sample별로 배열을 만든다).
+        augmentation은 sample별 random 순서가 바뀌지 않도록 순서대로 적용한다.
+
+        Returns:
+            list: __getitem__과 같은 (image, label) 튜플 리스트 (collate_fn으로 전달)
+        """
+        if self.fetch_threads <= 1 or len(items) <= 1:
+            return [self[item] for item in items]
+        
+        pool = self._get_fetch_pool()
+        loaded = list(pool.map(self._load_image, [self.filenames[item] for item in items]))
+        label_names = [self.labelnames[item] for item in items]
+        
+        shapes = {image.shape[:2] for image, _ in loaded}
+        if self.label_cache is None and len(shapes) == 1:
+            # 모든 sample이 같은 해상도면 label을 batch 배열 하나에 rasterize (sample별 label 버퍼 할당만 줄어듦)
+            labels = np.empty((len(items),) + shapes.pop() + (len(self.CLASS2IND),), dtype=np.uint8)
+            list(pool.map(lambda i: self._load_label(label_names[i], labels.shape[1:3], loaded[i][1], out=labels[i]),
+                          range(len(items))))
+        else:
+            labels = list(pool.map(lambda i: self._load_label(label_names[i], loaded[i][0].shape[:2], loaded[i][1]),
+                                   range(len(items))))
         
-        return torch.from_numpy(image).float(), torch.from_numpy(label).float()
+        return [
+            process_sample(image, label, self.transforms, self.is_train, self.uint8, self.in_channels, self.packed,
+                           self.bitfield)
+            for (image, _), label in zip(loaded, labels)
+        ]
         
 
 class XRayInferenceDataset(Dataset):
-    def __init__(self, image_root, transforms=None):
+    def __init__(self, image_root, transforms=None, image_store_dir=Config.IMAGE_STORE_DIR,
+                 uint8=Config.UINT8_PIPELINE, in_channels=Config.IN_CHANNELS,
+                 pyramid_levels=Config.PYRAMID_LEVELS, image_size=Config.IMG_SIZE):
         self.image_root = image_root
         self.transforms = transforms
+        self.uint8 = uint8
+        self.in_channels = in_channels
         self.filenames = self._get_pngs()
+        
+        # pyramid를 쓰면 image_size 이상인 가장 작은 해상도로 store를 만듦 (예측은 원본 해상도로 interpolate)
+        store_size = None
+        if image_store_dir and pyramid_levels:
+            level = pyramid_level(pyramid_levels, image_size)
+            store_size = None if level == max(pyramid_levels) else (level, level)
+        self.image_store = ImageStore(image_store_dir, self.image_root, self.filenames,
+                                      image_size=store_size) if image_store_dir else None
 
     def _get_pngs(self):
         return sorted([
@@ -142,78 +348,89 @@ class XRayInferenceDataset(Dataset):
 
     def __getitem__(self, item):
         image_name = self.filenames[item]
-        image_path = os.path.join(self.image_root, image_name)
 
-        image = cv2.imread(image_path)
-        image = image / 255.
+        if self.image_store is not None:
+            image = self.image_store[image_name]
+        else:
+            image = read_image(os.path.join(self.image_root, image_name), self.in_channels)
+        image = to_channels(image, self.in_channels)
+        if not self.uint8:
+            image = image / 255.
 
         if self.transforms is not None:
             inputs = {"image": image}
             result = self.transforms(**inputs)
             image = result["image"]
 
-        image = image.transpose(2, 0, 1)
+        image = to_channels(image, self.in_channels).transpose(2, 0, 1)
+        if self.uint8:
+            return torch.from_numpy(np.ascontiguousarray(image)), image_name
         return torch.from_numpy(image).float(), image_name
 
 
 class StratifiedXRayDataset(XRayDataset):
-    def __init__(self, image_root, label_root=None, is_train=True, transforms=None, meta_path=None):
+    def __init__(self, image_root, label_root=None, is_train=True, transforms=None, meta_path=None,
+                 label_cache_dir=Config.LABEL_CACHE_DIR, label_size=Config.LABEL_SIZE,
+                 label_supersample=Config.LABEL_SUPERSAMPLE, image_store_dir=Config.IMAGE_STORE_DIR,
+                 uint8=Config.UINT8_PIPELINE, in_channels=Config.IN_CHANNELS,
+                 pyramid_levels=Config.PYRAMID_LEVELS, image_size=Config.IMG_SIZE,
+                 polygon_store_dir=Config.POLYGON_STORE_DIR, packed=Config.PACKED_LABELS,
+                 fetch_threads=Config.FETCH_THREADS, bitfield=Config.BITFIELD_MASKS,
+                 manifest_path=Config.MANIFEST_PATH, fold=Config.FOLD):
         self.is_train = is_train
         self.transforms = transforms
         self.CLASS2IND = Config.CLASS2IND
         self.image_root = image_root
         self.label_root = label_root
+        # validation은 transform이 label을 건드리지 않고 원본 해상도로 평가하므로 학습에만 적용
+        self.label_size = (label_size, label_size) if label_size and is_train else None
+        self.label_supersample = label_supersample
+        self.uint8 = uint8
+        self.in_channels = in_channels
+        self.packed = packed
+        self.fetch_threads = fetch_threads
+        self.bitfield = bitfield
+        # __getitems__용 thread pool (worker process 마다 lazy 하게 생성)
+        self._fetch_pool = None
+        self._fetch_pid = None
+        
+        manifest = None
+        if manifest_path is not None and os.path.exists(manifest_path):
+            manifest = load_manifest(manifest_path)
+            if not is_manifest_current(manifest, image_root, label_root, meta_path):
+                print(f"Warning: {manifest_path} does not match {image_root} / {meta_path} "
+                      f"(python preprocess.py manifest), ignoring")
+                manifest = None
+        
+        if manifest is not None:
+            # 미리 만들어 둔 manifest 사용 (os.walk, excel 읽기, fold split 생략)
+            self.pngs = manifest['filenames'].tolist()
+            self.jsons = manifest['labelnames'].tolist() if label_root else None
+            self.meta_df = manifest_meta_df(manifest)
+            folds = manifest['folds']
+        else:
+            # Get PNG and JSON files
+            self.pngs = self._get_pngs()
+            self.jsons = self._get_jsons() if label_root else None
+            
+            if label_root:
+                # Verify matching between pngs and jsons
+                jsons_fn_prefix = {os.path.splitext(fname)[0] for fname in self.jsons}
+                pngs_fn_prefix = {os.path.splitext(fname)[0] for fname in self.pngs}
+                assert len(jsons_fn_prefix - pngs_fn_prefix) == 0, "Some JSON files don't have matching PNGs"
+                assert len(pngs_fn_prefix - jsons_fn_prefix) == 0, "Some PNG files don't have matching JSONs"
+            
+            # Load meta data 및 StratifiedGroupKFold로 이미지별 fold 할당
+            self.meta_df = load_meta(meta_path)
+            _, _, folds = assign_folds(self.pngs, self.meta_df)
         
-        # Get PNG and JSON files
-        self.pngs = self._get_pngs()
-        self.jsons = self._get_jsons() if label_root else None
-        
-        if label_root:
-            # Verify matching between pngs and jsons
-            jsons_fn_prefix = {os.path.splitext(fname)[0] for fname in self.jsons}
-            pngs_fn_prefix = {os.path.splitext(fname)[0] for fname in self.pngs}
-            assert len(jsons_fn_prefix - pngs_fn_prefix) == 0, "Some JSON files don't have matching PNGs"
-            assert len(pngs_fn_prefix - jsons_fn_prefix) == 0, "Some PNG files don't have matching JSONs"
-        
-        # Load meta data
-        self.meta_df = pd.read_excel(meta_path)
-        self.meta_df = self.meta_df.drop('Unnamed: 5', axis=1)
-        self.meta_df['ID'] = self.meta_df.index.map(lambda x: f"ID{str(x+1).zfill(3)}")
-        self.meta_df['Gender'] = self.meta_df['성별'].apply(lambda x: 'Female' if '여' in str(x) else 'Male')
-        self.meta_df = self.meta_df.rename(columns={'키(신장)': 'Height'})
-        
-        # Create height quartiles and strata
-        self.meta_df['Height_Quartile'] = pd.qcut(self.meta_df['Height'], q=4, labels=['Q1', 'Q2', 'Q3', 'Q4'])
-        self.meta_df['Strata'] = self.meta_df['Gender'] + '_' + self.meta_df['Height_Quartile'].astype(str)
-        
-        # Split dataset
-        _filenames = np.array(self.pngs)
-        _labelnames = np.array(self.jsons) if self.jsons else None
-        
-        # Get groups and strata
-        groups = [os.path.dirname(fname) for fname in _filenames]
-        image_strata = []
-        for fname in _filenames:
-            id_folder = os.path.dirname(fname).split('/')[-1]
-            strata = self.meta_df[self.meta_df['ID'] == id_folder]['Strata'].iloc[0]
-            image_strata.append(strata)
-        
-        # StratifiedGroupKFold 사용
-        sgkf = StratifiedGroupKFold(n_splits=5, shuffle=True, random_state=42)
-        
-        # 첫 번째 fold를 사용
-        for fold_idx, (train_idx, val_idx) in enumerate(sgkf.split(_filenames, y=image_strata, groups=groups)):
-            if fold_idx == 0:  # 첫 번째 fold만 사용
-                if is_train:
-                    filenames = list(_filenames[train_idx])
-                    labelnames = list(_labelnames[train_idx]) if _labelnames is not None else []
-                else:
-                    filenames = list(_filenames[val_idx])
-                    labelnames = list(_labelnames[val_idx]) if _labelnames is not None else []
-                break
+        self._setup_stores(label_cache_dir, image_store_dir, pyramid_levels, image_size, polygon_store_dir)
         
-        self.filenames = filenames
-        self.labelnames = labelnames
+        # fold번 fold를 validation으로 사용
+        selected = folds != fold if is_train else folds == fold
+        self.filenames = np.array(self.pngs)[selected].tolist()
+        self.labelnames = np.array(self.jsons)[selected].tolist() if self.jsons else []
+        self._ids = {get_patient_id(fname) for fname in self.filenames}
 
     def _get_pngs(self):
         # XRayDataset의 메서드 재사용
@@ -230,11 +447,15 @@ class StratifiedXRayDataset(XRayDataset):
     def __getitem__(self, item):
         # XRayDataset의 메서드 재사용
         return super().__getitem__(item)
+
+    def __getitems__(self, items):
+        # XRayDataset의 메서드 재사용
+        return super().__getitems__(items)
     
     # 추가 메서드들 (통계 관련)
     def get_ids(self):
         """현재 데이터셋의 모든 고유 ID 반환"""
-        return set([os.path.dirname(fname).split('/')[-1] for fname in self.filenames])
+        return self._ids
     
     def get_gender_distribution(self):
         """성별 분포 반환"""
@@ -326,12 +547,12 @@ class StratifiedXRayDataset(XRayDataset):
             dict: 이미지 정보를 담은 딕셔너리
         """
         matching_files = []
-        for fname in self.filenames:
+        for i, fname in enumerate(self.filenames):
             if id_folder in fname:
                 if image_name is None or image_name in fname:
                     matching_files.append({
                         'image_path': os.path.join(self.image_root, fname),
-                        'label_path': os.path.join(self.label_root, self.labelnames[self.filenames.index(fname)])
+                        'label_path': os.path.join(self.label_root, self.labelnames[i])
                         if self.label_root else None
                     })
         
@@ -0,0 +1,78 @@
+import time
+from config.config import Config
+from dataset.transforms import Transforms
+from dataset.gpu_transforms import DeviceAugment
+
+
+class EchoLoader:
+    """
+    DataLoader에서 받은 batch를 device로 옮긴 뒤 factor 번 재사용하는 data echoing wrapper
+
+    첫 번째는 원래 batch를 그대로, 나머지는 DeviceAugment로 device에서 다시 augmentation 한 batch를 넘긴다.
+    CPU decode / albumentations가 학습 step보다 느릴 때 같은 batch로 step을 더 밟아서 GPU가 놀지 않게 한다.
+
+    adaptive=True면 loader 대기 시간과 step 시간의 EMA를 재서 factor를 1 ~ max_factor 사이에서
+    1 + (대기 시간 / step 시간)으로 조절한다 (loader가 충분히 빠르면 echoing 하지 않음).
+
+    Args:
+        loader (iterable): (images, masks) batch를 주는 DataLoader (또는 RingBufferLoader)
+        device (torch.device): 대상 device
+        factor (int): batch 당 사용 횟수 (adaptive면 초기값)
+        adaptive (bool): 대기 시간에 맞춰 factor 조절 여부
+        max_factor (int): adaptive 사용 시 최대 factor
+        augment (callable): (images, masks) -> (images, masks) device augmentation
+        momentum (float): 시간 EMA의 이전 값 비율
+        preprocess (callable, optional): device로 옮긴 batch에 echoing 전에 한 번 적용할 transform (BatchAugment 등)
+    """
+    def __init__(self, loader, device, factor=Config.ECHO_FACTOR, adaptive=Config.ECHO_ADAPTIVE,
+                 max_factor=Config.ECHO_MAX_FACTOR, augment=None, momentum=0.9, preprocess=None):
+        self.loader = loader
+        self.device = device
+        self.factor = factor
+        self.adaptive = adaptive
+        self.max_factor = max(max_factor, factor)
+        self.augment = augment if augment is not None else DeviceAugment()
+        self.momentum = momentum
+        self.preprocess = preprocess
+        # 현재 batch가 loader의 몇 번째 batch인지 (hard example sampler 등에서 index 매핑에 사용)
+        self.source_step = -1
+        self._wait = None
+        self._compute = None
+
+    def __len__(self):
+        return len(self.loader) * self.factor
+
+    @property
+    def dataset(self):
+        return self.loader.dataset
+
+    def _ema(self, old, new):
+        return new if old is None else self.momentum * old + (1 - self.momentum) * new
+
+    def _update_factor(self):
+        if not self.adaptive or self._wait is None or not self._compute:
+            return
+        self.factor = int(min(max(1 + round(self._wait / self._compute), 1), self.max_factor))
+
+    def __iter__(self):
+        iterator = iter(self.loader)
+        self.source_step = -1
+        while True:
+            start = time.perf_counter()
+            try:
+                images, masks = next(iterator)
+            except StopIteration:
+                return
+            self._wait = self._ema(self._wait, time.perf_counter() - start)
+            self.source_step += 1
+
+            if self.preprocess is not None:
+                images, masks = self.preprocess(images.to(self.device, non_blocking=True),
+                                                masks.to(self.device, non_blocking=True))
+            images, masks = Transforms.to_device(images, masks, self.device)
+            for echo in range(self.factor):
+                start = time.perf_counter()
+                yield (images, masks) if echo == 0 else self.augment(images, masks)
+                # 다음 batch 요청까지 걸린 시간 = step 시간
+                self._compute = self._ema(self._compute, time.perf_counter() - start)
+            self._update_factor()
@@ -0,0 +1,180 @@
+import math
+import torch
+import torch.nn.functional as F
+
+
+class DeviceAugment:
+    """
+    device 위의 (B, C, H, W) batch에 sample별로 다른 random transform을 한 번에 적용하는 가벼운 augmentation
+
+    horizontal flip / 작은 affine (회전, scale, 이동)을 affine_grid 하나로 합쳐서 image는 bilinear,
+    mask는 nearest로 grid_sample 하고, image에만 brightness / contrast를 적용한다.
+    albumentations와 달리 CPU worker를 쓰지 않으므로 data echoing 등에서 같은 batch를 다시 쓸 때 사용한다.
+
+    Args:
+        flip_p (float): horizontal flip 확률
+        rotate (float): 최대 회전 각도 (도)
+        scale (float): 최대 scale 변화 비율
+        shift (float): 최대 이동 비율 (이미지 크기 대비)
+        brightness (float): 최대 밝기 변화 ([0, 1] 범위 기준)
+        contrast (float): 최대 대비 변화 비율
+    """
+    def __init__(self, flip_p=0.5, rotate=10, scale=0.1, shift=0.05, brightness=0.1, contrast=0.1):
+        self.flip_p = flip_p
+        self.rotate = rotate
+        self.scale = scale
+        self.shift = shift
+        self.brightness = brightness
+        self.contrast = contrast
+
+    def _uniform(self, size, limit, device):
+        return (torch.rand(size, device=device) * 2 - 1) * limit
+
+    def affine_matrix(self, batch_size, device):
+        """(B, 2, 3) affine_grid용 matrix (출력 좌표 -> 입력 좌표)"""
+        angle = self._uniform(batch_size, math.radians(self.rotate), device)
+        scale = 1 + self._uniform(batch_size, self.scale, device)
+        flip = torch.where(torch.rand(batch_size, device=device) < self.flip_p, -1.0, 1.0)
+        cos, sin = torch.cos(angle) / scale, torch.sin(angle) / scale
+
+        theta = torch.zeros(batch_size, 2, 3, device=device)
+        theta[:, 0, 0] = cos * flip
+        theta[:, 0, 1] = -sin
+        theta[:, 1, 0] = sin * flip
+        theta[:, 1, 1] = cos
+        theta[:, :, 2] = self._uniform((batch_size, 2), 2 * self.shift, device)
+        return theta
+
+    def __call__(self, images, masks=None):
+        """
+        Args:
+            images (torch.Tensor): (B, C, H, W) float [0, 1]
+            masks (torch.Tensor, optional): (B, NC, h, w) float 0/1
+
+        Returns:
+            tuple: (images, masks). masks가 None이면 images만 반환
+        """
+        batch_size, device = images.size(0), images.device
+        theta = self.affine_matrix(batch_size, device)
+
+        grid = F.affine_grid(theta, list(images.shape), align_corners=False)
+        images = F.grid_sample(images, grid, mode="bilinear", padding_mode="zeros", align_corners=False)
+
+        contrast = 1 + self._uniform((batch_size, 1, 1, 1), self.contrast, device)
+        brightness = self._uniform((batch_size, 1, 1, 1), self.brightness, device)
+        mean = images.mean(dim=(1, 2, 3), keepdim=True)
+        images = ((images - mean) * contrast + mean + brightness).clamp_(0, 1)
+
+        if masks is None:
+            return images
+        if masks.shape[-2:] != images.shape[-2:]:
+            grid = F.affine_grid(theta, list(masks.shape), align_corners=False)
+        masks = F.grid_sample(masks, grid, mode="nearest", padding_mode="zeros", align_corners=False)
+        return images, masks
+
+
+class BatchAugment:
+    """
+    Transforms.get_train_transform의 recipe (Resize -> RandomGamma -> Rotate -> HorizontalFlip -> RandomBrightnessContrast)를
+    device 위의 batch 전체에 sample별로 다른 parameter로 적용하는 augmentation
+
+    resize / 회전 / flip은 affine_grid 하나로 합쳐서 원본 해상도 입력에서 출력 크기로 바로 grid_sample 하므로
+    worker는 decode만 하면 된다 (image는 bilinear, mask는 nearest, 빈 영역은 0).
+    gamma / brightness / contrast는 geometry 뒤에 pointwise로 적용한다.
+    bit-packed mask (Config.PACKED_LABELS)는 packed 상태 그대로 nearest sampling 해서
+    29채널 float mask를 원본 해상도로 만들지 않는다 (unpack은 Transforms.to_device에서).
+
+    Args:
+        size (tuple, optional): 출력 (H, W). None이면 입력 크기 유지 (tile 학습)
+        rotate (float): 최대 회전 각도 (도)
+        rotate_p (float): 회전 확률
+        flip_p (float): horizontal flip 확률
+        gamma_limit (tuple): gamma 범위 (/ 100)
+        gamma_p (float): gamma 적용 확률
+        brightness_limit (float): 밝기 조정 범위 (±, 이미지 평균 기준)
+        contrast_limit (float): 대비 조정 범위 (±)
+        brightness_contrast_p (float): brightness / contrast 적용 확률
+    """
+    def __init__(self, size=None, rotate=10, rotate_p=0.8, flip_p=1.0, gamma_limit=(80, 200), gamma_p=0.3,
+                 brightness_limit=0.24, contrast_limit=0.24, brightness_contrast_p=0.8):
+        self.size = size
+        self.rotate = rotate
+        self.rotate_p = rotate_p
+        self.flip_p = flip_p
+        self.gamma_limit = gamma_limit
+        self.gamma_p = gamma_p
+        self.brightness_limit = brightness_limit
+        self.contrast_limit = contrast_limit
+        self.brightness_contrast_p = brightness_contrast_p
+
+    def _uniform(self, size, low, high, device):
+        return torch.rand(size, device=device) * (high - low) + low
+
+    def _apply(self, size, p, value, default, device):
+        """p 확률로 value, 아니면 default"""
+        return torch.where(torch.rand(size, device=device) < p, value, torch.full_like(value, default))
+
+    def affine_matrix(self, batch_size, out_size, device):
+        """
+        (B, 2, 3) affine_grid용 matrix (출력 좌표 -> 입력 좌표)
+
+        resize는 정규화 좌표에 포함되므로 출력 픽셀 공간의 회전 (aspect 보정)과 flip만 합성한다.
+        """
+        height, width = out_size
+        angle = self._uniform(batch_size, -math.radians(self.rotate), math.radians(self.rotate), device)
+        angle = self._apply(batch_size, self.rotate_p, angle, 0.0, device)
+        flip = torch.where(torch.rand(batch_size, device=device) < self.flip_p, -1.0, 1.0)
+        cos, sin = torch.cos(angle), torch.sin(angle)
+
+        theta = torch.zeros(batch_size, 2, 3, device=device)
+        theta[:, 0, 0] = cos * flip
+        theta[:, 0, 1] = -sin * height / width
+        theta[:, 1, 0] = sin * width / height * flip
+        theta[:, 1, 1] = cos
+        return theta
+
+    def intensity(self, images):
+        """(B, C, H, W) float [0, 1] 이미지에 sample별 gamma -> brightness / contrast 적용"""
+        batch_size, device = images.size(0), images.device
+        shape = (batch_size, 1, 1, 1)
+
+        gamma = self._uniform(shape, self.gamma_limit[0] / 100, self.gamma_limit[1] / 100, device)
+        gamma = self._apply(shape, self.gamma_p, gamma, 1.0, device)
+        images = images.clamp_(min=0).pow_(gamma)
+
+        # albumentations와 같이 alpha * x + beta * mean(x) (brightness_by_max=False)
+        alpha = 1 + self._uniform(shape, -self.contrast_limit, self.contrast_limit, device)
+        beta = self._uniform(shape, -self.brightness_limit, self.brightness_limit, device)
+        enabled = torch.rand(shape, device=device) < self.brightness_contrast_p
+        alpha = torch.where(enabled, alpha, torch.ones_like(alpha))
+        beta = torch.where(enabled, beta, torch.zeros_like(beta)) * images.mean(dim=(1, 2, 3), keepdim=True)
+        return images.mul_(alpha).add_(beta).clamp_(0, 1)
+
+    def __call__(self, images, masks=None):
+        """
+        Args:
+            images (torch.Tensor): (B, C, H, W) uint8 또는 float [0, 1] (device 위)
+            masks (torch.Tensor, optional): (B, NC, h, w) 0/1 또는 (B, ceil(NC / 8), h, w) packed uint8
+
+        Returns:
+            tuple: (images, masks). images는 float32 [0, 1], masks는 입력과 같은 dtype / packing.
+            masks가 None이면 images만 반환
+        """
+        batch_size, device = images.size(0), images.device
+        out_size = tuple(self.size) if self.size is not None else tuple(images.shape[-2:])
+        if images.dtype == torch.uint8:
+            images = images.float().div_(255.)
+        else:
+            images = images.float()
+
+        theta = self.affine_matrix(batch_size, out_size, device)
+        grid = F.affine_grid(theta, [batch_size, images.size(1), *out_size], align_corners=False)
+        images = F.grid_sample(images, grid, mode="bilinear", padding_mode="zeros", align_corners=False)
+        images = self.intensity(images)
+
+        if masks is None:
+            return images
+        # nearest sampling은 값을 섞지 않으므로 packed byte (0 ~ 255)도 float로 정확히 옮겨짐
+        dtype = masks.dtype
+        masks = F.grid_sample(masks.float(), grid, mode="nearest", padding_mode="zeros", align_corners=False)
+        return images, masks.to(dtype)
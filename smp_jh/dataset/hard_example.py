@@ -0,0 +1,106 @@
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch.utils.data import Sampler
+from config.config import Config
+
+
+def per_sample_class_loss(outputs, masks):
+    """
+    (B, NC, H, W) logits / mask의 sample별, class별 BCE 평균 (B, NC)
+    학습 loss와 별개로 gradient 없이 sampler 기록용으로만 계산
+    """
+    with torch.no_grad():
+        loss = F.binary_cross_entropy_with_logits(outputs.float(), masks.float(), reduction="none")
+        return loss.mean(dim=(2, 3))
+
+
+class HardExampleSampler(Sampler):
+    """
+    학습 step에서 기록한 sample별 / class별 loss에 비례해서 다음 epoch의 sample을 뽑는 sampler
+
+    loss는 (N, NC) float16 배열에 EMA로 기록하고, sample 점수는 class별 loss에 class 평균 loss 비율을
+    가중해서 합친다 (어려운 class, 예를 들어 carpal bone 쪽 loss가 큰 sample이 더 자주 뽑힘).
+    sampling 확률은 (1 - floor) * score / sum(score) + floor / N 으로 균일 분포를 섞어서
+    쉬운 sample도 계속 보도록 한다. warmup epoch 동안과 아직 기록이 없는 sample은 균일하게 다룬다.
+
+    DataLoader는 sampler 순서대로 batch를 만들므로 step번째 batch의 index는
+    batch_indices(step, batch_size)로 찾아서 update()에 넘긴다.
+
+    Args:
+        num_samples (int): dataset 크기
+        num_classes (int): class 수
+        floor (float): 균일 분포를 섞는 비율 (0 ~ 1)
+        momentum (float): loss EMA에서 이전 값의 비율
+        warmup_epochs (int): 균일하게 섞기만 하는 초기 epoch 수
+        seed (int): epoch과 더해서 사용하는 seed
+    """
+    def __init__(self, num_samples, num_classes=len(Config.CLASSES), floor=Config.HARD_SAMPLER_FLOOR,
+                 momentum=Config.HARD_SAMPLER_MOMENTUM, warmup_epochs=Config.HARD_SAMPLER_WARMUP,
+                 seed=Config.RANDOM_SEED):
+        self.num_samples = num_samples
+        self.floor = floor
+        self.momentum = momentum
+        self.warmup_epochs = warmup_epochs
+        self.seed = seed
+        self.epoch = 0
+
+        self.class_losses = np.zeros((num_samples, num_classes), dtype=np.float16)
+        self.seen = np.zeros(num_samples, dtype=bool)
+        # 현재 epoch에서 뽑은 순서 (batch 위치 -> dataset index)
+        self.indices = np.arange(num_samples)
+
+    def __len__(self):
+        return self.num_samples
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def batch_indices(self, step, batch_size):
+        """현재 epoch step번째 batch의 dataset index"""
+        return self.indices[step * batch_size:(step + 1) * batch_size]
+
+    def update(self, indices, class_losses):
+        """
+        indices sample들의 (B, NC) loss를 EMA로 기록
+
+        Args:
+            indices (np.ndarray): batch_indices 결과
+            class_losses (torch.Tensor | np.ndarray): per_sample_class_loss 결과
+        """
+        if isinstance(class_losses, torch.Tensor):
+            class_losses = class_losses.detach().float().cpu().numpy()
+        indices = np.asarray(indices)
+        # 같은 epoch에서 같은 sample이 여러 번 뽑힐 수 있으므로 순서대로 반영
+        for index, loss in zip(indices, class_losses):
+            if self.seen[index]:
+                loss = self.momentum * self.class_losses[index].astype(np.float32) + (1 - self.momentum) * loss
+            self.class_losses[index] = loss
+            self.seen[index] = True
+
+    def sample_scores(self):
+        """sample별 점수 (class 평균 loss로 가중한 class loss 합). 기록이 없는 sample은 기록된 sample 평균"""
+        losses = self.class_losses.astype(np.float32)
+        if not self.seen.any():
+            return np.ones(self.num_samples, dtype=np.float64)
+        class_mean = losses[self.seen].mean(axis=0)
+        weights = class_mean / max(class_mean.mean(), 1e-12)
+        scores = (losses @ weights).astype(np.float64)
+        scores[~self.seen] = scores[self.seen].mean()
+        return scores
+
+    def probabilities(self):
+        scores = self.sample_scores()
+        total = scores.sum()
+        if total <= 0:
+            return np.full(self.num_samples, 1.0 / self.num_samples)
+        return (1 - self.floor) * scores / total + self.floor / self.num_samples
+
+    def __iter__(self):
+        rng = np.random.default_rng(self.seed + self.epoch)
+        if self.epoch < self.warmup_epochs or not self.seen.any():
+            self.indices = rng.permutation(self.num_samples)
+        else:
+            self.indices = rng.choice(self.num_samples, size=self.num_samples, replace=True, p=self.probabilities())
+        self.epoch += 1
+        return iter(self.indices.tolist())
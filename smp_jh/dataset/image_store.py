@@ -0,0 +1,112 @@
+import os
+import json
+import hashlib
+import cv2
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from tqdm.auto import tqdm
+
+
+class ImageStore:
+    """
+    PNG를 한 번만 decode 해서 single-channel uint8로 이어 붙여 저장한 memmap store
+
+    Layout:
+        {store_dir}/images_{hash}[_{H}x{W}]/images.bin : 모든 이미지의 (H, W) uint8 픽셀을 순서대로 저장
+        {store_dir}/images_{hash}[_{H}x{W}]/index.json : 파일별 [offset, H, W, mtime_ns, size]
+
+    hash는 image_root 절대경로로 만들어서 train/test 이미지가 같은 store_dir을 공유할 수 있다.
+    image_size를 지정하면 decode 후 INTER_AREA로 줄여서 저장한다 (해상도별로 디렉토리 분리).
+    PNG의 mtime/size가 바뀌거나 파일 목록이 바뀌면 store 전체를 다시 만든다.
+    """
+    DATA_NAME = "images.bin"
+    INDEX_NAME = "index.json"
+
+    def __init__(self, store_dir, image_root, filenames, num_threads=8, image_size=None, build=True):
+        self.image_root = image_root
+        self.filenames = sorted(filenames)
+        self.num_threads = num_threads
+        self.image_size = tuple(image_size) if image_size else None
+
+        root_hash = hashlib.md5(os.path.abspath(image_root).encode()).hexdigest()[:8]
+        dir_name = f"images_{root_hash}"
+        if self.image_size is not None:
+            dir_name += f"_{self.image_size[0]}x{self.image_size[1]}"
+        self.store_dir = os.path.join(store_dir, dir_name)
+        self.data_path = os.path.join(self.store_dir, self.DATA_NAME)
+        self.index_path = os.path.join(self.store_dir, self.INDEX_NAME)
+
+        # worker 마다 lazy 하게 memmap을 연다 (pickle 시 배열 복사 방지)
+        self._data = None
+        # build=False면 외부(build_pyramid)에서 data/index를 채운다
+        self.entries = self.sync() if build else None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_data"] = None
+        return state
+
+    def _stat(self, image_name):
+        st = os.stat(os.path.join(self.image_root, image_name))
+        return [st.st_mtime_ns, st.st_size]
+
+    def _is_valid(self, entries):
+        if set(entries) != set(self.filenames):
+            return False
+        return all(entries[name][3:] == self._stat(name) for name in self.filenames)
+
+    def _decode(self, image_name):
+        image = cv2.imread(os.path.join(self.image_root, image_name), cv2.IMREAD_GRAYSCALE)
+        if image is not None and self.image_size is not None and image.shape != self.image_size:
+            image = cv2.resize(image, self.image_size[::-1], interpolation=cv2.INTER_AREA)
+        return image
+
+    def _write_index(self, entries):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.index_path)
+
+    def sync(self):
+        """
+        store가 없거나 오래된 경우 다시 만들고 파일명 -> [offset, H, W, mtime_ns, size]를 반환
+        """
+        if os.path.exists(self.index_path) and os.path.exists(self.data_path):
+            with open(self.index_path, "r") as f:
+                entries = json.load(f)
+            if self._is_valid(entries):
+                return entries
+
+        print(f"Building image store in {self.store_dir} ({len(self.filenames)} images)")
+        os.makedirs(self.store_dir, exist_ok=True)
+
+        entries = {}
+        offset = 0
+        tmp_path = self.data_path + ".tmp"
+        # cv2.imread는 GIL을 풀기 때문에 thread로 decode를 병렬화하고 순서대로 기록
+        with open(tmp_path, "wb") as f, ThreadPoolExecutor(self.num_threads) as pool:
+            decoded = pool.map(self._decode, self.filenames)
+            for name, image in tqdm(zip(self.filenames, decoded), total=len(self.filenames)):
+                if image is None:
+                    raise ValueError(f"Cannot read image file: {name}")
+                f.write(image.tobytes())
+                entries[name] = [offset, image.shape[0], image.shape[1]] + self._stat(name)
+                offset += image.size
+        os.replace(tmp_path, self.data_path)
+        self._write_index(entries)
+
+        return entries
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = np.memmap(self.data_path, dtype=np.uint8, mode="r")
+        return self._data
+
+    def __getitem__(self, image_name):
+        """(H, W) uint8 read-only view 반환 (복사 없음)"""
+        offset, h, w = self.entries[image_name][:3]
+        return self.data[offset:offset + h * w].reshape(h, w)
+
+    def __contains__(self, image_name):
+        return image_name in self.entries
@@ -0,0 +1,147 @@
+import os
+import json
+import numpy as np
+from tqdm.auto import tqdm
+from config.config import Config
+from dataset.label_engine import load_polygons, rasterize
+
+
+class LabelCache:
+    """
+    JSON 라벨을 한 번만 rasterize 해서 class 축으로 bit-packing 한 memmap 캐시
+
+    Layout:
+        {cache_dir}/labels.bin  : (N, H, W, ceil(NC / 8)) uint8, np.packbits(axis=-1)
+        {cache_dir}/index.json  : shape, classes, raster 설정, 파일별 [slot, mtime_ns, size]
+
+    JSON 파일의 mtime 또는 size가 바뀌면 해당 slot만 다시 rasterize 하고,
+    파일 목록/해상도/클래스가 바뀌면 캐시 전체를 다시 만든다.
+    """
+    DATA_NAME = "labels.bin"
+    INDEX_NAME = "index.json"
+
+    def __init__(self, cache_dir, label_root, labelnames, image_size=(2048, 2048), classes=Config.CLASSES,
+                 src_size=(2048, 2048), supersample=1, build=True):
+        self.cache_dir = cache_dir
+        self.label_root = label_root
+        self.labelnames = sorted(labelnames)
+        self.image_size = tuple(image_size)
+        self.src_size = tuple(src_size)
+        self.supersample = supersample
+        self.classes = list(classes)
+        self.class2ind = {v: i for i, v in enumerate(self.classes)}
+        self.packed_channels = (len(self.classes) + 7) // 8
+
+        self.data_path = os.path.join(cache_dir, self.DATA_NAME)
+        self.index_path = os.path.join(cache_dir, self.INDEX_NAME)
+
+        # worker 마다 lazy 하게 memmap을 연다 (pickle 시 배열 복사 방지)
+        self._data = None
+        # build=False면 외부(build_pyramid)에서 data/index를 채운다
+        self.slots = self.sync() if build else None
+
+    @property
+    def shape(self):
+        return (len(self.labelnames),) + self.image_size + (self.packed_channels,)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_data"] = None
+        return state
+
+    def _stat(self, label_name):
+        st = os.stat(os.path.join(self.label_root, label_name))
+        return [st.st_mtime_ns, st.st_size]
+
+    def _load_index(self):
+        if not (os.path.exists(self.index_path) and os.path.exists(self.data_path)):
+            return None
+        with open(self.index_path, "r") as f:
+            index = json.load(f)
+        if (
+            tuple(index["shape"]) != self.shape
+            or index["classes"] != self.classes
+            or index.get("raster") != self._raster_config()
+            or set(index["entries"]) != set(self.labelnames)
+        ):
+            return None
+        return index
+
+    def _write_index(self, entries):
+        index = {
+            "shape": list(self.shape),
+            "classes": self.classes,
+            "raster": self._raster_config(),
+            "entries": entries,
+        }
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _raster_config(self):
+        return {"src_size": list(self.src_size), "supersample": self.supersample}
+
+    def _rasterize_packed(self, label_name):
+        polygons = load_polygons(os.path.join(self.label_root, label_name), self.class2ind)
+        label = rasterize(polygons, self.image_size, len(self.classes), self.src_size, self.supersample)
+        return np.packbits(label, axis=-1)
+
+    def sync(self):
+        """
+        캐시가 없거나 오래된 경우 (재)생성하고 파일명 -> slot 매핑을 반환
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        index = self._load_index()
+
+        if index is None:
+            entries = {name: [slot] + self._stat(name) for slot, name in enumerate(self.labelnames)}
+            stale = list(self.labelnames)
+            mode = "w+"
+        else:
+            entries = index["entries"]
+            stale = [name for name in self.labelnames if entries[name][1:] != self._stat(name)]
+            mode = "r+"
+
+        if stale:
+            print(f"Building label cache in {self.cache_dir} ({len(stale)}/{len(self.labelnames)} labels)")
+            data = np.memmap(self.data_path, dtype=np.uint8, mode=mode, shape=self.shape)
+            for name in tqdm(stale):
+                slot = entries[name][0]
+                data[slot] = self._rasterize_packed(name)
+                entries[name] = [slot] + self._stat(name)
+            data.flush()
+            del data
+            self._write_index(entries)
+
+        return {name: entry[0] for name, entry in entries.items()}
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = np.memmap(self.data_path, dtype=np.uint8, mode="r", shape=self.shape)
+        return self._data
+
+    def get_packed(self, label_name):
+        """(H, W, ceil(NC / 8)) bit-packed label view 반환 (복사 없음)"""
+        return self.data[self.slots[label_name]]
+
+    def __getitem__(self, label_name):
+        """(H, W, NC) uint8 label 반환"""
+        return np.unpackbits(self.get_packed(label_name), axis=-1, count=len(self.classes))
+
+    def __contains__(self, label_name):
+        return label_name in self.slots
+
+
+def get_label_cache(cache_dir, label_root, labelnames, image_size=None, supersample=1, src_size=(2048, 2048),
+                    build=True):
+    """
+    해상도별 LabelCache 생성. image_size가 None이면 원본(src_size) 해상도 캐시를 cache_dir에,
+    아니면 {cache_dir}/{H}x{W}에 supersampling 해서 만든다 (XRayDataset / build_pyramid 공용)
+    """
+    if image_size is None:
+        return LabelCache(cache_dir, label_root, labelnames, image_size=src_size, src_size=src_size, build=build)
+    cache_dir = os.path.join(cache_dir, f"{image_size[0]}x{image_size[1]}")
+    return LabelCache(cache_dir, label_root, labelnames, image_size=image_size, src_size=src_size,
+                      supersample=supersample, build=build)
@@ -0,0 +1,143 @@
+import json
+import cv2
+import numpy as np
+from config.config import Config
+
+# cv2.fillPoly의 sub-pixel 정밀도 (fractional bits)
+SHIFT = 8
+
+
+def load_polygons(label_path, class2ind=Config.CLASS2IND):
+    """
+    JSON 어노테이션 파일에서 (class_ind, points) 리스트를 읽어옴
+
+    Args:
+        label_path (str): 어노테이션 JSON 파일 경로
+        class2ind (dict): 클래스 이름 -> 인덱스 매핑
+
+    Returns:
+        list: (class_ind, (N, 2) int32 points) 튜플 리스트
+    """
+    with open(label_path, "r") as f:
+        annotations = json.load(f)["annotations"]
+
+    return [
+        (class2ind[ann["label"]], np.asarray(ann["points"], dtype=np.int32))
+        for ann in annotations
+    ]
+
+
+def polygon_geometry(points):
+    """
+    (K, 2) polygon의 (area, cx, cy) 계산 (shoelace, cv2.contourArea와 같은 면적)
+    면적이 0인 polygon은 꼭짓점 평균을 centroid로 사용
+    """
+    x = points[:, 0].astype(np.float64)
+    y = points[:, 1].astype(np.float64)
+    xn, yn = np.roll(x, -1), np.roll(y, -1)
+    cross = x * yn - xn * y
+    signed_area = cross.sum() / 2
+    if signed_area == 0:
+        return 0.0, x.mean(), y.mean()
+    cx = ((x + xn) * cross).sum() / (6 * signed_area)
+    cy = ((y + yn) * cross).sum() / (6 * signed_area)
+    return abs(signed_area), cx, cy
+
+
+def scale_points(points, src_size, dst_size):
+    """
+    원본 해상도 좌표를 dst_size 격자의 fixed-point (SHIFT bits) 좌표로 변환
+    픽셀 중심 기준으로 맞춰서 resize 결과와 정렬되도록 함
+    """
+    scale = np.array([dst_size[1] / src_size[1], dst_size[0] / src_size[0]])
+    scaled = (points + 0.5) * scale - 0.5
+    return np.round(scaled * (1 << SHIFT)).astype(np.int32)
+
+
+def rasterize(polygons, image_size, num_classes=len(Config.CLASSES), src_size=None, supersample=1, out=None):
+    """
+    polygon 리스트를 (H, W, NC) uint8 dense mask로 변환
+
+    src_size가 image_size와 다르면 polygon 좌표를 image_size로 scale 한 뒤 바로 채워서
+    원본 해상도 label을 만들고 resize 하는 과정을 생략한다.
+    supersample > 1이면 image_size * supersample 격자에서 채운 뒤 area 평균으로 줄이고
+    coverage 0.5 기준으로 threshold 해서 경계를 resize 결과와 비슷하게 맞춘다.
+
+    Args:
+        polygons (list): load_polygons 결과 (src_size 좌표계)
+        image_size (tuple): 출력 (H, W)
+        num_classes (int): 클래스 수
+        src_size (tuple, optional): polygon 좌표계의 (H, W). None이면 image_size와 동일
+        supersample (int): sub-pixel supersampling 배율
+        out (np.ndarray, optional): 결과를 기록할 (H, W, NC) uint8 배열 (batch 배열의 slice 등)
+
+    Returns:
+        np.ndarray: (H, W, NC) uint8 label
+    """
+    image_size = tuple(image_size)
+    src_size = image_size if src_size is None else tuple(src_size)
+    if out is None:
+        label = np.zeros(image_size + (num_classes,), dtype=np.uint8)
+    else:
+        label = out
+        label.fill(0)
+
+    if src_size == image_size and supersample == 1:
+        class_label = np.zeros(image_size, dtype=np.uint8)
+        for class_ind, points in polygons:
+            class_label.fill(0)
+            cv2.fillPoly(class_label, [points], 1)
+            label[..., class_ind] = class_label
+        return label
+
+    grid_size = (image_size[0] * supersample, image_size[1] * supersample)
+    class_label = np.zeros(grid_size, dtype=np.uint8)
+    for class_ind, points in polygons:
+        class_label.fill(0)
+        cv2.fillPoly(class_label, [scale_points(points, src_size, grid_size)], 255, shift=SHIFT)
+        if supersample > 1:
+            coverage = cv2.resize(class_label, image_size[::-1], interpolation=cv2.INTER_AREA)
+            label[..., class_ind] = coverage >= 128
+        else:
+            label[..., class_ind] = class_label > 0
+
+    return label
+
+
+def rasterize_window(polygons, crop_box, image_size, num_classes=len(Config.CLASSES)):
+    """
+    원본 해상도 polygon을 crop_box (x0, y0, x1, y1) 창 영역만 (h, w, NC) uint8 mask로 변환
+
+    fillPoly는 canvas 경계에서 edge를 clip 하면서 경계 근처 픽셀이 달라지므로 창에 바로 채우지 않고,
+    polygon bounding box (image_size 안으로 제한) 크기의 canvas에 채운 뒤 창과 겹치는 부분만 복사한다.
+    rasterize(polygons, image_size)[y0:y1, x0:x1]과 같은 결과를 창 / polygon 크기 연산으로 얻는다.
+
+    Args:
+        polygons (list): load_polygons 결과
+        crop_box (tuple): (x0, y0, x1, y1) 창 (x1, y1은 포함하지 않음)
+        image_size (tuple): 원본 (H, W)
+        num_classes (int): 클래스 수
+
+    Returns:
+        np.ndarray: (y1 - y0, x1 - x0, NC) uint8 label
+    """
+    start_x, start_y, end_x, end_y = crop_box
+    label = np.zeros((end_y - start_y, end_x - start_x, num_classes), dtype=np.uint8)
+
+    for class_ind, points in polygons:
+        points = np.asarray(points, dtype=np.int32)
+        x0, y0 = np.maximum(points.min(axis=0), 0)
+        x1, y1 = np.minimum(points.max(axis=0) + 1, (image_size[1], image_size[0]))
+
+        # polygon bounding box와 창의 교집합
+        ix0, iy0 = max(x0, start_x), max(y0, start_y)
+        ix1, iy1 = min(x1, end_x), min(y1, end_y)
+        if ix0 >= ix1 or iy0 >= iy1:
+            continue
+
+        canvas = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        cv2.fillPoly(canvas, [points - np.array([x0, y0], dtype=np.int32)], 1)
+        window = label[iy0 - start_y:iy1 - start_y, ix0 - start_x:ix1 - start_x, class_ind]
+        np.maximum(window, canvas[iy0 - y0:iy1 - y0, ix0 - x0:ix1 - x0], out=window)
+
+    return label
@@ -0,0 +1,179 @@
+import os
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import GroupKFold, StratifiedGroupKFold
+
+
+def list_files(root, ext):
+    """root 아래의 ext 확장자 파일을 root 기준 상대경로로 정렬해서 반환"""
+    return sorted([
+        os.path.relpath(os.path.join(dirpath, fname), start=root)
+        for dirpath, _dirs, files in os.walk(root)
+        for fname in files
+        if os.path.splitext(fname)[1].lower() == ext
+    ])
+
+
+def load_meta(meta_path):
+    """
+    meta_data.xlsx를 읽어서 ID, Gender, Height, Height_Quartile, Strata 컬럼을 추가한 DataFrame 반환
+    """
+    meta_df = pd.read_excel(meta_path)
+    meta_df = meta_df.drop('Unnamed: 5', axis=1)
+    meta_df['ID'] = meta_df.index.map(lambda x: f"ID{str(x+1).zfill(3)}")
+    meta_df['Gender'] = meta_df['성별'].apply(lambda x: 'Female' if '여' in str(x) else 'Male')
+    meta_df = meta_df.rename(columns={'키(신장)': 'Height'})
+
+    # Create height quartiles and strata
+    meta_df['Height_Quartile'] = pd.qcut(meta_df['Height'], q=4, labels=['Q1', 'Q2', 'Q3', 'Q4'])
+    meta_df['Strata'] = meta_df['Gender'] + '_' + meta_df['Height_Quartile'].astype(str)
+    return meta_df
+
+
+def get_patient_id(fname):
+    return os.path.dirname(fname).split('/')[-1]
+
+
+def assign_folds(filenames, meta_df, n_splits=5, random_state=42):
+    """
+    StratifiedGroupKFold로 이미지마다 validation fold 번호를 할당
+
+    Returns:
+        tuple: (patient_ids, strata, folds) - folds[i] == k 이면 i번째 이미지는 k번 fold의 validation
+    """
+    id2strata = dict(zip(meta_df['ID'], meta_df['Strata']))
+    patient_ids = np.array([get_patient_id(fname) for fname in filenames])
+    strata = np.array([id2strata[pid] for pid in patient_ids])
+    groups = [os.path.dirname(fname) for fname in filenames]
+
+    folds = np.full(len(filenames), -1, dtype=np.int8)
+    sgkf = StratifiedGroupKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+    for fold_idx, (_train_idx, val_idx) in enumerate(sgkf.split(filenames, y=strata, groups=groups)):
+        folds[val_idx] = fold_idx
+    return patient_ids, strata, folds
+
+
+def group_folds(filenames, n_splits=5):
+    """
+    XRayDataset과 같은 GroupKFold(폴더 = 환자) 기준으로 이미지마다 validation fold 번호를 할당
+    """
+    groups = [os.path.dirname(fname) for fname in filenames]
+    folds = np.full(len(filenames), -1, dtype=np.int8)
+    gkf = GroupKFold(n_splits=n_splits)
+    for fold_idx, (_train_idx, val_idx) in enumerate(gkf.split(filenames, [0] * len(filenames), groups)):
+        folds[val_idx] = fold_idx
+    return folds
+
+
+def _file_stats(root, names):
+    """(N, 2) int64 [mtime_ns, size]"""
+    stats = [os.stat(os.path.join(root, name)) for name in names]
+    return np.array([[st.st_mtime_ns, st.st_size] for st in stats], dtype=np.int64).reshape(-1, 2)
+
+
+def _dir_mtimes(root, names):
+    """root와 파일이 들어 있는 디렉토리들의 mtime_ns (파일 추가/삭제 감지용)"""
+    dirs = sorted({os.path.dirname(name) for name in names} | {""})
+    return np.array(dirs), np.array([os.stat(os.path.join(root, d)).st_mtime_ns for d in dirs], dtype=np.int64)
+
+
+def build_manifest(image_root, label_root, meta_path, output_path, n_splits=5, random_state=42):
+    """
+    이미지/라벨 경로, 환자 ID, strata, K개 fold 할당과 meta 테이블을 하나의 npz 파일로 저장
+
+    Args:
+        image_root (str): 이미지 root
+        label_root (str): 라벨 root
+        meta_path (str): meta_data.xlsx 경로
+        output_path (str): 저장할 .npz 경로
+        n_splits (int): fold 수
+        random_state (int): StratifiedGroupKFold seed
+    """
+    pngs = list_files(image_root, ".png")
+    jsons = list_files(label_root, ".json")
+
+    jsons_fn_prefix = {os.path.splitext(fname)[0] for fname in jsons}
+    pngs_fn_prefix = {os.path.splitext(fname)[0] for fname in pngs}
+    assert jsons_fn_prefix == pngs_fn_prefix, "PNG and JSON files don't match"
+
+    meta_df = load_meta(meta_path)
+    patient_ids, strata, folds = assign_folds(pngs, meta_df, n_splits, random_state)
+
+    image_dirs, image_dir_mtimes = _dir_mtimes(image_root, pngs)
+    label_dirs, label_dir_mtimes = _dir_mtimes(label_root, jsons)
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    np.savez(
+        output_path,
+        filenames=np.array(pngs),
+        labelnames=np.array(jsons),
+        image_root=np.array(os.path.abspath(image_root)),
+        label_root=np.array(os.path.abspath(label_root)),
+        image_stats=_file_stats(image_root, pngs),
+        label_stats=_file_stats(label_root, jsons),
+        image_dirs=image_dirs,
+        image_dir_mtimes=image_dir_mtimes,
+        label_dirs=label_dirs,
+        label_dir_mtimes=label_dir_mtimes,
+        meta_path=np.array(os.path.abspath(meta_path)),
+        meta_stat=_file_stats(os.path.dirname(meta_path), [os.path.basename(meta_path)])[0],
+        patient_ids=patient_ids,
+        strata=strata,
+        folds=folds,
+        n_splits=np.int8(n_splits),
+        meta_id=meta_df['ID'].to_numpy(dtype=str),
+        meta_gender=meta_df['Gender'].to_numpy(dtype=str),
+        meta_height=meta_df['Height'].to_numpy(dtype=np.float32),
+        meta_strata=meta_df['Strata'].to_numpy(dtype=str),
+    )
+    print(f"Manifest saved to {output_path} ({len(pngs)} images, {n_splits} folds)")
+
+
+def load_manifest(manifest_path):
+    """build_manifest로 만든 npz를 dict로 읽음"""
+    with np.load(manifest_path) as manifest:
+        return {key: manifest[key] for key in manifest.files}
+
+
+def is_manifest_current(manifest, image_root, label_root, meta_path):
+    """
+    manifest가 같은 image_root / label_root / meta_path에서 만들어졌고 이후 파일이 추가/삭제/수정되지 않았는지 확인
+
+    파일 목록은 os.walk 대신 디렉토리 mtime으로 비교하고, 파일과 meta 파일은 mtime / size로 비교한다.
+    meta 파일이 바뀌면 strata / fold split이 달라지므로 오래된 것으로 본다.
+    이전 형식 (root / stat 정보 없음) manifest도 오래된 것으로 본다.
+    """
+    if "image_root" not in manifest or "meta_path" not in manifest or meta_path is None:
+        return False
+    targets = [("image", image_root, manifest["filenames"])]
+    if label_root:
+        targets.append(("label", label_root, manifest["labelnames"]))
+
+    try:
+        if str(manifest["meta_path"]) != os.path.abspath(meta_path):
+            return False
+        if not np.array_equal(_file_stats(os.path.dirname(meta_path), [os.path.basename(meta_path)])[0],
+                              manifest["meta_stat"]):
+            return False
+        for key, root, names in targets:
+            if str(manifest[f"{key}_root"]) != os.path.abspath(root):
+                return False
+            dirs, mtimes = _dir_mtimes(root, names)
+            if not (np.array_equal(dirs, manifest[f"{key}_dirs"])
+                    and np.array_equal(mtimes, manifest[f"{key}_dir_mtimes"])):
+                return False
+            if not np.array_equal(_file_stats(root, names), manifest[f"{key}_stats"]):
+                return False
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def manifest_meta_df(manifest):
+    """manifest에 저장된 meta 테이블을 통계 계산용 DataFrame으로 변환"""
+    return pd.DataFrame({
+        'ID': manifest['meta_id'],
+        'Gender': manifest['meta_gender'],
+        'Height': manifest['meta_height'],
+        'Strata': manifest['meta_strata'],
+    })
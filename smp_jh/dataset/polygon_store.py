@@ -0,0 +1,179 @@
+import os
+import json
+import argparse
+import numpy as np
+
+
+class PolygonStore:
+    """
+    모든 어노테이션 JSON의 polygon을 flat int32 좌표 배열 하나로 모아 둔 store
+
+    Layout:
+        {store_dir}/points.bin : 모든 polygon 좌표를 이어 붙인 (M, 2) int32
+        {store_dir}/index.npz  :
+            names          (N,)          라벨 파일 상대경로
+            classes        (C,)          class 이름
+            class_offsets  (N, C + 1)    image i, class c의 polygon 범위 [class_offsets[i, c], class_offsets[i, c + 1])
+            point_offsets  (P + 1,)      polygon p의 좌표 범위 [point_offsets[p], point_offsets[p + 1])
+            mtimes, sizes  (N,)          JSON 파일 mtime_ns / size (변경 감지용)
+
+    points.bin은 worker 마다 lazy 하게 memmap으로 열고, get()은 그 위의 view를 반환해서
+    __getitem__ 마다 json.load 하거나 좌표를 복사하지 않는다.
+    JSON 파일 목록이나 mtime/size가 바뀌면 store 전체를 다시 만든다 (전체 JSON 파싱은 수 초 수준).
+
+    Args:
+        store_dir (str): 저장 경로
+        label_root (str, optional): 지정하면 store가 없거나 오래된 경우 다시 만듦
+        labelnames (list, optional): label_root 기준 JSON 상대경로. None이면 label_root 아래 모든 JSON
+    """
+    POINTS_NAME = "points.bin"
+    INDEX_NAME = "index.npz"
+
+    def __init__(self, store_dir, label_root=None, labelnames=None):
+        self.store_dir = store_dir
+        self.points_path = os.path.join(store_dir, self.POINTS_NAME)
+        self.index_path = os.path.join(store_dir, self.INDEX_NAME)
+
+        if label_root is not None:
+            if labelnames is None:
+                labelnames = self.list_labels(label_root)
+            if not self._is_valid(label_root, labelnames):
+                self.build(store_dir, label_root, labelnames)
+
+        with np.load(self.index_path) as index:
+            self.names = index["names"].tolist()
+            self.classes = index["classes"].tolist()
+            self.class_offsets = index["class_offsets"]
+            self.point_offsets = index["point_offsets"]
+        self.name2ind = {name: i for i, name in enumerate(self.names)}
+
+        # worker 마다 lazy 하게 memmap을 연다 (pickle 시 배열 복사 방지)
+        self._points = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_points"] = None
+        return state
+
+    @staticmethod
+    def list_labels(label_root):
+        """label_root 아래 모든 JSON의 상대경로를 정렬해서 반환"""
+        return sorted(
+            os.path.relpath(os.path.join(root, fname), start=label_root)
+            for root, _dirs, files in os.walk(label_root)
+            for fname in files
+            if os.path.splitext(fname)[1].lower() == ".json"
+        )
+
+    @staticmethod
+    def _stat(label_root, labelnames):
+        stats = [os.stat(os.path.join(label_root, name)) for name in labelnames]
+        return np.array([st.st_mtime_ns for st in stats]), np.array([st.st_size for st in stats])
+
+    def _is_valid(self, label_root, labelnames):
+        if not (os.path.exists(self.index_path) and os.path.exists(self.points_path)):
+            return False
+        labelnames = sorted(labelnames)
+        with np.load(self.index_path) as index:
+            if index["names"].tolist() != labelnames:
+                return False
+            mtimes, sizes = self._stat(label_root, labelnames)
+            return np.array_equal(index["mtimes"], mtimes) and np.array_equal(index["sizes"], sizes)
+
+    @classmethod
+    def build(cls, store_dir, label_root, labelnames):
+        """
+        label_root 아래 labelnames JSON을 모두 읽어서 points.bin / index.npz 생성
+
+        Args:
+            store_dir (str): 저장 경로
+            label_root (str): 라벨 root
+            labelnames (list): label_root 기준 JSON 상대경로
+        """
+        labelnames = sorted(labelnames)
+        print(f"Building polygon store in {store_dir} ({len(labelnames)} labels)")
+
+        per_image = []
+        classes = []
+        class2ind = {}
+        for name in labelnames:
+            with open(os.path.join(label_root, name), "r") as f:
+                annotations = json.load(f)["annotations"]
+            polygons = []
+            for ann in annotations:
+                if ann["label"] not in class2ind:
+                    class2ind[ann["label"]] = len(classes)
+                    classes.append(ann["label"])
+                polygons.append((class2ind[ann["label"]], np.asarray(ann["points"], dtype=np.int32).reshape(-1, 2)))
+            per_image.append(polygons)
+
+        class_offsets = np.zeros((len(labelnames), len(classes) + 1), dtype=np.int64)
+        point_offsets = [0]
+        os.makedirs(store_dir, exist_ok=True)
+        tmp_path = os.path.join(store_dir, cls.POINTS_NAME + ".tmp")
+        with open(tmp_path, "wb") as f:
+            for i, polygons in enumerate(per_image):
+                # image 안에서 class 순서로 정렬해서 class별 polygon이 연속되도록 저장
+                polygons = sorted(polygons, key=lambda polygon: polygon[0])
+                counts = np.bincount([class_ind for class_ind, _ in polygons], minlength=len(classes))
+                class_offsets[i, 0] = len(point_offsets) - 1
+                class_offsets[i, 1:] = class_offsets[i, 0] + np.cumsum(counts)
+                for _, points in polygons:
+                    f.write(points.tobytes())
+                    point_offsets.append(point_offsets[-1] + len(points))
+        os.replace(tmp_path, os.path.join(store_dir, cls.POINTS_NAME))
+
+        mtimes, sizes = cls._stat(label_root, labelnames)
+        tmp_path = os.path.join(store_dir, "index.tmp.npz")
+        np.savez(
+            tmp_path,
+            names=np.array(labelnames),
+            classes=np.array(classes),
+            class_offsets=class_offsets,
+            point_offsets=np.array(point_offsets, dtype=np.int64),
+            mtimes=mtimes,
+            sizes=sizes,
+        )
+        os.replace(tmp_path, os.path.join(store_dir, cls.INDEX_NAME))
+
+    @property
+    def points(self):
+        if self._points is None:
+            if os.path.getsize(self.points_path) == 0:
+                self._points = np.zeros((0, 2), dtype=np.int32)
+            else:
+                self._points = np.memmap(self.points_path, dtype=np.int32, mode="r").reshape(-1, 2)
+        return self._points
+
+    def get(self, label_name, class2ind=None):
+        """
+        label_name의 polygon을 (class_ind, (K, 2) int32 view) 리스트로 반환 (load_polygons와 같은 형식)
+
+        Args:
+            label_name (str): 라벨 파일 상대경로
+            class2ind (dict, optional): 클래스 이름 -> 인덱스 매핑. 지정하면 매핑에 없는 class는 제외
+
+        Returns:
+            list: (class_ind, points) 튜플 리스트
+        """
+        offsets = self.class_offsets[self.name2ind[label_name]]
+        polygons = []
+        for c, name in enumerate(self.classes):
+            if class2ind is not None and name not in class2ind:
+                continue
+            class_ind = c if class2ind is None else class2ind[name]
+            for p in range(offsets[c], offsets[c + 1]):
+                polygons.append((class_ind, self.points[self.point_offsets[p]:self.point_offsets[p + 1]]))
+        return polygons
+
+    def __contains__(self, label_name):
+        return label_name in self.name2ind
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="어노테이션 JSON을 PolygonStore로 변환")
+    parser.add_argument("label_root", type=str)
+    parser.add_argument("store_dir", type=str)
+    args = parser.parse_args()
+
+    PolygonStore.build(args.store_dir, args.label_root, PolygonStore.list_labels(args.label_root))
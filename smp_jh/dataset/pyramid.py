@@ -0,0 +1,130 @@
+import os
+import cv2
+import numpy as np
+from multiprocessing import Pool
+from tqdm.auto import tqdm
+from config.config import Config
+from dataset.image_store import ImageStore
+from dataset.label_cache import get_label_cache
+from dataset.label_engine import load_polygons, rasterize
+from dataset.manifest import list_files
+
+
+def pyramid_level(levels, size):
+    """levels 중 size 이상인 가장 작은 level (없으면 가장 큰 level)"""
+    candidates = [level for level in levels if level >= size]
+    return min(candidates) if candidates else max(levels)
+
+
+def get_pyramid_level(store_dir, cache_dir, image_root, label_root, filenames, labelnames, level, source_size,
+                      supersample=Config.LABEL_SUPERSAMPLE, build=True):
+    """
+    pyramid 한 level의 (ImageStore, LabelCache) 반환. source_size level은 원본 해상도 store/cache와 같다
+
+    Args:
+        store_dir (str): IMAGE_STORE_DIR
+        cache_dir (str): LABEL_CACHE_DIR
+        level (int): 한 변 해상도
+        source_size (int): 원본 이미지 한 변 해상도
+        build (bool): False면 index를 만들지 않고 경로만 준비
+    """
+    size = None if level == source_size else (level, level)
+    image_store = ImageStore(store_dir, image_root, filenames, image_size=size, build=build)
+    label_cache = get_label_cache(cache_dir, label_root, labelnames, image_size=size, supersample=supersample,
+                                  src_size=(source_size, source_size), build=build)
+    return image_store, label_cache
+
+
+_worker = {}
+
+
+def _init_worker(image_root, label_root, source_size, supersample, targets):
+    # process 마다 level별 memmap을 한 번만 열고, 각 task는 자기 slot에 직접 기록 (결과 배열을 pipe로 보내지 않음)
+    _worker.update(image_root=image_root, label_root=label_root, source_size=source_size,
+                   supersample=supersample)
+    _worker["targets"] = [
+        (level, np.memmap(image_path, dtype=np.uint8, mode="r+"),
+         np.memmap(label_path, dtype=np.uint8, mode="r+", shape=label_shape))
+        for level, image_path, label_path, label_shape in targets
+    ]
+
+
+def _build_sample(task):
+    i, image_name, label_name = task
+    source_size = _worker["source_size"]
+    image = cv2.imread(os.path.join(_worker["image_root"], image_name), cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise ValueError(f"Cannot read image file: {image_name}")
+    if image.shape != (source_size, source_size):
+        raise ValueError(f"{image_name}: expected {source_size}x{source_size} image, got {image.shape}")
+    polygons = load_polygons(os.path.join(_worker["label_root"], label_name))
+
+    # 큰 level부터 한 번 decode 한 원본을 재사용
+    for level, images, labels in _worker["targets"]:
+        if level == source_size:
+            level_image = image
+            label = rasterize(polygons, image.shape)
+        else:
+            level_image = cv2.resize(image, (level, level), interpolation=cv2.INTER_AREA)
+            label = rasterize(polygons, (level, level), src_size=image.shape, supersample=_worker["supersample"])
+        images[i * level * level:(i + 1) * level * level] = level_image.ravel()
+        labels[i] = np.packbits(label, axis=-1)
+    return i
+
+
+def build_pyramid(image_root, label_root, store_dir, cache_dir, levels=(2048, 1024, 512), source_size=2048,
+                  supersample=Config.LABEL_SUPERSAMPLE, num_workers=8):
+    """
+    이미지를 한 번만 decode 해서 모든 level의 ImageStore / LabelCache를 process pool로 한 번에 생성
+
+    각 level은 XRayDataset이 IMAGE_STORE_DIR / LABEL_CACHE_DIR에서 여는 store / cache와 같은 형식이라
+    이후 dataset 생성 시에는 다시 만들지 않고 바로 사용한다.
+
+    Args:
+        image_root (str): 이미지 root
+        label_root (str): 라벨 root
+        store_dir (str): ImageStore 저장 경로
+        cache_dir (str): LabelCache 저장 경로
+        levels (tuple): 만들 해상도 목록
+        source_size (int): 원본 이미지 한 변 해상도 (모든 이미지가 같은 크기여야 함)
+        supersample (int): 축소 level의 label supersampling 배율
+        num_workers (int): process 수
+    """
+    filenames = list_files(image_root, ".png")
+    labelnames = list_files(label_root, ".json")
+    assert [os.path.splitext(f)[0] for f in filenames] == [os.path.splitext(f)[0] for f in labelnames], \
+        "PNG and JSON files don't match"
+
+    levels = sorted(set(levels) | {source_size}, reverse=True)
+    pyramid = {
+        level: get_pyramid_level(store_dir, cache_dir, image_root, label_root, filenames, labelnames, level,
+                                 source_size, supersample, build=False)
+        for level in levels
+    }
+
+    # 모든 level의 data 파일을 미리 할당 (이전 index는 지워서 중간에 실패해도 유효하게 보이지 않도록 함)
+    targets = []
+    for level, (image_store, label_cache) in pyramid.items():
+        os.makedirs(image_store.store_dir, exist_ok=True)
+        os.makedirs(label_cache.cache_dir, exist_ok=True)
+        for index_path in (image_store.index_path, label_cache.index_path):
+            if os.path.exists(index_path):
+                os.remove(index_path)
+        np.memmap(image_store.data_path, dtype=np.uint8, mode="w+", shape=(len(filenames) * level * level,)).flush()
+        np.memmap(label_cache.data_path, dtype=np.uint8, mode="w+", shape=label_cache.shape).flush()
+        targets.append((level, image_store.data_path, label_cache.data_path, label_cache.shape))
+
+    print(f"Building pyramid {levels} for {len(filenames)} images with {num_workers} processes")
+    tasks = [(i, image_name, label_name) for i, (image_name, label_name) in enumerate(zip(filenames, labelnames))]
+    with Pool(num_workers, initializer=_init_worker,
+              initargs=(image_root, label_root, source_size, supersample, targets)) as pool:
+        for _ in tqdm(pool.imap_unordered(_build_sample, tasks), total=len(tasks)):
+            pass
+
+    # 데이터가 다 기록된 뒤 index를 씀
+    for level, (image_store, label_cache) in pyramid.items():
+        image_store._write_index({
+            name: [i * level * level, level, level] + image_store._stat(name)
+            for i, name in enumerate(filenames)
+        })
+        label_cache._write_index({name: [slot] + label_cache._stat(name) for slot, name in enumerate(labelnames)})
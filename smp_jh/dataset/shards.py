@@ -0,0 +1,187 @@
+import io
+import os
+import json
+import random
+import tarfile
+import cv2
+import numpy as np
+from tqdm.auto import tqdm
+from torch.utils.data import IterableDataset, get_worker_info
+from config.config import Config
+from dataset.dataset import process_sample, to_channels, read_image_size
+from dataset.label_engine import load_polygons, rasterize
+
+INDEX_NAME = "index.json"
+
+
+def _add_bytes(tar, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
+
+
+def export_shards(image_root, label_root, filenames, labelnames, folds, output_dir,
+                  samples_per_shard=64, label_size=None, label_supersample=Config.LABEL_SUPERSAMPLE,
+                  valid_fold=Config.FOLD):
+    """
+    이미지(PNG)와 bit-packed label을 fold별 tar shard로 묶어서 저장
+
+    한 shard에는 한 fold의 이미지만 들어가므로 shard 단위로 고르기만 해도
+    GroupKFold / StratifiedGroupKFold의 환자 단위 split이 그대로 유지된다.
+
+    Layout:
+        {output_dir}/fold{k}-{i:05d}.tar : {key}.png, {key}.label.npz (packbits(axis=-1))
+        {output_dir}/index.json          : shard 목록 (path, fold, count, label_size), valid_fold
+
+    Args:
+        image_root (str): 이미지 root
+        label_root (str): 라벨 root
+        filenames (list): 이미지 상대경로
+        labelnames (list): filenames와 같은 순서의 라벨 상대경로
+        folds (np.ndarray): 이미지별 validation fold 번호
+        output_dir (str): shard 저장 경로
+        samples_per_shard (int): shard 당 sample 수
+        label_size (int, optional): 지정하면 train fold의 이미지/라벨을 해당 해상도로 줄여서 저장
+        label_supersample (int): label_size 사용 시 supersampling 배율
+        valid_fold (int): validation으로 쓸 fold, label_size와 상관없이 원본 해상도로 저장
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    shards = []
+
+    for fold in sorted(set(int(f) for f in folds)):
+        # validation fold는 원본 해상도 label로 평가해야 하므로 줄이지 않음
+        fold_size = label_size if label_size and fold != valid_fold else None
+        size = (fold_size, fold_size) if fold_size else None
+        indices = [i for i, f in enumerate(folds) if f == fold]
+        for shard_idx, start in enumerate(range(0, len(indices), samples_per_shard)):
+            shard_name = f"fold{fold}-{shard_idx:05d}.tar"
+            chunk = indices[start:start + samples_per_shard]
+
+            with tarfile.open(os.path.join(output_dir, shard_name + ".tmp"), "w") as tar:
+                for i in tqdm(chunk, desc=shard_name, leave=False):
+                    key = os.path.splitext(filenames[i])[0].replace("/", "__")
+                    image_path = os.path.join(image_root, filenames[i])
+                    polygons = load_polygons(os.path.join(label_root, labelnames[i]))
+
+                    if size is None:
+                        with open(image_path, "rb") as f:
+                            image_bytes = f.read()
+                        # PNG는 그대로 저장하므로 decode 없이 header에서 크기만 읽음
+                        src_size = read_image_size(image_path)
+                        label = rasterize(polygons, src_size)
+                    else:
+                        image = cv2.imread(image_path)
+                        src_size = image.shape[:2]
+                        image = cv2.resize(image, size[::-1], interpolation=cv2.INTER_LINEAR)
+                        image_bytes = cv2.imencode(".png", image)[1].tobytes()
+                        label = rasterize(polygons, size, src_size=src_size, supersample=label_supersample)
+
+                    label_buffer = io.BytesIO()
+                    np.savez_compressed(label_buffer, label=np.packbits(label, axis=-1))
+                    _add_bytes(tar, f"{key}.png", image_bytes)
+                    _add_bytes(tar, f"{key}.label.npz", label_buffer.getvalue())
+
+            os.replace(os.path.join(output_dir, shard_name + ".tmp"), os.path.join(output_dir, shard_name))
+            shards.append({"path": shard_name, "fold": fold, "count": len(chunk), "label_size": fold_size})
+
+    with open(os.path.join(output_dir, INDEX_NAME), "w") as f:
+        json.dump({"classes": Config.CLASSES, "valid_fold": valid_fold, "shards": shards}, f, indent=2)
+    print(f"Exported {len(filenames)} samples into {len(shards)} shards in {output_dir}")
+
+
+class XRayShardDataset(IterableDataset):
+    """
+    export_shards로 만든 tar shard를 순차적으로 읽는 XRayDataset의 iterable 버전
+
+    네트워크 스토리지에서 작은 파일을 random read 하는 대신 큰 shard를 순서대로 stream 한다.
+    학습 시에는 epoch 마다 shard 순서를 섞고, shuffle_buffer 크기의 buffer로 sample 순서를 섞는다.
+    shard는 worker 별로 나눠서 읽으므로 shard 수가 num_workers 이상이어야 모든 worker가 일한다.
+    """
+    def __init__(self, shard_dir, is_train=True, transforms=None, fold=Config.FOLD, shuffle_buffer=64,
+                 seed=Config.RANDOM_SEED, uint8=Config.UINT8_PIPELINE, in_channels=Config.IN_CHANNELS,
+                 packed=Config.PACKED_LABELS, bitfield=Config.BITFIELD_MASKS):
+        self.shard_dir = shard_dir
+        self.is_train = is_train
+        self.transforms = transforms
+        self.shuffle_buffer = shuffle_buffer if is_train else 0
+        self.seed = seed
+        self.uint8 = uint8
+        self.in_channels = in_channels
+        self.packed = packed
+        self.bitfield = bitfield
+        self.epoch = 0
+
+        with open(os.path.join(shard_dir, INDEX_NAME), "r") as f:
+            index = json.load(f)
+        self.num_classes = len(index["classes"])
+
+        # fold번 fold를 validation으로 사용
+        self.shards = [
+            shard for shard in index["shards"]
+            if (shard["fold"] != fold if is_train else shard["fold"] == fold)
+        ]
+        if not is_train and any(shard.get("label_size") for shard in self.shards):
+            raise ValueError(f"fold {fold} was exported with label_size, "
+                             f"re-export shards with --fold {fold} to validate on it")
+
+    def __len__(self):
+        return sum(shard["count"] for shard in self.shards)
+
+    def set_epoch(self, epoch):
+        """epoch 마다 다른 shard / sample 순서를 쓰도록 설정 (DataLoader 생성 전 호출)"""
+        self.epoch = epoch
+
+    def _iter_raw(self, shards):
+        for shard in shards:
+            with tarfile.open(os.path.join(self.shard_dir, shard["path"]), "r|") as tar:
+                sample = {}
+                for member in tar:
+                    key, ext = member.name.split(".", 1)
+                    sample[ext] = tar.extractfile(member).read()
+                    if len(sample) == 2:
+                        yield sample
+                        sample = {}
+
+    def _shuffle(self, samples, rng):
+        buffer = []
+        for sample in samples:
+            if len(buffer) < self.shuffle_buffer:
+                buffer.append(sample)
+                continue
+            i = rng.randrange(len(buffer))
+            yield buffer[i]
+            buffer[i] = sample
+        rng.shuffle(buffer)
+        yield from buffer
+
+    def _decode(self, sample):
+        flag = cv2.IMREAD_GRAYSCALE if self.in_channels == 1 else cv2.IMREAD_COLOR
+        image = cv2.imdecode(np.frombuffer(sample["png"], dtype=np.uint8), flag)
+        with np.load(io.BytesIO(sample["label.npz"])) as f:
+            # bitfield 학습이면 shard의 packed label을 그대로 transform
+            if self.bitfield and self.is_train:
+                label = f["label"]
+            else:
+                label = np.unpackbits(f["label"], axis=-1, count=self.num_classes)
+        return to_channels(image, self.in_channels), label
+
+    def __iter__(self):
+        shards = list(self.shards)
+        if self.is_train:
+            # 모든 worker가 같은 순서로 섞은 뒤 나눠 가지도록 epoch 기반 seed 사용
+            random.Random(self.seed + self.epoch).shuffle(shards)
+
+        worker_info = get_worker_info()
+        worker_id = worker_info.id if worker_info is not None else 0
+        if worker_info is not None:
+            shards = shards[worker_info.id::worker_info.num_workers]
+
+        samples = self._iter_raw(shards)
+        if self.shuffle_buffer > 0:
+            rng = random.Random((self.seed + self.epoch) * 1000 + worker_id)
+            samples = self._shuffle(samples, rng)
+
+        for sample in samples:
+            image, label = self._decode(sample)
+            yield process_sample(image, label, self.transforms, self.is_train, self.uint8, self.in_channels,
+                                 self.packed, self.bitfield, self.num_classes)
@@ -0,0 +1,74 @@
+import numpy as np
+import torch
+from torch.utils.data import Dataset, IterableDataset, DataLoader
+from tqdm.auto import tqdm
+from config.config import Config
+
+
+def _pack_sample(sample):
+    """(image, (NC, H, W) mask) -> (image, (ceil(NC / 8), H, W) bit-packed mask)"""
+    image, mask = sample
+    if mask.dtype == torch.uint8 and mask.shape[0] < len(Config.CLASSES):
+        # dataset이 이미 bit-packing 해서 넘긴 경우
+        return image, mask
+    packed = np.packbits(mask.numpy().astype(np.uint8), axis=0)
+    return image, torch.from_numpy(packed)
+
+
+class _PackedDataset(Dataset):
+    # build 시 worker에서 mask를 pack 해서 넘겨 IPC 크기를 줄임
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, item):
+        return _pack_sample(self.dataset[item])
+
+
+class SharedValidCache(Dataset):
+    """
+    deterministic transform을 쓰는 validation dataset을 한 번만 materialize 해서 shared memory에 올린 cache
+
+    transform 적용 후의 image tensor와 class 축으로 bit-packing 한 mask를 shared memory tensor로 저장한다.
+    DataLoader worker는 fork/pickle 시 같은 shared memory를 참조하므로 epoch/worker 마다 복사하거나
+    PNG decode, JSON rasterize를 다시 하지 않는다. validation mask는 원본 해상도(2048)라서
+    dense로 들고 있으면 너무 크기 때문에 packed 상태로 두고 꺼낼 때 unpack 한다
+    (packed=True면 unpack 하지 않고 그대로 넘겨서 Transforms.to_device에서 unpack).
+
+    Args:
+        dataset (Dataset): is_train=False 이고 random transform이 없는 dataset (XRayDataset, XRayShardDataset 등)
+        num_workers (int): 최초 build 시 사용할 DataLoader worker 수
+        num_classes (int): mask class 수 (unpack 시 사용)
+        packed (bool): True면 bit-packed mask를 그대로 반환
+    """
+    def __init__(self, dataset, num_workers=4, num_classes=len(Config.CLASSES), packed=Config.PACKED_LABELS):
+        self.num_classes = num_classes
+        self.packed = packed
+        self.uint8 = getattr(dataset, "uint8", False)
+        self.images, self.masks = self._build(dataset, num_workers)
+
+    def _build(self, dataset, num_workers):
+        if isinstance(dataset, IterableDataset):
+            samples = map(_pack_sample, dataset)
+        else:
+            samples = DataLoader(_PackedDataset(dataset), batch_size=None, shuffle=False, num_workers=num_workers)
+
+        images, masks = None, None
+        for i, (image, packed) in enumerate(tqdm(samples, total=len(dataset), desc="Caching validation set")):
+            if images is None:
+                images = torch.empty((len(dataset),) + image.shape, dtype=image.dtype).share_memory_()
+                masks = torch.empty((len(dataset),) + packed.shape, dtype=torch.uint8).share_memory_()
+            images[i] = image
+            masks[i] = packed
+        return images, masks
+
+    def __len__(self):
+        return len(self.images)
+
+    def __getitem__(self, item):
+        if self.packed:
+            return self.images[item], self.masks[item]
+        mask = torch.from_numpy(np.unpackbits(self.masks[item].numpy(), axis=0, count=self.num_classes))
+        return self.images[item], mask if self.uint8 else mask.float()
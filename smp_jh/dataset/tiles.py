@@ -0,0 +1,261 @@
+import os
+import cv2
+import numpy as np
+from torch.utils.data import Sampler
+from tqdm.auto import tqdm
+from config.config import Config
+from dataset.dataset import XRayDataset, read_image, read_image_size, to_channels, process_sample
+from dataset.label_engine import load_polygons, rasterize_window
+
+
+class ForegroundMap:
+    """
+    이미지별 bone 영역 (모든 class의 합집합) coverage를 cell x cell 격자로 줄여 둔 map
+
+    TileSampler가 bone이 많은 tile 위치를 고를 때 사용한다. 원본 해상도 mask 대신
+    격자 (2048 / 32 = 64 x 64) 만 들고 있으므로 전체 학습 데이터도 수 MB 수준이다.
+
+    Layout ({path}.npz):
+        names        (N,)          라벨 파일 상대경로
+        cell         ()            격자 한 칸의 픽셀 수
+        image_sizes  (N, 2)        원본 (H, W)
+        maps         (N, GH, GW)   cell 별 foreground 비율 (0 ~ 255). 이미지가 GH * cell 보다 작으면 0으로 padding
+        mtimes, sizes (N,)         JSON 파일 mtime_ns / size (변경 감지용)
+
+    Args:
+        path (str): map .npz 경로
+        label_root (str, optional): 지정하면 map이 없거나 오래된 경우 다시 만듦
+        labelnames (list, optional): label_root 기준 JSON 상대경로. None이면 label_root 아래 모든 JSON
+        image_root (str, optional): build 시 JSON과 같은 이름의 PNG에서 이미지 크기를 읽을 root
+        cell (int): 격자 한 칸의 픽셀 수
+    """
+    def __init__(self, path, label_root=None, labelnames=None, image_root=None, cell=Config.FOREGROUND_CELL):
+        self.path = path
+
+        if label_root is not None:
+            if labelnames is None:
+                labelnames = sorted(
+                    os.path.relpath(os.path.join(root, fname), start=label_root)
+                    for root, _dirs, files in os.walk(label_root)
+                    for fname in files
+                    if os.path.splitext(fname)[1].lower() == ".json"
+                )
+            if not self._is_valid(label_root, labelnames, cell):
+                self.build(path, label_root, labelnames, image_root, cell)
+
+        with np.load(path) as index:
+            self.names = index["names"].tolist()
+            self.cell = int(index["cell"])
+            self.image_sizes = index["image_sizes"]
+            self.maps = index["maps"]
+        self.name2ind = {name: i for i, name in enumerate(self.names)}
+
+    @staticmethod
+    def _stat(label_root, labelnames):
+        stats = [os.stat(os.path.join(label_root, name)) for name in labelnames]
+        return np.array([st.st_mtime_ns for st in stats]), np.array([st.st_size for st in stats])
+
+    def _is_valid(self, label_root, labelnames, cell):
+        if not os.path.exists(self.path):
+            return False
+        labelnames = sorted(labelnames)
+        with np.load(self.path) as index:
+            if index["names"].tolist() != labelnames or int(index["cell"]) != cell:
+                return False
+            mtimes, sizes = self._stat(label_root, labelnames)
+            return np.array_equal(index["mtimes"], mtimes) and np.array_equal(index["sizes"], sizes)
+
+    @classmethod
+    def build(cls, path, label_root, labelnames, image_root, cell=Config.FOREGROUND_CELL):
+        """
+        labelnames JSON의 polygon을 원본 해상도로 합쳐서 채운 뒤 cell 단위 평균 coverage로 줄여 저장
+
+        Args:
+            path (str): 저장할 .npz 경로
+            label_root (str): 라벨 root
+            labelnames (list): label_root 기준 JSON 상대경로
+            image_root (str): 이미지 root (JSON과 같은 상대경로의 .png에서 크기를 읽음)
+            cell (int): 격자 한 칸의 픽셀 수
+        """
+        labelnames = sorted(labelnames)
+        print(f"Building foreground map {path} ({len(labelnames)} labels)")
+
+        image_sizes = np.array([
+            read_image_size(os.path.join(image_root, os.path.splitext(name)[0] + ".png")) for name in labelnames
+        ], dtype=np.int32).reshape(-1, 2)
+        grid = -(-image_sizes.max(axis=0) // cell) if len(labelnames) else np.zeros(2, dtype=np.int32)
+        maps = np.zeros((len(labelnames), grid[0], grid[1]), dtype=np.uint8)
+
+        for i, name in enumerate(tqdm(labelnames)):
+            height, width = image_sizes[i]
+            gh, gw = -(-height // cell), -(-width // cell)
+            canvas = np.zeros((gh * cell, gw * cell), dtype=np.uint8)
+            for _, points in load_polygons(os.path.join(label_root, name)):
+                cv2.fillPoly(canvas, [points], 255)
+            maps[i, :gh, :gw] = cv2.resize(canvas, (gw, gh), interpolation=cv2.INTER_AREA)
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        mtimes, sizes = cls._stat(label_root, labelnames)
+        tmp_path = os.path.splitext(path)[0] + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            names=np.array(labelnames),
+            cell=np.array(cell),
+            image_sizes=image_sizes,
+            maps=maps,
+            mtimes=mtimes,
+            sizes=sizes,
+        )
+        os.replace(tmp_path, path)
+
+    def image_size(self, label_name):
+        height, width = self.image_sizes[self.name2ind[label_name]]
+        return int(height), int(width)
+
+    def tile_weights(self, label_name, tile_size):
+        """
+        tile 좌상단이 각 cell에 있을 때 tile 안의 foreground 합 (cell 단위 box sum)
+
+        Returns:
+            np.ndarray: (H - tile) // cell + 1, (W - tile) // cell + 1 모양의 float64 weight
+        """
+        height, width = self.image_size(label_name)
+        fg = self.maps[self.name2ind[label_name]].astype(np.float64)
+        span = -(-tile_size // self.cell)
+        rows = (height - tile_size) // self.cell + 1
+        cols = (width - tile_size) // self.cell + 1
+        integral = np.pad(fg.cumsum(axis=0).cumsum(axis=1), ((1, 0), (1, 0)))
+        r, c = np.arange(rows)[:, None], np.arange(cols)[None, :]
+        r1, c1 = np.minimum(r + span, fg.shape[0]), np.minimum(c + span, fg.shape[1])
+        return integral[r1, c1] - integral[r, c1] - integral[r1, c] + integral[r, c]
+
+
+class TileSampler(Sampler):
+    """
+    XRayTileDataset용 sampler. epoch 마다 num_tiles 개의 (item, x0, y0) tile 위치를 생성
+
+    fg_prob 확률로 ForegroundMap의 tile 내 foreground 합에 비례해서 위치를 고르고 (bone이 있는 tile 위주),
+    나머지는 이미지 안에서 균일하게 고른다. 이미지는 매번 균일하게 고른다.
+
+    Args:
+        dataset (XRayTileDataset): tile dataset
+        num_tiles (int): epoch 당 tile 수 (None이면 이미지 수)
+        fg_prob (float): foreground 가중 sampling 비율
+        seed (int): epoch과 더해서 사용하는 seed
+    """
+    def __init__(self, dataset, num_tiles=Config.TILES_PER_EPOCH, fg_prob=Config.TILE_FG_PROB,
+                 seed=Config.RANDOM_SEED):
+        self.dataset = dataset
+        self.num_tiles = num_tiles or len(dataset)
+        self.fg_prob = fg_prob
+        self.seed = seed
+        self.epoch = 0
+
+        # 이미지별 tile 좌상단 cell의 누적 분포 (foreground가 없으면 None -> 균일)
+        tile_size = dataset.tile_size
+        self.cdfs = []
+        for label_name in dataset.labelnames:
+            weights = dataset.foreground.tile_weights(label_name, tile_size).ravel()
+            total = weights.sum()
+            self.cdfs.append(np.cumsum(weights) / total if total > 0 else None)
+
+    def __len__(self):
+        return self.num_tiles
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __iter__(self):
+        rng = np.random.default_rng(self.seed + self.epoch)
+        self.epoch += 1
+        foreground = self.dataset.foreground
+        tile_size = self.dataset.tile_size
+        cell = foreground.cell
+
+        items = rng.integers(len(self.dataset), size=self.num_tiles)
+        biased = rng.random(self.num_tiles) < self.fg_prob
+        for item, use_fg in zip(items.tolist(), biased.tolist()):
+            label_name = self.dataset.labelnames[item]
+            height, width = foreground.image_size(label_name)
+            cdf = self.cdfs[item]
+            if use_fg and cdf is not None:
+                cols = (width - tile_size) // cell + 1
+                row, col = divmod(int(np.searchsorted(cdf, rng.random(), side="right").clip(max=len(cdf) - 1)), cols)
+                # 고른 cell 안에서 위치를 한 번 더 섞음
+                y0 = min(row * cell + int(rng.integers(cell)), height - tile_size)
+                x0 = min(col * cell + int(rng.integers(cell)), width - tile_size)
+            else:
+                y0 = int(rng.integers(height - tile_size + 1))
+                x0 = int(rng.integers(width - tile_size + 1))
+            yield item, x0, y0
+
+
+class XRayTileDataset(XRayDataset):
+    """
+    원본 해상도 이미지에서 tile_size x tile_size tile을 잘라서 반환하는 학습용 XRayDataset
+
+    index로 TileSampler가 만든 (item, x0, y0)를 받는다 (정수 index면 위치를 균일하게 고름).
+    image store가 있으면 memmap에서 tile 영역만 읽고, label은 label cache의 tile 영역만 unpack 하거나
+    polygon을 tile 창에만 rasterize 해서 2048 x 2048 x 29 mask를 만들지 않는다.
+    원본 해상도를 그대로 쓰므로 label_size / pyramid는 사용하지 않는다.
+
+    Args:
+        tile_size (int): tile 한 변 크기
+        foreground_path (str): ForegroundMap .npz 경로 (없거나 오래되면 생성)
+        나머지는 XRayDataset과 같음
+    """
+    def __init__(self, image_root, label_root, is_train=True, transforms=None, tile_size=Config.TILE_SIZE,
+                 foreground_path=Config.FOREGROUND_MAP_PATH, **kwargs):
+        kwargs.update(label_size=None, pyramid_levels=None)
+        super().__init__(image_root, label_root, is_train=is_train, transforms=transforms, **kwargs)
+        self.tile_size = tile_size
+        self.foreground = ForegroundMap(foreground_path, label_root, self.jsons, image_root=image_root)
+
+    def _load_tile(self, index):
+        if isinstance(index, (tuple, list)):
+            item, x0, y0 = index
+        else:
+            item = index
+            height, width = self.foreground.image_size(self.labelnames[item])
+            x0 = np.random.randint(width - self.tile_size + 1)
+            y0 = np.random.randint(height - self.tile_size + 1)
+        x1, y1 = x0 + self.tile_size, y0 + self.tile_size
+        image_name = self.filenames[item]
+        label_name = self.labelnames[item]
+
+        if self.image_store is not None:
+            # memmap view에서 tile 영역만 복사 (해당 행의 page만 읽음)
+            image = np.ascontiguousarray(self.image_store[image_name][y0:y1, x0:x1])
+        else:
+            image = read_image(os.path.join(self.image_root, image_name), self.in_channels)[y0:y1, x0:x1].copy()
+
+        if self.label_cache is not None:
+            packed = self.label_cache.get_packed(label_name)[y0:y1, x0:x1]
+            # bitfield 학습이면 packed tile 그대로 transform
+            if self.bitfield and self.is_train:
+                label = np.ascontiguousarray(packed)
+            else:
+                label = np.unpackbits(packed, axis=-1, count=len(self.CLASS2IND))
+        else:
+            if self.polygon_store is not None:
+                polygons = self.polygon_store.get(label_name, self.CLASS2IND)
+            else:
+                polygons = load_polygons(os.path.join(self.label_root, label_name), self.CLASS2IND)
+            label = rasterize_window(polygons, (x0, y0, x1, y1), self.foreground.image_size(label_name))
+        return to_channels(image, self.in_channels), label
+
+    def __getitem__(self, index):
+        image, label = self._load_tile(index)
+        return process_sample(image, label, self.transforms, self.is_train, self.uint8, self.in_channels,
+                              self.packed, self.bitfield)
+
+    def __getitems__(self, indices):
+        if self.fetch_threads <= 1 or len(indices) <= 1:
+            return [self[index] for index in indices]
+        # tile read / rasterize는 thread로 동시에, augmentation은 순서대로
+        tiles = list(self._get_fetch_pool().map(self._load_tile, indices))
+        return [
+            process_sample(image, label, self.transforms, self.is_train, self.uint8, self.in_channels, self.packed,
+                           self.bitfield)
+            for image, label in tiles
+        ]
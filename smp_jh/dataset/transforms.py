@@ -1,9 +1,169 @@
+import random
+import cv2
+import numpy as np
+import torch
 import albumentations as A
 from config.config import Config
+from dataset.gpu_transforms import BatchAugment
+
+
+class FusedAffine(A.DualTransform):
+    """
+    Resize + Rotate + HorizontalFlip을 affine matrix 하나로 합쳐서 warpAffine 한 번으로 적용하는 transform
+
+    각각 따로 적용하면 image와 29채널 mask를 세 번 interpolation / 복사하지만, 합친 matrix로
+    원본 해상도에서 출력 크기로 바로 warp 해서 한 번만 interpolation 하고 mask도 한 번만 읽고 쓴다.
+    image는 bilinear, mask는 nearest로 warp 하고 회전으로 생기는 빈 영역은 0으로 채운다.
+
+    Args:
+        height (int): 출력 높이
+        width (int): 출력 너비
+        limit (float): 최대 회전 각도 (도)
+        rotate_p (float): 회전 확률
+        flip_p (float): horizontal flip 확률
+        p (float): transform 적용 확률 (적용하지 않으면 크기도 바뀌지 않으므로 보통 1)
+    """
+    def __init__(self, height, width, limit=10, rotate_p=0.8, flip_p=1.0, p=1.0):
+        super().__init__(p=p)
+        self.height = height
+        self.width = width
+        self.limit = limit
+        self.rotate_p = rotate_p
+        self.flip_p = flip_p
+
+    def get_params(self):
+        rng = getattr(self, "py_random", random)
+        angle = rng.uniform(-self.limit, self.limit) if rng.random() < self.rotate_p else 0.0
+        return {"angle": angle, "flip": rng.random() < self.flip_p}
+
+    def matrix(self, src_size, angle, flip):
+        """
+        원본 (H, W) 픽셀 좌표 -> 출력 픽셀 좌표 (2, 3) matrix
+
+        resize (픽셀 중심 기준 scale) -> 출력 중심 기준 회전 -> 좌우 반전 순서를 합성한다.
+        """
+        height, width = src_size
+        sx, sy = self.width / width, self.height / height
+        resize = np.array([[sx, 0, 0.5 * sx - 0.5], [0, sy, 0.5 * sy - 0.5], [0, 0, 1]])
+        center = ((self.width - 1) / 2, (self.height - 1) / 2)
+        rotate = np.vstack([cv2.getRotationMatrix2D(center, angle, 1.0), [0, 0, 1]])
+        flip = np.array([[-1, 0, self.width - 1], [0, 1, 0], [0, 0, 1]]) if flip else np.eye(3)
+        return (flip @ rotate @ resize)[:2]
+
+    def _warp(self, array, angle, flip, interpolation):
+        M = self.matrix(array.shape[:2], angle, flip)
+        # warpAffine은 29채널 mask도 한 번에 처리 (최대 512채널)
+        out = cv2.warpAffine(array, M, (self.width, self.height), flags=interpolation,
+                             borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+        if array.ndim == 3 and out.ndim == 2:
+            out = out[..., None]
+        return out
+
+    def apply(self, img, angle=0.0, flip=False, **params):
+        return self._warp(img, angle, flip, cv2.INTER_LINEAR)
+
+    def apply_to_mask(self, mask, angle=0.0, flip=False, **params):
+        return self._warp(mask, angle, flip, cv2.INTER_NEAREST)
+
+    def get_transform_init_args_names(self):
+        return ("height", "width", "limit", "rotate_p", "flip_p")
+
+
+class IntensityLUT(A.ImageOnlyTransform):
+    """
+    RandomGamma + RandomBrightnessContrast를 256칸 lookup table 하나로 합쳐서 cv2.LUT 한 번으로 적용하는 transform
+
+    uint8 이미지는 gamma table과 brightness / contrast table을 합성해서 픽셀마다 float 연산 없이 한 번만 읽고 쓴다.
+    brightness_by_max=False의 기준 평균도 이미지 histogram과 gamma table로 구하므로 gamma 적용 이미지를 만들지 않는다.
+    (uint8 결과는 RandomGamma -> RandomBrightnessContrast를 차례로 적용한 것과 같음)
+    float 이미지는 LUT를 쓸 수 없으므로 같은 식을 그대로 계산한다.
+
+    Args:
+        gamma_limit (tuple): gamma 범위 (/ 100)
+        gamma_p (float): gamma 적용 확률
+        brightness_limit (float): 밝기 조정 범위 (±)
+        contrast_limit (float): 대비 조정 범위 (±)
+        brightness_by_max (bool): True면 최대값, False면 이미지 평균 기준으로 밝기 조정
+        brightness_contrast_p (float): brightness / contrast 적용 확률
+        p (float): transform 적용 확률
+    """
+    def __init__(self, gamma_limit=(80, 200), gamma_p=0.3, brightness_limit=0.24, contrast_limit=0.24,
+                 brightness_by_max=False, brightness_contrast_p=0.8, p=1.0):
+        super().__init__(p=p)
+        self.gamma_limit = gamma_limit
+        self.gamma_p = gamma_p
+        self.brightness_limit = brightness_limit
+        self.contrast_limit = contrast_limit
+        self.brightness_by_max = brightness_by_max
+        self.brightness_contrast_p = brightness_contrast_p
+
+    def get_params(self):
+        rng = getattr(self, "py_random", random)
+        params = {"gamma": None, "alpha": None, "beta": 0.0}
+        if rng.random() < self.gamma_p:
+            params["gamma"] = rng.uniform(*self.gamma_limit) / 100.0
+        if rng.random() < self.brightness_contrast_p:
+            params["alpha"] = 1.0 + rng.uniform(-self.contrast_limit, self.contrast_limit)
+            params["beta"] = rng.uniform(-self.brightness_limit, self.brightness_limit)
+        return params
+
+    def lut(self, img, gamma=None, alpha=None, beta=0.0):
+        """
+        uint8 이미지에 적용할 (256,) uint8 lookup table (gamma -> brightness / contrast 순서로 합성)
+        """
+        table = np.arange(256, dtype=np.uint8)
+        if gamma is not None:
+            table = ((np.arange(0, 256.0 / 255, 1.0 / 255) ** gamma) * 255).astype(np.uint8)
+        if alpha is None:
+            return table
+
+        if self.brightness_by_max:
+            beta = beta * 255
+        elif gamma is None:
+            channels = img.shape[2] if img.ndim == 3 else 1
+            beta = beta * sum(cv2.mean(img)[:channels]) / channels
+        else:
+            # gamma 적용 후 이미지 평균 = histogram과 gamma table의 내적
+            hist = cv2.calcHist([img.reshape(img.shape[0], -1)], [0], None, [256], [0, 256]).ravel()
+            beta = beta * float(hist @ table) / img.size
+        adjust = np.clip(np.arange(256, dtype=np.float32) * alpha + beta, 0, 255).astype(np.uint8)
+        return adjust[table]
+
+    def apply(self, img, gamma=None, alpha=None, beta=0.0, **params):
+        if gamma is None and alpha is None:
+            return img
+        if img.dtype == np.uint8:
+            return cv2.LUT(img, self.lut(img, gamma, alpha, beta)).reshape(img.shape)
+
+        if gamma is not None:
+            img = np.power(img, gamma)
+        if alpha is not None:
+            beta = beta if self.brightness_by_max else beta * np.mean(img)
+            img = np.clip(img * alpha + beta, 0, 1).astype(np.float32)
+        return img
+
+    def get_transform_init_args_names(self):
+        return ("gamma_limit", "gamma_p", "brightness_limit", "contrast_limit", "brightness_by_max",
+                "brightness_contrast_p")
+
 
 class Transforms:
     @staticmethod
     def get_train_transform():
+        if Config.FUSED_GEOMETRY:
+            # Resize / Rotate / HorizontalFlip을 warpAffine 한 번으로 합쳐서 적용
+            return A.Compose([
+                FusedAffine(Config.IMG_SIZE, Config.IMG_SIZE, limit=10, rotate_p=0.8, flip_p=1.0),
+                *Transforms.get_intensity_transform(),
+            ])
+        if Config.LUT_INTENSITY:
+            # gamma / brightness / contrast는 geometry 뒤에서 LUT 한 번으로 적용
+            return A.Compose([
+                A.Resize(Config.IMG_SIZE, Config.IMG_SIZE),
+                A.Rotate(limit=10, p=0.8),
+                A.HorizontalFlip(p=1),
+                *Transforms.get_intensity_transform(),
+            ])
         return A.Compose([
             A.Resize(Config.IMG_SIZE, Config.IMG_SIZE),
             A.RandomGamma(gamma_limit=(80, 200), p=0.3),
@@ -31,6 +191,49 @@ class Transforms:
             A.RandomGamma(gamma_limit=(80, 200), p=0.3)  # 감마 보정 추가
         ])
 
+    @staticmethod
+    def get_intensity_transform():
+        # RandomGamma (p=0.3) + RandomBrightnessContrast (p=0.8). LUT_INTENSITY면 cv2.LUT 한 번으로 합쳐서 적용
+        if Config.LUT_INTENSITY:
+            return [IntensityLUT(gamma_limit=(80, 200), gamma_p=0.3, brightness_limit=0.24, contrast_limit=0.24,
+                                 brightness_by_max=False, brightness_contrast_p=0.8)]
+        return [
+            A.RandomGamma(gamma_limit=(80, 200), p=0.3),
+            A.RandomBrightnessContrast(
+                brightness_limit=0.24,
+                contrast_limit=0.24,
+                brightness_by_max=False,
+                p=0.8
+             ),
+        ]
+
+    @staticmethod
+    def get_tile_transform():
+        # 원본 해상도 tile 학습용 (Resize 없이 train transform과 같은 augmentation)
+        if Config.LUT_INTENSITY:
+            return A.Compose([
+                A.Rotate(limit=10, p=0.8),
+                A.HorizontalFlip(p=1),
+                *Transforms.get_intensity_transform(),
+            ])
+        return A.Compose([
+            A.RandomGamma(gamma_limit=(80, 200), p=0.3),
+            A.Rotate(limit=10, p=0.8),
+            A.HorizontalFlip(p=1),
+            A.RandomBrightnessContrast(
+                brightness_limit=0.24,
+                contrast_limit=0.24,
+                brightness_by_max=False,
+                p=0.8
+             ),
+        ])
+
+    @staticmethod
+    def get_device_train_transform(size=(Config.IMG_SIZE, Config.IMG_SIZE)):
+        # get_train_transform과 같은 recipe를 device에서 batch 단위로 적용 (size=None이면 tile처럼 크기 유지)
+        return BatchAugment(size, rotate=10, rotate_p=0.8, flip_p=1.0, gamma_limit=(80, 200), gamma_p=0.3,
+                            brightness_limit=0.24, contrast_limit=0.24, brightness_contrast_p=0.8)
+
     @staticmethod
     def get_valid_transform():
         return A.Compose([
@@ -42,3 +245,52 @@ class Transforms:
         return A.Compose([
             A.Resize(Config.IMG_SIZE, Config.IMG_SIZE),
         ])
+
+    @staticmethod
+    def unpack_masks(packed, num_classes=len(Config.CLASSES)):
+        """
+        class 축으로 np.packbits 한 mask를 (CPU/GPU 어디서든) torch 연산으로 unpack
+
+        Args:
+            packed (torch.Tensor): (B, ceil(NC / 8), H, W) uint8. 첫 번째 class가 첫 byte의 MSB
+            num_classes (int): class 수
+
+        Returns:
+            torch.Tensor: (B, NC, H, W) uint8 (0/1)
+        """
+        shifts = torch.arange(7, -1, -1, dtype=torch.uint8, device=packed.device).view(1, 1, 8, 1, 1)
+        bits = (packed.unsqueeze(2) >> shifts) & 1
+        return bits.flatten(1, 2)[:, :num_classes]
+
+    @staticmethod
+    def to_device(images, masks=None, device="cuda", non_blocking=True, num_classes=len(Config.CLASSES)):
+        """
+        batch를 device로 옮긴 뒤 float 변환 및 [0, 1] 정규화
+
+        uint8 pipeline (Config.UINT8_PIPELINE)에서는 worker가 uint8 그대로 넘기고
+        변환은 여기서 batch 단위로 한 번만 수행한다. float batch는 그대로 통과.
+        bit-packed mask (Config.PACKED_LABELS, channel 수 < num_classes)는 device에서 unpack 한다.
+
+        Args:
+            images (torch.Tensor): (B, C, H, W) uint8 또는 float
+            masks (torch.Tensor, optional): (B, NC, H, W) uint8/float 또는 (B, ceil(NC / 8), H, W) packed uint8
+            device (torch.device): 대상 device
+            non_blocking (bool): pinned memory에서 비동기 복사 여부
+            num_classes (int): class 수 (packed mask 판별 및 unpack에 사용)
+
+        Returns:
+            tuple: (images, masks) float32 tensor. masks가 None이면 images만 반환
+        """
+        images = images.to(device, non_blocking=non_blocking)
+        if images.dtype == torch.uint8:
+            images = images.float().div_(255.)
+        else:
+            images = images.float()
+
+        if masks is None:
+            return images
+        
+        masks = masks.to(device, non_blocking=non_blocking)
+        if masks.dtype == torch.uint8 and masks.size(1) < num_classes:
+            masks = Transforms.unpack_masks(masks, num_classes)
+        return images, masks.float()
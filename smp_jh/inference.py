@@ -20,7 +20,7 @@ def test(model, data_loader, thr=0.5):
     
     with torch.no_grad():
         for step, (images, image_names) in tqdm(enumerate(data_loader), total=len(data_loader)):
-            images = images.cuda()
+            images = Transforms.to_device(images, device="cuda")
             outputs = model(images)
             
             # Resize to original size
@@ -10,11 +10,12 @@ class SwinEncoder(torch.nn.Module, EncoderMixin):
     def __init__(self, **kwargs):
         super().__init__()
         
-        # UnetPlusPlus에 맞는 채널 수로 수정
-        self._out_channels = [3, 64, 128, 256, 512, 1024]  # 더 큰 채널 수 사용
+        # UnetPlusPlus에 맞는 채널 수로 수정 (첫 번째는 입력 이미지 그대로)
+        self._in_channels = Config.IN_CHANNELS
+        self._out_channels = [self._in_channels, 64, 128, 256, 512, 1024]  # 더 큰 채널 수 사용
         self._depth = 5
-        self._in_channels = 3
         
+        # in_chans=1이면 timm이 pretrained patch embedding weight를 채널 축으로 합쳐서 불러옴
         self.swin = timm.create_model(
             'swin_large_patch4_window12_384',
             pretrained=True,
@@ -38,6 +39,10 @@ class SwinEncoder(torch.nn.Module, EncoderMixin):
             nn.MaxPool2d(2, 2)
         )
 
+    def set_in_channels(self, in_channels, pretrained=True):
+        # patch embedding은 생성 시 timm이 in_chans에 맞춰 변환했으므로 smp의 첫 conv 교체 (재초기화)는 하지 않음
+        assert in_channels == self._in_channels, f"SwinEncoder was built for {self._in_channels} input channels"
+
     def forward(self, x: torch.Tensor) -> List[torch.Tensor]:
         features = self.swin(x)
         features = [feat.permute(0, 3, 1, 2) for feat in features]
@@ -27,7 +27,7 @@ def get_model(num_classes=29):
         return model_fn(
             encoder_name="swin_encoder",
             encoder_weights=None,
-            in_channels=3,
+            in_channels=Config.IN_CHANNELS,
             classes=num_classes,
             decoder_channels=decoder_channels,
             decoder_use_batchnorm=True,
@@ -37,6 +37,6 @@ def get_model(num_classes=29):
     return model_fn(
         encoder_name="swin_encoder" if Config.ENCODER_NAME == "swin" else Config.ENCODER_NAME,
         encoder_weights=None if Config.ENCODER_NAME == "swin" else Config.ENCODER_WEIGHTS,
-        in_channels=3,
+        in_channels=Config.IN_CHANNELS,
         classes=num_classes,
     )
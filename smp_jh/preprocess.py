@@ -0,0 +1,127 @@
+import argparse
+from config.config import Config
+from dataset.manifest import build_manifest, group_folds, list_files, load_manifest, is_manifest_current
+from dataset.shards import export_shards
+from dataset.pyramid import build_pyramid
+from dataset.polygon_store import PolygonStore
+from dataset.tiles import ForegroundMap
+from dataset.dataset import XRayDataset
+from dataset.transforms import Transforms
+from dataset.augment_bank import build_augment_bank
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="학습 데이터 전처리 (manifest 등 1회성 빌드 작업)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    manifest = subparsers.add_parser("manifest", help="경로/환자 ID/strata/fold 할당 manifest 생성")
+    manifest.add_argument("--output", type=str, default=Config.MANIFEST_PATH)
+    manifest.add_argument("--n_splits", type=int, default=5)
+    manifest.add_argument("--seed", type=int, default=42)
+
+    shards = subparsers.add_parser("shards", help="이미지 + bit-packed label을 fold별 tar shard로 export")
+    shards.add_argument("--output", type=str, default=Config.SHARD_DIR or "../data/shards")
+    shards.add_argument("--split", type=str, default="group", choices=["group", "stratified"],
+                        help="group: XRayDataset의 GroupKFold, stratified: manifest의 StratifiedGroupKFold")
+    shards.add_argument("--manifest", type=str, default=Config.MANIFEST_PATH)
+    shards.add_argument("--n_splits", type=int, default=5)
+    shards.add_argument("--samples_per_shard", type=int, default=64)
+    shards.add_argument("--label_size", type=int, default=Config.LABEL_SIZE)
+    shards.add_argument("--fold", type=int, default=Config.FOLD, help="원본 해상도로 저장할 validation fold")
+
+    pyramid = subparsers.add_parser("pyramid", help="해상도별 image store / label cache를 한 번에 생성")
+    pyramid.add_argument("--store_dir", type=str, default=Config.IMAGE_STORE_DIR or "../data/cache")
+    pyramid.add_argument("--cache_dir", type=str, default=Config.LABEL_CACHE_DIR or "../data/cache/labels")
+    pyramid.add_argument("--levels", type=int, nargs="+", default=list(Config.PYRAMID_LEVELS or (2048, 1024, 512)))
+    pyramid.add_argument("--num_workers", type=int, default=8)
+
+    polygons = subparsers.add_parser("polygons", help="어노테이션 JSON을 flat int32 polygon store로 변환")
+    polygons.add_argument("--output", type=str, default=Config.POLYGON_STORE_DIR or "../data/cache/polygons")
+
+    foreground = subparsers.add_parser("foreground", help="tile sampling용 이미지별 bone coverage 격자 생성")
+    foreground.add_argument("--output", type=str, default=Config.FOREGROUND_MAP_PATH)
+    foreground.add_argument("--cell", type=int, default=Config.FOREGROUND_CELL)
+
+    bank = subparsers.add_parser("bank", help="학습 이미지마다 augmentation variant를 미리 만들어 memmap bank로 저장")
+    bank.add_argument("--output", type=str, default=Config.AUGMENT_BANK_DIR or "../data/augment_bank")
+    bank.add_argument("--variants", type=int, default=Config.AUGMENT_BANK_VARIANTS)
+    bank.add_argument("--num_workers", type=int, default=8)
+    bank.add_argument("--seed", type=int, default=Config.RANDOM_SEED)
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.command == "manifest":
+        build_manifest(
+            Config.TRAIN_IMAGE_ROOT,
+            Config.TRAIN_LABEL_ROOT,
+            Config.META_PATH,
+            args.output,
+            n_splits=args.n_splits,
+            random_state=args.seed,
+        )
+
+    elif args.command == "shards":
+        if args.split == "stratified":
+            manifest = load_manifest(args.manifest)
+            if not is_manifest_current(manifest, Config.TRAIN_IMAGE_ROOT, Config.TRAIN_LABEL_ROOT,
+                                       Config.META_PATH):
+                raise ValueError(f"{args.manifest} is out of date, run python preprocess.py manifest first")
+            filenames = manifest["filenames"].tolist()
+            labelnames = manifest["labelnames"].tolist()
+            folds = manifest["folds"]
+        else:
+            filenames = list_files(Config.TRAIN_IMAGE_ROOT, ".png")
+            labelnames = list_files(Config.TRAIN_LABEL_ROOT, ".json")
+            folds = group_folds(filenames, n_splits=args.n_splits)
+
+        export_shards(
+            Config.TRAIN_IMAGE_ROOT,
+            Config.TRAIN_LABEL_ROOT,
+            filenames,
+            labelnames,
+            folds,
+            args.output,
+            samples_per_shard=args.samples_per_shard,
+            label_size=args.label_size,
+            valid_fold=args.fold,
+        )
+
+    elif args.command == "pyramid":
+        build_pyramid(
+            Config.TRAIN_IMAGE_ROOT,
+            Config.TRAIN_LABEL_ROOT,
+            args.store_dir,
+            args.cache_dir,
+            levels=args.levels,
+            num_workers=args.num_workers,
+        )
+
+    elif args.command == "polygons":
+        PolygonStore.build(args.output, Config.TRAIN_LABEL_ROOT, list_files(Config.TRAIN_LABEL_ROOT, ".json"))
+
+    elif args.command == "foreground":
+        ForegroundMap.build(args.output, Config.TRAIN_LABEL_ROOT, list_files(Config.TRAIN_LABEL_ROOT, ".json"),
+                            Config.TRAIN_IMAGE_ROOT, cell=args.cell)
+
+
+    elif args.command == "bank":
+        # train.py와 같은 train split / train transform을 uint8 + packed로 저장
+        dataset = XRayDataset(
+            image_root=Config.TRAIN_IMAGE_ROOT,
+            label_root=Config.TRAIN_LABEL_ROOT,
+            is_train=True,
+            transforms=Transforms.get_train_transform(),
+            uint8=True,
+            packed=True,
+            fetch_threads=1,
+        )
+        build_augment_bank(args.output, dataset, num_variants=args.variants, num_workers=args.num_workers,
+                           seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,13 @@ from tqdm.auto import tqdm
 from datetime import timedelta
 from config.config import Config
 from dataset.dataset import XRayDataset
+from dataset.shards import XRayShardDataset
+from dataset.tiles import XRayTileDataset, TileSampler
+from dataset.hard_example import HardExampleSampler, per_sample_class_loss
+from dataset.shared_cache import SharedValidCache
+from dataset.ring_buffer import RingBufferLoader, list_collate
+from dataset.echo import EchoLoader
+from dataset.augment_bank import XRayBankDataset
 from models.model import get_model
 from utils.metrics import dice_coef
 from dataset.transforms import Transforms
@@ -30,7 +37,47 @@ def set_seed(seed):
     np.random.seed(seed)
     random.seed(seed)     
 
-def validation(epoch, model, data_loader, criterion, device, threshold=0.5):
+def tiled_validation_step(model, images, masks, criterion, device, threshold, tile_size):
+    """
+    원본 해상도 batch를 tile_size 창으로 나눠 forward 하고 (loss, dice) 계산
+
+    device에는 tile 하나 크기의 입력 / 출력만 올린다. 마지막 창은 이미지 안쪽으로 밀어서 tile 크기를 유지하고
+    앞 창과 겹치는 부분은 버린다. dice는 창별 교집합 / 합을 이미지 단위로 더해서 전체 이미지의 dice_coef와
+    같은 값을 얻고, loss는 창 면적 가중 평균이다.
+
+    Returns:
+        tuple: (loss, (B, NC) dice)
+    """
+    height, width = images.shape[-2:]
+    intersection = total = 0
+    loss = 0.
+    for y in range(0, height, tile_size):
+        for x in range(0, width, tile_size):
+            y0, x0 = max(min(y, height - tile_size), 0), max(min(x, width - tile_size), 0)
+            tile_images, tile_masks = Transforms.to_device(
+                images[..., y0:y0 + tile_size, x0:x0 + tile_size],
+                masks[..., y0:y0 + tile_size, x0:x0 + tile_size],
+                device, non_blocking=False
+            )
+            outputs = model(tile_images)
+            if outputs.shape[-2:] != tile_masks.shape[-2:]:
+                outputs = F.interpolate(outputs, size=tile_masks.shape[-2:], mode="bilinear")
+            
+            # 앞 창과 겹치는 부분 제외
+            outputs = outputs[..., y - y0:, x - x0:]
+            tile_masks = tile_masks[..., y - y0:, x - x0:]
+            area = tile_masks.size(-2) * tile_masks.size(-1)
+            loss += criterion(outputs, tile_masks).item() * area
+            
+            preds = (torch.sigmoid(outputs) > threshold).float().flatten(2)
+            tile_masks = tile_masks.flatten(2)
+            intersection = intersection + torch.sum(preds * tile_masks, -1)
+            total = total + torch.sum(preds, -1) + torch.sum(tile_masks, -1)
+    
+    eps = 0.0001
+    return loss / (height * width), (2. * intersection + eps) / (total + eps)
+
+def validation(epoch, model, data_loader, criterion, device, threshold=0.5, tile_size=None):
     """
     Validation function with improved monitoring and GPU utilization
     
@@ -41,6 +88,7 @@ def validation(epoch, model, data_loader, criterion, device, threshold=0.5):
         criterion (nn.Module): Loss criterion
         device (torch.device): Device to use
         threshold (float): Threshold for binary prediction
+        tile_size (int, optional): 지정하면 원본 해상도 이미지를 tile_size 창으로 나눠서 평가 (tiled_validation_step)
     
     Returns:
         tuple: (average_dice, class_dice_dict, average_loss)
@@ -59,9 +107,21 @@ def validation(epoch, model, data_loader, criterion, device, threshold=0.5):
                 raise ValueError(
                     f"Expected images and masks to be torch.Tensor, but got images: {type(images)}, masks: {type(masks)}"
                 )
+            
+            if tile_size:
+                loss, dice = tiled_validation_step(model, images, masks, criterion, device, threshold, tile_size)
+                total_loss += loss
+                dices.append(dice.detach().cpu())
+                if (step + 1) % 10 == 0:
+                    print(
+                        f'{datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")} | '
+                        f'Step [{step+1}/{len(data_loader)}], '
+                        f'Loss: {round(loss,4)}, '
+                        f'Dice: {round(torch.mean(dice).item(),4)}'
+                    )
+                continue
         
-            images = images.to(device, non_blocking=False)
-            masks = masks.to(device, non_blocking=False)
+            images, masks = Transforms.to_device(images, masks, device, non_blocking=False)
         
             # Forward pass
             outputs = model(images)
@@ -149,29 +209,100 @@ def train():
     )
     
     # 데이터셋 준비
-    train_dataset = XRayDataset(
-        image_root=Config.TRAIN_IMAGE_ROOT,
-        label_root=Config.TRAIN_LABEL_ROOT,
-        is_train=True,
-        transforms=Transforms.get_train_transform()
-    )
+    # device augmentation이면 train worker는 uint8 decode만 하고 augmentation은 학습 loop에서 batch 단위로 수행
+    batch_augment = None
+    train_kwargs = {}
+    valid_tile_size = None
+    if Config.DEVICE_AUGMENT and not Config.AUGMENT_BANK_DIR:
+        batch_augment = Transforms.get_device_train_transform(None if Config.TILE_SIZE else
+                                                              (Config.IMG_SIZE, Config.IMG_SIZE))
+        train_kwargs = dict(uint8=True)
+
+    if Config.SHARD_DIR:
+        # tar shard를 순차적으로 읽는 iterable dataset (shuffle은 dataset 내부에서 수행)
+        train_dataset = XRayShardDataset(
+            shard_dir=Config.SHARD_DIR,
+            is_train=True,
+            transforms=None if batch_augment else Transforms.get_train_transform(),
+            **train_kwargs
+        )
+        valid_dataset = XRayShardDataset(
+            shard_dir=Config.SHARD_DIR,
+            is_train=False,
+            transforms=Transforms.get_valid_transform()
+        )
+    elif Config.AUGMENT_BANK_DIR:
+        # 미리 만들어 둔 augmentation variant를 epoch 마다 하나씩 읽음 (validation은 기존과 같음)
+        train_dataset = XRayBankDataset(Config.AUGMENT_BANK_DIR)
+        
+        valid_dataset = XRayDataset(
+            image_root=Config.TRAIN_IMAGE_ROOT,
+            label_root=Config.TRAIN_LABEL_ROOT,
+            is_train=False,
+            transforms=Transforms.get_valid_transform()
+        )
+    elif Config.TILE_SIZE:
+        # 원본 해상도에서 foreground 위주로 tile을 잘라서 학습하고, validation은 원본 해상도를 tile 창으로 나눠서 평가
+        # (loader는 원본 이미지 / mask를 CPU에 두고, device에는 tile 크기만 올림)
+        valid_tile_size = Config.TILE_SIZE
+        train_dataset = XRayTileDataset(
+            image_root=Config.TRAIN_IMAGE_ROOT,
+            label_root=Config.TRAIN_LABEL_ROOT,
+            is_train=True,
+            transforms=None if batch_augment else Transforms.get_tile_transform(),
+            **train_kwargs
+        )
+        
+        valid_dataset = XRayDataset(
+            image_root=Config.TRAIN_IMAGE_ROOT,
+            label_root=Config.TRAIN_LABEL_ROOT,
+            is_train=False,
+            transforms=None
+        )
+    else:
+        train_dataset = XRayDataset(
+            image_root=Config.TRAIN_IMAGE_ROOT,
+            label_root=Config.TRAIN_LABEL_ROOT,
+            is_train=True,
+            transforms=None if batch_augment else Transforms.get_train_transform(),
+            **train_kwargs
+        )
+        
+        valid_dataset = XRayDataset(
+            image_root=Config.TRAIN_IMAGE_ROOT,
+            label_root=Config.TRAIN_LABEL_ROOT,
+            is_train=False,
+            transforms=Transforms.get_valid_transform()
+        )
     
-    valid_dataset = XRayDataset(
-        image_root=Config.TRAIN_IMAGE_ROOT,
-        label_root=Config.TRAIN_LABEL_ROOT,
-        is_train=False,
-        transforms=Transforms.get_valid_transform()
-    )
+    if Config.VALID_CACHE:
+        # validation transform은 deterministic 하므로 한 번만 decode/rasterize 해서 shared memory에 보관
+        valid_dataset = SharedValidCache(valid_dataset)
     
     # DataLoader
+    # tile 학습은 sampler가 epoch 마다 (image, tile 위치)를 새로 뽑음
+    train_sampler = TileSampler(train_dataset) if Config.TILE_SIZE and not Config.SHARD_DIR else None
+    # hard example sampler는 sample별 loss에 비례해서 다음 epoch을 뽑음 (map-style 이미지 dataset에서만 사용)
+    hard_sampler = None
+    if Config.HARD_SAMPLER and train_sampler is None and not Config.SHARD_DIR:
+        hard_sampler = train_sampler = HardExampleSampler(len(train_dataset))
     train_loader = DataLoader(
         dataset=train_dataset,
         batch_size=Config.TRAIN_BATCH_SIZE,
-        shuffle=True,
+        shuffle=not Config.SHARD_DIR and train_sampler is None,
+        sampler=train_sampler,
         num_workers=8,
-        pin_memory=True,
+        pin_memory=not Config.RING_BUFFERS,
         drop_last=True,
+        collate_fn=list_collate if Config.RING_BUFFERS else None,
     )
+    if Config.RING_BUFFERS:
+        # worker는 sample만 넘기고, 미리 할당한 pinned buffer에 batch를 채워서 재사용
+        train_loader = RingBufferLoader(train_loader, num_buffers=Config.RING_BUFFERS)
+    if Config.ECHO_FACTOR > 1 or Config.ECHO_ADAPTIVE:
+        # loader가 느릴 때 같은 batch를 device augmentation 해서 여러 step에 재사용
+        train_loader = EchoLoader(train_loader, device, preprocess=batch_augment)
+        batch_augment = None
     
     valid_loader = DataLoader(
         dataset=valid_dataset,
@@ -192,10 +323,14 @@ def train():
         epoch_start = time.time()
         model.train()
         epoch_loss = 0
+        if Config.SHARD_DIR or Config.AUGMENT_BANK_DIR:
+            train_dataset.set_epoch(epoch)
         
         for step, (images, masks) in enumerate(train_loader):
-            images = images.to(device)
-            masks = masks.to(device)
+            if batch_augment is not None:
+                images, masks = batch_augment(images.to(device, non_blocking=True),
+                                              masks.to(device, non_blocking=True))
+            images, masks = Transforms.to_device(images, masks, device)
             
             with autocast(enabled=True):
                 outputs = model(images)
@@ -206,6 +341,12 @@ def train():
             scaler.step(optimizer)
             scaler.update()
 
+            if hard_sampler is not None:
+                # echoing 중에는 step과 loader batch 번호가 다르므로 원래 batch 번호로 index를 찾음
+                source_step = train_loader.source_step if isinstance(train_loader, EchoLoader) else step
+                hard_sampler.update(hard_sampler.batch_indices(source_step, Config.TRAIN_BATCH_SIZE),
+                                    per_sample_class_loss(outputs, masks))
+
             epoch_loss += loss.item()
             
             if (step + 1) % 25 == 0:
@@ -225,7 +366,8 @@ def train():
         epoch_time = time.time() - epoch_start
 
         # 평균 loss 계산 및 출력
-        avg_epoch_loss = epoch_loss / len(train_loader)
+        # echoing factor가 바뀔 수 있으므로 실제 step 수로 나눔
+        avg_epoch_loss = epoch_loss / (step + 1)
         print("Epoch {}, Train Loss: {:.4f} || Elapsed time: {} || ETA: {}\n".format(
             epoch + 1,
             avg_epoch_loss,
@@ -242,7 +384,8 @@ def train():
         
         if (epoch + 1) % Config.VAL_EVERY == 0:
             dice, dice_dict, val_loss = validation(
-                epoch + 1, model, valid_loader, criterion, device, threshold=0.5
+                epoch + 1, model, valid_loader, criterion, device, threshold=0.5,
+                tile_size=valid_tile_size
             )
 
             # Scheduler step 추가